@@ -1,27 +1,102 @@
 """
 K2M Analytics - Database Configuration
 =======================================
-SQLite database setup using SQLModel.
+Engine setup for SQLite (default) or PostgreSQL, chosen by DATABASE_URL.
 Handles connection pooling and session management.
+
+SQLite runs in WAL mode so readers never wait on a writer, and writers wait
+(busy_timeout) instead of failing with "database is locked".
+PostgreSQL URLs use the psycopg 3 driver with a pre-pinged pool and
+server-side prepared statements for repeated queries.
 """
 
 import os
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import QueuePool, StaticPool
 from sqlmodel import SQLModel, create_engine, Session
 from typing import Generator
 
 # Database configuration
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///database.db")
 
-# SQLite-specific settings
-connect_args = {"check_same_thread": False}
+# Pool sizing (per process)
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))       # Seconds to wait for a free connection
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))     # Seconds before a server connection is replaced
+
+# SQLite pragmas applied to every new connection
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("DB_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",  # Durable at checkpoints; safe with WAL
+    "busy_timeout": SQLITE_BUSY_TIMEOUT_MS,
+    "cache_size": -int(os.getenv("DB_SQLITE_CACHE_KB", "65536")),  # Negative: KiB instead of pages
+    "mmap_size": int(os.getenv("DB_SQLITE_MMAP_BYTES", str(256 * 1024 * 1024))),
+    "temp_store": "MEMORY",
+}
+
+# psycopg prepares a statement server-side after this many executions on a connection
+PG_PREPARE_THRESHOLD = int(os.getenv("DB_PG_PREPARE_THRESHOLD", "5"))
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def _normalize_url(url: str) -> str:
+    """postgres:// and postgresql:// URLs use psycopg 3 (prepared statement support)."""
+    for prefix in ("postgres://", "postgresql://"):
+        if url.startswith(prefix):
+            return "postgresql+psycopg://" + url[len(prefix):]
+    return url
+
+
+def build_engine(url: str = DATABASE_URL, echo: bool = False) -> Engine:
+    """Creates a tuned engine for a SQLite or PostgreSQL URL."""
+    url = _normalize_url(url)
+    backend = make_url(url).get_backend_name()
+
+    if backend == "sqlite":
+        database = make_url(url).database
+        if not database or database == ":memory:":
+            # One shared connection, or every session would see its own empty database
+            return create_engine(url, echo=echo, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+
+        engine = create_engine(
+            url,
+            echo=echo,
+            connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+            poolclass=QueuePool,
+            pool_size=POOL_SIZE,
+            max_overflow=MAX_OVERFLOW,
+            pool_timeout=POOL_TIMEOUT,
+        )
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+        return engine
+
+    connect_args = {}
+    if make_url(url).get_driver_name() == "psycopg":
+        connect_args["prepare_threshold"] = PG_PREPARE_THRESHOLD
+    return create_engine(
+        url,
+        echo=echo,
+        connect_args=connect_args,
+        pool_size=POOL_SIZE,
+        max_overflow=MAX_OVERFLOW,
+        pool_timeout=POOL_TIMEOUT,
+        pool_recycle=POOL_RECYCLE,
+        pool_pre_ping=True,  # Drop connections the server closed while idle
+    )
+
 
 # Create engine with configurable logging
 # Set echo=False in production for better performance
-engine = create_engine(
-    DATABASE_URL,
-    echo=os.getenv("DEBUG", "false").lower() == "true",
-    connect_args=connect_args
-)
+engine = build_engine(DATABASE_URL, echo=os.getenv("DEBUG", "false").lower() == "true")
 
 
 def create_db_and_tables() -> None:
@@ -36,7 +111,7 @@ def get_session() -> Generator[Session, None, None]:
     """
     Database session dependency.
     Yields a session and ensures proper cleanup.
-    
+
     Usage:
         @router.get("/items")
         def get_items(session: Session = Depends(get_session)):
@@ -44,4 +119,3 @@ def get_session() -> Generator[Session, None, None]:
     """
     with Session(engine) as session:
         yield session
-
@@ -5,6 +5,8 @@ import firebase_admin
 import os
 from dotenv import load_dotenv
 
+from .services.token_cache import token_verifier
+
 # Load .env from backend root (two levels up: app/ -> backend/)
 _base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 load_dotenv(os.path.join(_base_dir, ".env"))
@@ -47,7 +49,8 @@ def get_current_user(token: HTTPAuthorizationCredentials = Depends(security)):
                 detail="Firebase not initialized on server."
             )
 
-        decoded_token = auth.verify_id_token(token.credentials)
+        # Cached per token until it expires; signing certificates are prefetched
+        decoded_token = token_verifier.verify(token.credentials)
 
         email = decoded_token.get("email", "")
         # Read company_id and role from Firebase custom claims (set via /admin/assign-company)
@@ -83,6 +86,14 @@ def get_current_user(token: HTTPAuthorizationCredentials = Depends(security)):
             detail="Token has been revoked",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    except auth.UserDisabledError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User account is disabled",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Auth Error: {e}")
         raise HTTPException(
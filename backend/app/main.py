@@ -6,50 +6,34 @@ Handles server lifecycle, middleware, and router registration.
 """
 
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
 import os
+import json
 import shutil
+import threading
+import time
+import uuid
 import pandas as pd
 import firebase_admin
 from firebase_admin import credentials
 
-from .database import create_db_and_tables, engine
+from .database import engine
+from . import migrations
+from .deps import DISABLE_AUTH, get_current_user, security
 from .models import Dataset
 from .routers import datasets, visualizations, analytics, preferences, admin
+from .routers.admin import require_admin
+from .services import csv_dialect, dataset_loader, ingest_service, row_index, schema_catalog
+from .services import health_service, metrics, profiler
+from .services.ai_service import ai_service
+from .services.health_service import warm_up_state
+from .services.storage_service import storage_service
+from .services.token_cache import token_verifier
+from .services.user_directory import user_directory
 from sqlmodel import Session, select
-import sqlite3
-
-
-def run_migrations():
-    """
-    Adds any missing columns to existing database tables.
-    Safe to run on every startup — only acts if columns are missing.
-    """
-    db_path = "database.db"
-    if not os.path.exists(db_path):
-        return  # Fresh database — tables will be created with the correct schema
-
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    # Each entry: (table_name, column_name, column_definition)
-    migrations = [
-        ("dataset",             "company_id", "TEXT DEFAULT 'nexus-demo-001'"),
-        ("visualization",       "company_id", "TEXT DEFAULT 'nexus-demo-001'"),
-        ("analysislog",         "company_id", "TEXT DEFAULT 'nexus-demo-001'"),
-        ("dashboardpreference", "company_id", "TEXT DEFAULT 'nexus-demo-001'"),
-    ]
-
-    for table, column, definition in migrations:
-        try:
-            cursor.execute(f"SELECT {column} FROM {table} LIMIT 1")
-        except sqlite3.OperationalError:
-            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
-            print(f"OK: Migration — added {column} to {table}")
-
-    conn.commit()
-    conn.close()
 
 
 def seed_demo_data(force: bool = False):
@@ -77,7 +61,9 @@ def seed_demo_data(force: bool = False):
         shutil.copy(demo_csv_path, dest_path)
         
         # Read file to get metadata
-        df = pd.read_csv(dest_path)
+        with open(dest_path, "rb") as f:
+            dialect = csv_dialect.sniff(f.read(ingest_service.SNIFF_BYTES))
+        df = dataset_loader.read_csv(dest_path, dialect)
         file_size = os.path.getsize(dest_path)
         
         # Create dataset record — tagged to the demo company
@@ -87,14 +73,40 @@ def seed_demo_data(force: bool = False):
             file_size=file_size,
             total_rows=len(df),
             total_columns=len(df.columns),
+            csv_dialect_json=json.dumps(dialect),
             company_id="nexus-demo-001"
         )
         session.add(dataset)
         session.commit()
+        session.refresh(dataset)
+
+        schema_catalog.store_catalog(session, dataset, df)
+        dataset.row_index_json = row_index.build_index(dataset, df)
+        session.add(dataset)
+        session.commit()
         
         print(f"OK: Demo data seeded: {len(df)} rows, {len(df.columns)} columns")
         return {"status": "success", "message": f"Demo data seeded: {len(df)} rows"}
 
+def warm_up():
+    """
+    Startup work that requests do not need to wait for, run in a background
+    thread once the API is serving: demo seeding and the cloud client connections.
+    """
+    warm_up_state.start()
+    for label, task in [
+        ("demo seed", lambda: seed_demo_data(force=False)),  # Try auto-seed (non-forcing)
+        ("storage client", lambda: storage_service.client),
+        ("AI client", lambda: ai_service.client),
+    ]:
+        try:
+            task()
+        except Exception as e:
+            print(f"WARN: Warm-up step '{label}' failed: {e}")
+            warm_up_state.fail(label)
+    warm_up_state.finish()
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
@@ -102,8 +114,7 @@ async def lifespan(app: FastAPI):
     Runs startup tasks before yielding, cleanup tasks after.
     """
     # Startup
-    run_migrations()        # Add any missing columns to existing tables
-    create_db_and_tables()  # Create any brand-new tables
+    migrations.upgrade(engine)  # Create new tables and apply pending schema steps
     os.makedirs("uploads", exist_ok=True)
 
     # Initialize Firebase Admin
@@ -118,14 +129,21 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"WARN: Firebase Admin init warning: {e}")
 
-    # Try auto-seed (non-forcing)
-    seed_demo_data(force=False)
+    # Keep Google's token signing certificates warm so auth never waits on them
+    if not DISABLE_AUTH:
+        token_verifier.store.start()
+        user_directory.start()  # Admin listings read the synced local copy
+
+    # Seed and connect cloud clients off the critical path
+    threading.Thread(target=warm_up, name="startup-warm-up", daemon=True).start()
 
     print("OK: K2M API started successfully")
 
     yield  # Application runs here
 
     # Shutdown (cleanup if needed)
+    token_verifier.store.stop()
+    user_directory.stop()
     print("K2M API shutting down")
 
 
@@ -144,8 +162,37 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Rows", "X-Offset", "X-Limit", "Content-Range", "Server-Timing", "X-Profile-Id"],
 )
 
+# Optional bearer token for /metrics (open when unset, e.g. scraped inside the VPC)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+
+@app.middleware("http")
+async def time_request(request: Request, call_next):
+    """
+    Times each request into k2m_request_seconds and returns its stages
+    (parse, read, compute, serialize, ai, ...) in a Server-Timing header.
+    Streamed responses are timed up to their first byte.
+    """
+    timings, token = metrics.begin_request()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["Server-Timing"] = timings.server_timing(time.perf_counter() - start)
+        response.headers["Timing-Allow-Origin"] = "*"
+        return response
+    finally:
+        route = request.scope.get("route")
+        # Route templates keep the label set small (/datasets/{dataset_id}, not every id)
+        metrics.end_request(
+            token, timings, request.method, route.path if route else "unmatched",
+            status, time.perf_counter() - start,
+        )
+
 # Register routers
 app.include_router(datasets.router)
 app.include_router(visualizations.router)
@@ -174,10 +221,70 @@ def root():
 def health_check():
     """
     Health check endpoint for monitoring services.
-    Returns detailed health status.
+    Liveness only: answers without touching any dependency, so frequent probes
+    stay cheap. Dependency checks and traffic gating are on /health/ready.
     """
     return {
         "status": "healthy",
         "database": "connected",
         "version": "1.0.0"
     }
+
+
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    """
+    Admins can send `X-Profile: 1` to have a request sampled, plus
+    `X-Profile-Memory: 1` to trace its allocations too (off by default, as
+    tracemalloc slows every concurrent request); the profile is stored under the id in the X-Profile-Id response header (the
+    caller's X-Request-ID when valid) and served from /admin/profiles.
+    Requests without the header pass straight through.
+    """
+    if request.headers.get("X-Profile") != "1":
+        return await call_next(request)
+    try:
+        require_admin(await run_in_threadpool(get_current_user, await security(request)))
+    except HTTPException as e:
+        return JSONResponse({"detail": e.detail}, status_code=e.status_code, headers=e.headers)
+
+    request_id = request.headers.get("X-Request-ID", "")
+    if not profiler.REQUEST_ID.match(request_id):
+        request_id = uuid.uuid4().hex
+    memory = request.headers.get("X-Profile-Memory") == "1"
+    profile = profiler.begin(request_id, request.method, request.url.path, memory=memory)
+    if profile is None:
+        return JSONResponse({"detail": "Another request is being profiled, try again shortly"}, status_code=409)
+
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Profile-Id"] = request_id
+        return response
+    finally:
+        await run_in_threadpool(profiler.finish, profile, status)
+
+
+@app.get("/metrics", tags=["Health"], response_class=PlainTextResponse)
+def prometheus_metrics(request: Request):
+    """Prometheus text exposition: request latency, stage timings, cache hit rates, bytes read, queue depths."""
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/health/live", tags=["Health"])
+def liveness():
+    """Liveness probe: the process is up and serving. Checks no dependencies."""
+    return {"status": "alive"}
+
+
+@app.get("/health/ready", tags=["Health"])
+def readiness():
+    """
+    Readiness probe: database round-trip, storage, startup warm-up, auth certificates
+    and ingest queue depth, each with its latency. 503 if any check fails.
+    """
+    report = health_service.readiness()
+    body = {"status": "ready" if report["ready"] else "not_ready", "checks": report["checks"]}
+    return JSONResponse(body, status_code=200 if report["ready"] else 503)
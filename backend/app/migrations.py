@@ -0,0 +1,174 @@
+"""
+K2M Analytics - Schema Migrations
+==================================
+Versioned schema upgrades for the configured database (DATABASE_URL).
+
+The applied version is kept in the schema_version table. On every startup,
+tables that do not exist yet are created from the models (a no-op once they
+exist), then every registered step newer than the stored version runs, all
+inside one transaction. New tables therefore need no step of their own; new
+columns and indexes on existing tables do.
+
+Steps must be safe on tables that create_all just built with the current schema
+(add_column checks for the column, indexes use IF NOT EXISTS).
+"""
+
+from typing import Callable, List, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlmodel import SQLModel
+
+from . import models  # noqa: F401  (registers every table on SQLModel.metadata)
+
+
+def add_column(conn: Connection, table: str, column: str, definition: str):
+    if column not in {c["name"] for c in inspect(conn).get_columns(table)}:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {definition}"))
+
+
+def create_index(conn: Connection, name: str, table: str, columns: str):
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+
+
+def _add_columns(conn: Connection, columns: List[Tuple[str, str, str]]):
+    for table, column, definition in columns:
+        add_column(conn, table, column, definition)
+
+
+def _company_columns(conn: Connection):
+    """Company scoping of every user-owned table."""
+    _add_columns(conn, [
+        ("dataset",             "company_id", "TEXT DEFAULT 'nexus-demo-001'"),
+        ("visualization",       "company_id", "TEXT DEFAULT 'nexus-demo-001'"),
+        ("analysislog",         "company_id", "TEXT DEFAULT 'nexus-demo-001'"),
+        ("dashboardpreference", "company_id", "TEXT DEFAULT 'nexus-demo-001'"),
+    ])
+
+
+def _dataset_version_status(conn: Connection):
+    """Dataset version (bumped on append) and processing status."""
+    _add_columns(conn, [
+        ("dataset", "version", "INTEGER DEFAULT 1"),
+        ("dataset", "status",  "TEXT DEFAULT 'ready'"),
+    ])
+
+
+def _chart_payload_columns(conn: Connection):
+    """Saved visualizations store their computed chart and the dataset version it came from."""
+    _add_columns(conn, [
+        ("visualization", "data_json",       "TEXT"),
+        ("visualization", "dataset_version", "INTEGER"),
+        ("visualization", "updated_at",      "TIMESTAMP"),
+    ])
+
+
+def _blob_columns(conn: Connection):
+    """Content hash of the stored file and location of its Parquet copy."""
+    _add_columns(conn, [
+        ("dataset", "content_hash",  "TEXT"),
+        ("dataset", "columnar_path", "TEXT"),
+    ])
+
+
+def _chart_refresh_error_column(conn: Connection):
+    """Charts whose refresh failed record why, instead of being retried on every listing."""
+    _add_columns(conn, [("visualization", "refresh_error", "TEXT")])
+
+
+def _row_index_column(conn: Connection):
+    _add_columns(conn, [("dataset", "row_index_json", "TEXT")])
+
+
+def _memory_report_column(conn: Connection):
+    _add_columns(conn, [("dataset", "memory_report_json", "TEXT")])
+
+
+def _csv_dialect_column(conn: Connection):
+    _add_columns(conn, [("dataset", "csv_dialect_json", "TEXT")])
+
+
+def _sheet_columns(conn: Connection):
+    """Worksheets of a workbook opened as sub-datasets."""
+    _add_columns(conn, [
+        ("dataset", "parent_id",   "INTEGER"),
+        ("dataset", "sheet_name",  "TEXT"),
+        ("dataset", "sheets_json", "TEXT"),
+    ])
+
+
+def _column_indexes(conn: Connection):
+    """Single-column indexes declared with Field(index=True) on columns added later."""
+    for name, table, column in [
+        ("ix_dataset_company_id",       "dataset",             "company_id"),
+        ("ix_dataset_content_hash",     "dataset",             "content_hash"),
+        ("ix_dataset_parent_id",        "dataset",             "parent_id"),
+        ("ix_visualization_company_id", "visualization",       "company_id"),
+        ("ix_visualization_dataset_id", "visualization",       "dataset_id"),
+        ("ix_analysislog_company_id",   "analysislog",         "company_id"),
+        ("ix_dashboardpreference_company_id", "dashboardpreference", "company_id"),
+    ]:
+        create_index(conn, name, table, column)
+
+
+def _listing_indexes(conn: Connection):
+    """Dataset listing: keyset order per company and filename prefix search."""
+    create_index(conn, "ix_dataset_company_uploaded", "dataset", "company_id, uploaded_at")
+    create_index(conn, "ix_dataset_uploaded_at", "dataset", "uploaded_at")
+    create_index(conn, "ix_dataset_company_name", "dataset", "company_id, lower(filename)")
+    create_index(conn, "ix_dataset_name", "dataset", "lower(filename)")
+
+
+def _catalog_profile_cache_indexes(conn: Connection):
+    """Schema catalog in column order, dedup profile lookups and chart/log lookups per dataset."""
+    create_index(conn, "ix_datasetcolumn_dataset_position", "datasetcolumn", "dataset_id, position")
+    create_index(conn, "ix_dataset_hash_status", "dataset", "content_hash, status")
+    create_index(conn, "ix_visualization_company_dataset", "visualization", "company_id, dataset_id")
+    create_index(conn, "ix_analysislog_dataset_id", "analysislog", "dataset_id")
+
+
+# Ordered registry: (version, description, step). Append only; never renumber.
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "company columns", _company_columns),
+    (2, "dataset version and status", _dataset_version_status),
+    (3, "saved chart payload columns", _chart_payload_columns),
+    (4, "content hash and columnar path", _blob_columns),
+    (5, "row index column", _row_index_column),
+    (6, "memory report column", _memory_report_column),
+    (7, "csv dialect column", _csv_dialect_column),
+    (8, "worksheet columns", _sheet_columns),
+    (9, "indexes on added columns", _column_indexes),
+    (10, "dataset listing indexes", _listing_indexes),
+    (11, "catalog, profile and cache indexes", _catalog_profile_cache_indexes),
+    (12, "chart refresh error column", _chart_refresh_error_column),
+]
+
+
+def current_version(conn: Connection) -> int:
+    return conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_version")).scalar()
+
+
+def upgrade(engine: Engine) -> int:
+    """Brings the database to the latest version; returns the number of steps applied."""
+    with engine.connect() as conn:
+        with conn.begin():
+            if conn.dialect.name == "sqlite":
+                # pysqlite does not open a transaction before DDL on its own; this also
+                # keeps a second worker starting at the same time from migrating twice
+                conn.exec_driver_sql("BEGIN IMMEDIATE")
+            conn.execute(text(
+                "CREATE TABLE IF NOT EXISTS schema_version ("
+                "version INTEGER PRIMARY KEY, description TEXT NOT NULL, "
+                "applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+            ))
+            SQLModel.metadata.create_all(conn)  # Tables that do not exist yet
+            version = current_version(conn)
+            pending = [m for m in MIGRATIONS if m[0] > version]
+            for number, description, step in pending:
+                step(conn)
+                conn.execute(
+                    text("INSERT INTO schema_version (version, description) VALUES (:version, :description)"),
+                    {"version": number, "description": description},
+                )
+                print(f"OK: Migration {number} applied — {description}")
+    return len(pending)
@@ -6,8 +6,14 @@ These define the structure of data persisted to SQLite.
 """
 
 from typing import Optional, List
+from sqlalchemy import Index, func
 from sqlmodel import Field, SQLModel
-from datetime import datetime
+from datetime import datetime, timezone
+
+
+def utcnow() -> datetime:
+    """Current UTC time as a naive datetime, the way timestamps are stored."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
 
 
 # ============ Dataset Models ============
@@ -17,12 +23,33 @@ class DatasetBase(SQLModel):
     file_size: int
     total_rows: Optional[int] = None
     total_columns: Optional[int] = None
-    uploaded_at: datetime = Field(default_factory=datetime.utcnow)
+    uploaded_at: datetime = Field(default_factory=utcnow)
+    version: int = 1  # Bumped whenever the file contents change (e.g. append)
+    status: str = "ready"  # processing, ready, failed (background ingest stage)
+    content_hash: Optional[str] = Field(default=None, index=True)  # SHA-256 of the uploaded file
+    columnar_path: Optional[str] = None  # Parquet copy written by the ingest stage
+    parent_id: Optional[int] = Field(default=None, foreign_key="dataset.id", index=True)  # Workbook this sheet belongs to
+    sheet_name: Optional[str] = None  # Excel worksheet this dataset reads (None: first sheet)
 
 # Database Table
 class Dataset(DatasetBase, table=True):
+    # Listing order is (uploaded_at, id); the rowid rides along in both indexes
+    __table_args__ = (
+        Index("ix_dataset_company_uploaded", "company_id", "uploaded_at"),
+        Index("ix_dataset_uploaded_at", "uploaded_at"),
+        Index("ix_dataset_hash_status", "content_hash", "status"),  # Dedup: ready copy of a blob
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     company_id: str = Field(default="nexus-demo-001", index=True)
+    row_index_json: Optional[str] = None  # Row index for seeking pages (CSV byte offsets, Parquet row groups)
+    memory_report_json: Optional[str] = None  # Frame memory before/after dtype optimization at ingest
+    csv_dialect_json: Optional[str] = None  # Encoding, delimiter, header row and date formats sniffed at upload
+    sheets_json: Optional[str] = None  # JSON list of worksheet names (Excel workbooks)
+
+# Case-insensitive filename prefix search (expression indexes need the table's columns)
+Index("ix_dataset_company_name", Dataset.company_id, func.lower(Dataset.filename))
+Index("ix_dataset_name", func.lower(Dataset.filename))
 
 # API Response
 class DatasetRead(DatasetBase):
@@ -32,24 +59,54 @@ class DatasetRead(DatasetBase):
 class DatasetUpdate(SQLModel):
     filename: Optional[str] = None
 
-# Visualization Model (For saving charts later)
+# Content-addressed file storage (one row per distinct uploaded file)
+class StoredBlob(SQLModel, table=True):
+    content_hash: str = Field(primary_key=True)  # SHA-256 of the file contents
+    file_path: str  # uploads/blobs/<hash>.<ext> or gs://bucket/blobs/<hash>.<ext>
+    file_size: int
+    columnar_path: Optional[str] = None  # Shared Parquet copy
+    ref_count: int = 0  # Number of Dataset rows pointing at this blob
+    ai_analysis_json: Optional[str] = None  # Cached AI analysis of the full file
+    created_at: datetime = Field(default_factory=utcnow)
+
+# Schema Catalog (one row per dataset column, filled at upload)
+class DatasetColumn(SQLModel, table=True):
+    __table_args__ = (Index("ix_datasetcolumn_dataset_position", "dataset_id", "position"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    dataset_id: int = Field(foreign_key="dataset.id", index=True)
+    position: int  # Column order in the file
+    name: str
+    dtype: str  # Inferred pandas dtype, e.g. "int64", "float64", "object"
+    role: str  # Semantic role: date, value, category, id, text
+    cardinality: int  # Distinct non-null values
+    null_ratio: float  # Share of missing values (0-1)
+    values_json: Optional[str] = None  # JSON array of sorted distinct values (low-cardinality and date columns)
+
+# Visualization Model (Saved charts with their precomputed result)
 class Visualization(SQLModel, table=True):
+    __table_args__ = (Index("ix_visualization_company_dataset", "company_id", "dataset_id"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     title: str
     chart_type: str
     config_json: str # JSON string of axis/cols
-    dataset_id: int = Field(foreign_key="dataset.id")
+    dataset_id: int = Field(foreign_key="dataset.id", index=True)
     company_id: str = Field(default="nexus-demo-001", index=True)
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    data_json: Optional[str] = None  # JSON string of the computed ChartData
+    dataset_version: Optional[int] = None  # Dataset.version that data_json was computed from
+    refresh_error: Optional[str] = None  # Why the last refresh for dataset_version failed
+    created_at: datetime = Field(default_factory=utcnow)
+    updated_at: Optional[datetime] = None
 
 # Analysis Log (For tracking operations)
 class AnalysisLog(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    dataset_id: int = Field(foreign_key="dataset.id")
+    dataset_id: int = Field(foreign_key="dataset.id", index=True)
     operation: str # e.g., "Clean Missing"
     details: str
     company_id: str = Field(default="nexus-demo-001", index=True)
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=utcnow)
 
 # Dashboard Preferences (For per-user widget customization)
 class DashboardPreference(SQLModel, table=True):
@@ -58,5 +115,16 @@ class DashboardPreference(SQLModel, table=True):
     company_id: str = Field(default="nexus-demo-001", index=True)
     widget_config: str  # JSON string: {"kpi_revenue": true, "chart_trend": false, ...}
     layout_order: Optional[str] = None  # JSON array of widget order
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=utcnow)
+
+# Local copy of the Firebase user directory (custom claims included) for admin listings
+class DirectoryUser(SQLModel, table=True):
+    __table_args__ = (Index("ix_directoryuser_company_email", "company_id", "email"),)
 
+    uid: str = Field(primary_key=True)
+    email: Optional[str] = Field(default=None, index=True)
+    company_id: Optional[str] = None  # From custom claims; None if not assigned
+    role: Optional[str] = Field(default=None, index=True)
+    email_verified: bool = False
+    disabled: bool = False
+    synced_at: datetime = Field(default_factory=utcnow)  # Last time Firebase confirmed this row
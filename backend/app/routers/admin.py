@@ -3,12 +3,20 @@ K2M Admin Router
 ================
 Protected endpoints for K2M team only.
 Allows assigning Firebase users to companies and listing user assignments.
+Listings read the local user directory, which these endpoints write through to.
+Request profiles (taken with the X-Profile header) are served from here too.
 """
 
-from fastapi import APIRouter, HTTPException, Depends
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import PlainTextResponse
 from firebase_admin import auth
 from pydantic import BaseModel
+from sqlmodel import Session
+from ..database import get_session
 from ..deps import get_current_user, ADMIN_EMAILS
+from ..services import profiler
+from ..services.user_directory import user_directory
 
 router = APIRouter(
     prefix="/admin",
@@ -32,6 +40,7 @@ class AssignCompanyRequest(BaseModel):
 @router.post("/assign-company")
 def assign_company(
     request: AssignCompanyRequest,
+    session: Session = Depends(get_session),
     current_user: dict = Depends(require_admin)
 ):
     """
@@ -49,10 +58,12 @@ def assign_company(
         firebase_user = auth.get_user_by_email(request.email)
 
         # Stamp the company_id and role onto their token (Firebase custom claims)
-        auth.set_custom_user_claims(firebase_user.uid, {
+        claims = {
             "company_id": request.company_id,
             "role": request.role,
-        })
+        }
+        auth.set_custom_user_claims(firebase_user.uid, claims)
+        user_directory.record(session, firebase_user, claims=claims)
 
         return {
             "success": True,
@@ -78,24 +89,35 @@ def assign_company(
 
 
 @router.get("/users")
-def list_users(current_user: dict = Depends(require_admin)):
+def list_users(
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    company_id: Optional[str] = None,
+    role: Optional[str] = None,
+    email: Optional[str] = Query(None, description="Email prefix"),
+    session: Session = Depends(get_session),
+    current_user: dict = Depends(require_admin)
+):
     """
-    List all Firebase users and their current company assignments.
-    Limited to 500 users.
+    List users and their company assignments from the local directory, ordered by email.
+    Filter by company, role or email prefix. All matching users are returned
+    unless `limit` is given; page with limit/offset.
+    With DISABLE_AUTH no background sync runs: call POST /admin/directory/sync
+    to fill the directory from Firebase.
     """
     try:
-        result = []
-        page = auth.list_users()
-        for user in page.iterate_all():
-            claims = user.custom_claims or {}
-            result.append({
+        users, total = user_directory.list_users(session, limit, offset, company_id, role, email)
+        result = [
+            {
                 "uid": user.uid,
                 "email": user.email or "(no email)",
-                "company_id": claims.get("company_id", "not assigned"),
-                "role": claims.get("role", "not assigned"),
+                "company_id": user.company_id or "not assigned",
+                "role": user.role or "not assigned",
                 "is_k2m_admin": user.email in ADMIN_EMAILS,
-            })
-        return {"users": result, "total": len(result)}
+            }
+            for user in users
+        ]
+        return {"users": result, "total": total, "limit": limit, "offset": offset}
 
     except Exception as e:
         print(f"Admin list-users error: {e}")
@@ -109,6 +131,7 @@ class VerifyEmailRequest(BaseModel):
 @router.post("/verify-email")
 def force_verify_email(
     request: VerifyEmailRequest,
+    session: Session = Depends(get_session),
     current_user: dict = Depends(require_admin)
 ):
     """
@@ -118,6 +141,7 @@ def force_verify_email(
     try:
         firebase_user = auth.get_user_by_email(request.email)
         auth.update_user(firebase_user.uid, email_verified=True)
+        user_directory.record(session, firebase_user, email_verified=True)
         return {
             "success": True,
             "message": f"Email '{request.email}' has been marked as verified. The user can now enroll 2FA.",
@@ -130,20 +154,62 @@ def force_verify_email(
 
 
 @router.get("/companies")
-def list_companies(current_user: dict = Depends(require_admin)):
+def list_companies(
+    session: Session = Depends(get_session),
+    current_user: dict = Depends(require_admin)
+):
     """
-    List all distinct company IDs that have been assigned to users.
+    List all distinct company IDs that have been assigned to users, with their user counts.
     """
     try:
-        company_ids = set()
-        page = auth.list_users()
-        for user in page.iterate_all():
-            claims = user.custom_claims or {}
-            cid = claims.get("company_id")
-            if cid:
-                company_ids.add(cid)
-        return {"companies": sorted(company_ids), "total": len(company_ids)}
+        companies = user_directory.list_companies(session)
+        return {
+            "companies": [company_id for company_id, _ in companies],
+            "user_counts": {company_id: count for company_id, count in companies},
+            "total": len(companies),
+        }
 
     except Exception as e:
         print(f"Admin list-companies error: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to list companies: {str(e)}")
+
+
+@router.post("/directory/sync")
+def sync_directory(current_user: dict = Depends(require_admin)):
+    """
+    Reconciles the local user directory with Firebase now (normally done periodically).
+    """
+    try:
+        return user_directory.sync()
+    except Exception as e:
+        print(f"Admin directory-sync error: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to sync user directory: {str(e)}")
+
+
+@router.get("/profiles")
+def list_profiles(current_user: dict = Depends(require_admin)):
+    """Stored request profiles, newest first."""
+    return {"profiles": profiler.list_profiles()}
+
+
+@router.get("/profiles/{request_id}")
+def get_profile(request_id: str, current_user: dict = Depends(require_admin)):
+    """
+    Hottest functions (self and total time) of one profiled request.
+    Peak memory and top allocation sites are only present for requests sent with
+    `X-Profile-Memory: 1`; memory tracing is off by default because it slows
+    every request running during the capture.
+    """
+    summary = profiler.load_summary(request_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return summary
+
+
+@router.get("/profiles/{request_id}/folded", response_class=PlainTextResponse)
+def get_profile_folded(request_id: str, current_user: dict = Depends(require_admin)):
+    """Collapsed stacks for flamegraph.pl, speedscope or inferno."""
+    folded = profiler.load_folded(request_id)
+    if folded is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(folded, headers={"Content-Disposition": f'attachment; filename="{request_id}.folded"'})
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException, Depends
 from sqlmodel import Session
+from typing import Optional
 import pandas as pd
 import os
 import asyncio
@@ -8,6 +9,8 @@ from ..database import get_session
 from ..models import Dataset
 from ..schemas import DashboardStats, ColumnStats, AdvancedStats
 from ..services.ai_service import ai_service
+from ..services import blob_store, chart_service, dataset_loader, export_service, metrics, schema_catalog
+from ..services.storage_service import storage_service
 from ..deps import get_current_user
 
 router = APIRouter(
@@ -29,18 +32,29 @@ def get_column_type(series: pd.Series) -> str:
     else:
         return "categorical"
 
-async def perform_smart_analysis(df: pd.DataFrame, filename: str = "") -> dict:
+async def perform_smart_analysis(
+    df: pd.DataFrame,
+    filename: str = "",
+    key_columns: Optional[dict] = None,
+    content_hash: Optional[str] = None,
+) -> dict:
     """
     Heuristic + AI analysis with timeout fallback.
+    `key_columns` (from the schema catalog) replaces the name/cardinality scan of `df`
+    when the AI does not identify a column. Pass `content_hash` only when `df` is the
+    full file, so its AI analysis can be cached and reused.
     """
-    ai_result = None
-    try:
-        # 5 second timeout for AI analysis to prevent hanging the server
-        ai_result = await asyncio.wait_for(ai_service.analyze_dataset(df, filename), timeout=5.0)
-    except asyncio.TimeoutError:
-        print(f"AI Analysis timed out for {filename}")
-    except Exception as e:
-        print(f"AI Analysis Error: {e}")
+    # Identical uploads share one cached AI analysis (keyed by content hash)
+    ai_result = blob_store.get_ai_analysis(content_hash)
+    if ai_result is None:
+        try:
+            # 5 second timeout for AI analysis to prevent hanging the server
+            ai_result = await asyncio.wait_for(ai_service.analyze_dataset(df, filename), timeout=5.0)
+            blob_store.store_ai_analysis(content_hash, ai_result)
+        except asyncio.TimeoutError:
+            print(f"AI Analysis timed out for {filename}")
+        except Exception as e:
+            print(f"AI Analysis Error: {e}")
     
     columns = [c.lower() for c in df.columns]
     
@@ -53,7 +67,9 @@ async def perform_smart_analysis(df: pd.DataFrame, filename: str = "") -> dict:
     if ai_result and ai_result.get("identified_value_col"):
         value_col = ai_result["identified_value_col"]
     
-    if not value_col:
+    if not value_col and key_columns is not None:
+        value_col = key_columns.get("identified_value_col")
+    elif not value_col:
         value_col = next((c for c in df.columns if any(x in c.lower() for x in high_priority_value)), None)
         if not value_col:
             value_col = next((c for c in df.columns if any(x in c.lower() for x in low_priority_value)), None)
@@ -62,7 +78,9 @@ async def perform_smart_analysis(df: pd.DataFrame, filename: str = "") -> dict:
     if ai_result and ai_result.get("identified_date_col"):
         date_col = ai_result["identified_date_col"]
 
-    if not date_col:    
+    if not date_col and key_columns is not None:
+        date_col = key_columns.get("identified_date_col")
+    elif not date_col:
         date_col = next((c for c in df.columns if any(x in c.lower() for x in ['date', 'time', 'day', 'month', 'year', 'timestamp', 'period', 'created'])), None)
     
     # Exclude ID columns from category detection to avoid "OrderID"
@@ -70,7 +88,9 @@ async def perform_smart_analysis(df: pd.DataFrame, filename: str = "") -> dict:
     if ai_result and ai_result.get("identified_category_col"):
         category_col = ai_result["identified_category_col"]
 
-    if not category_col:
+    if not category_col and key_columns is not None:
+        category_col = key_columns.get("identified_category_col")
+    elif not category_col:
         # First priority: explicit 'product' or 'item' column, less strict on unique count
         category_col = next((c for c in df.columns if 
                              any(x in c.lower() for x in ['product', 'item', 'model', 'sku']) 
@@ -112,7 +132,7 @@ async def perform_smart_analysis(df: pd.DataFrame, filename: str = "") -> dict:
             
             if value_col:
                 # Ensure numeric
-                temp_df[value_col] = temp_df[value_col].apply(clean_currency)
+                temp_df[value_col] = pd.to_numeric(temp_df[value_col].astype(object).apply(clean_currency), errors="coerce")
                 # Sum of value per month
                 monthly = temp_df.groupby(['_month_num', '_month_str'])[value_col].sum().reset_index()
             else:
@@ -138,10 +158,10 @@ async def perform_smart_analysis(df: pd.DataFrame, filename: str = "") -> dict:
                 # Ensure numeric (re-use clean logic if needed, but temp_df usage above handles it for date block, need to do it for DF here or reuse temp_df)
                  # We'll work on a copy to be safe
                 cat_df = df.copy()
-                cat_df[value_col] = cat_df[value_col].apply(clean_currency)
-                top = cat_df.groupby(category_col)[value_col].sum().sort_values(ascending=False).head(5)
+                cat_df[value_col] = pd.to_numeric(cat_df[value_col].astype(object).apply(clean_currency), errors="coerce")
+                top = cat_df.groupby(category_col, observed=True)[value_col].sum().sort_values(ascending=False).head(5)
             else:
-                top = df[category_col].value_counts().head(5)
+                top = df[category_col].value_counts().loc[lambda counts: counts > 0].head(5)
                 
             for name, val in top.items():
                 result["top_categories"].append({
@@ -162,7 +182,7 @@ async def perform_smart_analysis(df: pd.DataFrame, filename: str = "") -> dict:
         try:
             # Create a working copy for global stats if not already created
             clean_df = df.copy()
-            clean_df[value_col] = clean_df[value_col].apply(clean_currency)
+            clean_df[value_col] = pd.to_numeric(clean_df[value_col].astype(object).apply(clean_currency), errors="coerce")
             # Remove NaNs for stat calc
             clean_series = pd.to_numeric(clean_df[value_col], errors='coerce').dropna()
             
@@ -262,14 +282,11 @@ async def get_dataset_stats(dataset_id: int, session: Session = Depends(get_sess
         raise HTTPException(status_code=404, detail="Dataset not found")
     _check_dataset_access(dataset, current_user)
         
-    if not os.path.exists(dataset.file_path):
+    if not storage_service.exists(dataset.file_path):
          raise HTTPException(status_code=404, detail="File missing from disk")
     
     try:
-        if dataset.filename.endswith('.csv'):
-            df = pd.read_csv(dataset.file_path)
-        else:
-            df = pd.read_excel(dataset.file_path)
+        df = dataset_loader.load_dataframe(dataset)
         
         total_rows = len(df)
         total_cols = len(df.columns)
@@ -279,9 +296,13 @@ async def get_dataset_stats(dataset_id: int, session: Session = Depends(get_sess
         duplicate_rows = int(df.duplicated().sum())
         
         col_stats_list = []
+        # CSV dates are parsed at load; they are still reported as the text columns they are in the file
+        text_dates = export_service.source_format(dataset) == "csv"
         
         for col in df.columns:
             series = df[col]
+            if text_dates and pd.api.types.is_datetime64_any_dtype(series):
+                series = series.dt.strftime(chart_service.date_format(series))
             col_type = get_column_type(series)
             missing = int(series.isna().sum())
             unique = int(series.nunique())
@@ -315,7 +336,8 @@ async def get_dataset_stats(dataset_id: int, session: Session = Depends(get_sess
             col_stats_list.append(stats)
             
         # --- Perform Smart Analysis ---
-        smart_data = await perform_smart_analysis(df, dataset.filename)
+        key_columns = schema_catalog.identify_key_columns(schema_catalog.get_catalog(session, dataset))
+        smart_data = await perform_smart_analysis(df, dataset.filename, key_columns, dataset.content_hash)
         
         return DashboardStats(
             dataset_id=dataset_id,
@@ -344,10 +366,7 @@ async def chat_with_dataset(dataset_id: int, request: dict, session: Session = D
         raise HTTPException(status_code=400, detail="Message is required")
         
     try:
-        if dataset.filename.endswith('.csv'):
-            df = pd.read_csv(dataset.file_path)
-        else:
-            df = pd.read_excel(dataset.file_path)
+        df = dataset_loader.load_dataframe(dataset)
             
         ai_response = await ai_service.chat_with_data(df, dataset.filename, user_message)
         return {"response": ai_response}
@@ -355,6 +374,7 @@ async def chat_with_dataset(dataset_id: int, request: dict, session: Session = D
         raise HTTPException(status_code=500, detail=f"Chat failed: {str(e)}")
 
 @router.get("/{dataset_id}/filters")
+@metrics.stage("compute")
 def get_suggested_filters(dataset_id: int, session: Session = Depends(get_session), current_user: dict = Depends(get_current_user)):
     """
     Analyze the dataset and suggest good columns to use as filters.
@@ -366,16 +386,15 @@ def get_suggested_filters(dataset_id: int, session: Session = Depends(get_sessio
     _check_dataset_access(dataset, current_user)
         
     try:
-        if dataset.filename.endswith('.csv'):
-            df = pd.read_csv(dataset.file_path)
-        else:
-            df = pd.read_excel(dataset.file_path)
-        
+        # Answered from the schema catalog — the data file is not read
+        catalog = schema_catalog.get_catalog(session, dataset)
+        total = dataset.total_rows or 0
+
         filters = []
         
-        for col in df.columns:
-            nunique = df[col].nunique()
-            total = len(df)
+        for entry in catalog:
+            col = entry.name
+            nunique = entry.cardinality
             
             # Good filter candidates: categorical columns with 2-30 unique values
             # Also check for date-like columns
@@ -383,14 +402,8 @@ def get_suggested_filters(dataset_id: int, session: Session = Depends(get_sessio
             is_categorical = nunique >= 2 and nunique <= 30 and nunique < total * 0.1
             
             if is_date_like or is_categorical:
-                # Get unique values (sorted if possible)
-                try:
-                    unique_values = sorted(df[col].dropna().unique().tolist())
-                except:
-                    unique_values = df[col].dropna().unique().tolist()
-                
-                # Limit to first 50 values
-                unique_values = unique_values[:50]
+                # Sorted unique values stored at upload (first 50)
+                unique_values = schema_catalog.stored_values(entry)
                 
                 # Determine filter type
                 filter_type = "date" if is_date_like else "categorical"
@@ -434,10 +447,7 @@ async def get_filtered_stats(dataset_id: int, request: dict, session: Session =
     filters = request.get("filters", {})
     
     try:
-        if dataset.filename.endswith('.csv'):
-            df = pd.read_csv(dataset.file_path)
-        else:
-            df = pd.read_excel(dataset.file_path)
+        df = dataset_loader.load_dataframe(dataset)
         
         # Apply filters
         filtered_df = df.copy()
@@ -450,7 +460,8 @@ async def get_filtered_stats(dataset_id: int, request: dict, session: Session =
         total_cols = len(filtered_df.columns)
         
         # Run smart analysis on filtered data
-        smart_data = await perform_smart_analysis(filtered_df, dataset.filename)
+        key_columns = schema_catalog.identify_key_columns(schema_catalog.get_catalog(session, dataset))
+        smart_data = await perform_smart_analysis(filtered_df, dataset.filename, key_columns)
         
         return {
             "dataset_id": dataset_id,
@@ -464,6 +475,7 @@ async def get_filtered_stats(dataset_id: int, request: dict, session: Session =
         raise HTTPException(status_code=500, detail=f"Error with filtered stats: {str(e)}")
 
 @router.get("/{dataset_id}/anomalies")
+@metrics.stage("compute")
 def detect_anomalies(dataset_id: int, session: Session = Depends(get_session), current_user: dict = Depends(get_current_user)):
     """
     Detect statistical anomalies in the dataset using z-score and IQR methods.
@@ -475,10 +487,7 @@ def detect_anomalies(dataset_id: int, session: Session = Depends(get_session), c
     _check_dataset_access(dataset, current_user)
     
     try:
-        if dataset.filename.endswith('.csv'):
-            df = pd.read_csv(dataset.file_path)
-        else:
-            df = pd.read_excel(dataset.file_path)
+        df = dataset_loader.load_dataframe(dataset)
         
         anomalies = []
         
@@ -567,6 +576,7 @@ def detect_anomalies(dataset_id: int, session: Session = Depends(get_session), c
 
 
 @router.get("/{dataset_id}/advanced-stats", response_model=AdvancedStats)
+@metrics.stage("compute")
 def get_advanced_stats(dataset_id: int, session: Session = Depends(get_session), current_user: dict = Depends(get_current_user)):
     """
     Returns extended analytics for the enhanced dashboard:
@@ -584,15 +594,12 @@ def get_advanced_stats(dataset_id: int, session: Session = Depends(get_session),
         raise HTTPException(status_code=404, detail="Dataset not found")
     _check_dataset_access(dataset, current_user)
     
-    if not os.path.exists(dataset.file_path):
+    if not storage_service.exists(dataset.file_path):
         raise HTTPException(status_code=404, detail="Dataset file not found")
     
     try:
         # Load data
-        if dataset.file_path.endswith('.csv'):
-            df = pd.read_csv(dataset.file_path)
-        else:
-            df = pd.read_excel(dataset.file_path)
+        df = dataset_loader.load_dataframe(dataset)
         
         result = AdvancedStats(dataset_id=dataset_id)
         
@@ -618,10 +625,11 @@ def get_advanced_stats(dataset_id: int, session: Session = Depends(get_session),
         
         result.data_quality_issues = issues
         
-        # Identify key columns (similar to perform_smart_analysis)
-        date_col = next((c for c in df.columns if any(x in c.lower() for x in ['date', 'time', 'day', 'month', 'year', 'timestamp', 'period'])), None)
-        value_col = next((c for c in df.columns if any(x in c.lower() for x in ['sales', 'revenue', 'total', 'profit', 'amount', 'price', 'value'])), None)
-        category_col = next((c for c in df.columns if any(x in c.lower() for x in ['product', 'item', 'category', 'region', 'client', 'brand']) and 'id' not in c.lower()), None)
+        # Identify key columns from the schema catalog (same roles as perform_smart_analysis)
+        key_columns = schema_catalog.identify_key_columns(schema_catalog.get_catalog(session, dataset))
+        date_col = key_columns["identified_date_col"]
+        value_col = key_columns["identified_value_col"]
+        category_col = key_columns["identified_category_col"]
         
         # Unique categories/products count
         if category_col:
@@ -667,7 +675,7 @@ def get_advanced_stats(dataset_id: int, session: Session = Depends(get_session),
                         return pd.to_numeric(x.replace('$', '').replace(',', ''), errors='coerce')
                     return x
                 
-                temp_df[value_col] = temp_df[value_col].apply(clean_currency)
+                temp_df[value_col] = temp_df[value_col].astype(object).apply(clean_currency)
                 temp_df[value_col] = pd.to_numeric(temp_df[value_col], errors='coerce')
                 
                 # Get midpoint date
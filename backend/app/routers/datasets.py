@@ -1,16 +1,20 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
-from fastapi.responses import FileResponse, StreamingResponse
-from typing import List
-from sqlmodel import Session, select
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+from sqlalchemy import func, tuple_
+from sqlmodel import Session, col, select
+from datetime import datetime
 import pandas as pd
 import shutil
 import os
-import io
+import uuid
+import json
+import base64
 from ..database import get_session
-from ..models import Dataset, DatasetRead, DatasetUpdate
+from ..models import Dataset, DatasetRead, DatasetUpdate, Visualization, DatasetColumn, StoredBlob
 from ..schemas import AnalysisResult
 from ..services.storage_service import storage_service
-from google.cloud import storage
+from ..services import blob_store, content_service, csv_dialect, dataset_loader, export_service, ingest_service
 from ..deps import get_current_user
 
 router = APIRouter(
@@ -59,87 +63,262 @@ async def upload_dataset(
         raise HTTPException(status_code=400, detail="Only CSV and Excel files are supported.")
 
     try:
-        # Use Storage Service (GCS or Local)
-        file_path = storage_service.upload_file(file, file.filename)
+        # Stream to storage (GCS or Local) under the content hash. Identical files are
+        # stored once and reuse their profile; new files are processed in the background.
+        return await ingest_service.ingest_upload(session, file, current_user["company_id"])
 
-        # Analyze file basic stats
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(file_path)
-        else:
-            df = pd.read_excel(file_path)
-
-        total_rows, total_columns = df.shape
-        file_size = 0
-        if not file_path.startswith("gs://"):
-             file_size = os.path.getsize(file_path)
-
-        # Save to DB — tag with the uploading user's company
-        dataset = Dataset(
-            filename=file.filename,
-            file_path=file_path,
-            file_size=file_size,
-            total_rows=total_rows,
-            total_columns=total_columns,
-            company_id=current_user["company_id"]
-        )
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        print(f"Upload Error: {e}")
+        raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
+
+
+def _read_appended(source, dialect: dict, columns: list) -> pd.DataFrame:
+    """
+    Parses an appended CSV in the dataset's own dialect when its header matches
+    (a few rows are too little to sniff the encoding reliably); other files are
+    sniffed on their own.
+    """
+    for header_row in dict.fromkeys([dialect["header_row"], 0]):
+        source.seek(0)
+        try:
+            header = pd.read_csv(source, nrows=0, skiprows=header_row, **csv_dialect.pandas_kwargs(dialect))
+        except (ValueError, UnicodeDecodeError):
+            continue
+        if header.columns.tolist() == columns:
+            source.seek(0)
+            return pd.read_csv(source, skiprows=header_row, **csv_dialect.pandas_kwargs(dialect))
+
+    source.seek(0)
+    upload_dialect = csv_dialect.sniff(source.read(ingest_service.SNIFF_BYTES))
+    source.seek(0)
+    return pd.read_csv(source, skiprows=upload_dialect["header_row"], **csv_dialect.pandas_kwargs(upload_dialect))
+
+
+@router.post("/{dataset_id}/append", response_model=DatasetRead)
+async def append_to_dataset(
+    dataset_id: int,
+    file: UploadFile = File(...),
+    session: Session = Depends(get_session),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Appends the rows of an uploaded CSV to an existing CSV dataset.
+    The columns must match. Bumps the dataset version; conversion, profiling and
+    the refresh of saved visualizations run in the background.
+    """
+    dataset = session.get(Dataset, dataset_id)
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    _check_dataset_access(dataset, current_user)
+
+    if not dataset.filename.endswith('.csv') or not file.filename.endswith('.csv'):
+        raise HTTPException(status_code=400, detail="Append is only supported for CSV datasets.")
+    if dataset.file_path.startswith("gs://"):
+        raise HTTPException(status_code=400, detail="Append is not supported for cloud-stored datasets yet.")
+    if not os.path.exists(dataset.file_path):
+        raise HTTPException(status_code=404, detail="File missing from disk")
+
+    try:
+        # Rows are written back in the dataset's dialect
+        dialect = csv_dialect.load(dataset)
+        existing_columns = pd.read_csv(
+            dataset.file_path, nrows=0, skiprows=dialect["header_row"], **csv_dialect.pandas_kwargs(dialect)
+        ).columns.tolist()
+        new_rows = _read_appended(file.file, dialect, existing_columns)
+        if new_rows.columns.tolist() != existing_columns:
+            raise HTTPException(status_code=400, detail="Columns of the appended file do not match the dataset.")
+
+        # Copy-on-write: the current blob may be shared with other datasets, so the
+        # combined file is written as a new blob and the old reference is released
+        temp_path = os.path.join("uploads", "incoming", f"append-{uuid.uuid4().hex}.csv")
+        os.makedirs(os.path.dirname(temp_path), exist_ok=True)
+        try:
+            shutil.copyfile(dataset.file_path, temp_path)
+            with open(temp_path, "rb+") as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        f.write(b"\n")
+            new_rows.to_csv(
+                temp_path, mode="a", header=False, index=False, sep=dialect["delimiter"],
+                encoding=dialect["encoding"], decimal=dialect["decimal"]
+            )
+
+            content_hash = ingest_service.hash_file(temp_path)
+            blob, _ = ingest_service.store_blob(
+                session, temp_path, content_hash, os.path.getsize(temp_path), dataset.filename
+            )
+        finally:
+            # Promoted into the blob store, or dropped as a duplicate; removed here if parsing or storing failed
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        blob_store.release(session, dataset.content_hash)
+
+        dataset.file_path = blob.file_path
+        dataset.content_hash = content_hash
+        dataset.total_rows = (dataset.total_rows or 0) + len(new_rows)
+        dataset.file_size = blob.file_size
+        dataset.version = (dataset.version or 1) + 1
+        # The Parquet copy and row index are stale until the ingest stage re-converts the file
+        dataset.columnar_path = None
+        dataset.row_index_json = None
+        dataset.memory_report_json = None
+        dataset.status = "processing"
         session.add(dataset)
         session.commit()
         session.refresh(dataset)
 
+        # Re-convert, re-profile and refresh saved charts off the request path
+        ingest_service.schedule_processing(dataset.id)
         return dataset
 
+    except HTTPException:
+        raise
     except Exception as e:
-        import traceback
-        traceback.print_exc()
-        print(f"Upload Error: {e}")
-        raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
+        print(f"Append Error: {e}")
+        raise HTTPException(status_code=500, detail=f"Error appending file: {str(e)}")
+
+
+# Columns returned by the listing (the heavy *_json columns stay in the database)
+_LISTING_COLUMNS = [getattr(Dataset, name) for name in DatasetRead.model_fields]
+
+
+# Page size when a cursor is sent without a limit
+LISTING_PAGE_SIZE = 100
+
+
+def _encode_cursor(dataset: DatasetRead) -> str:
+    return base64.urlsafe_b64encode(f"{dataset.uploaded_at.isoformat()}|{dataset.id}".encode()).decode()
+
+
+def _decode_cursor(cursor: str):
+    """(uploaded_at, id) of the last row of the previous page."""
+    try:
+        uploaded_at, dataset_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(uploaded_at), int(dataset_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 
 @router.get("/", response_model=List[DatasetRead])
 def get_datasets(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    name: Optional[str] = Query(None, description="Filename prefix"),
+    uploaded_from: Optional[datetime] = None,
+    uploaded_to: Optional[datetime] = None,
     session: Session = Depends(get_session),
     current_user: dict = Depends(get_current_user)
 ):
-    if current_user.get("role") == "admin":
-        # Admins see all companies' datasets
-        datasets = session.exec(select(Dataset)).all()
-    else:
-        # Clients only see their own company's datasets
-        datasets = session.exec(
-            select(Dataset).where(Dataset.company_id == current_user["company_id"])
-        ).all()
+    """
+    Datasets newest first. Without `limit` or `cursor` every dataset is returned
+    (as existing callers expect); with either, pages of `limit` (default 100) are
+    returned and, when more rows follow, the X-Next-Cursor header holds the
+    cursor for the next page.
+    Filter by filename prefix and upload date range (inclusive).
+    """
+    query = select(*_LISTING_COLUMNS)
+    if current_user.get("role") != "admin":
+        # Clients only see their own company's datasets; admins see all companies
+        query = query.where(Dataset.company_id == current_user["company_id"])
+    if name:
+        # Range on lower(filename) so the prefix search can use its index
+        prefix = name.lower()
+        query = query.where(func.lower(Dataset.filename) >= prefix, func.lower(Dataset.filename) < prefix + "\U0010ffff")
+    if uploaded_from:
+        query = query.where(Dataset.uploaded_at >= uploaded_from)
+    if uploaded_to:
+        query = query.where(Dataset.uploaded_at <= uploaded_to)
+    if cursor:
+        # Keyset pagination: seek past the last row instead of counting an offset
+        query = query.where(tuple_(Dataset.uploaded_at, Dataset.id) < _decode_cursor(cursor))
+
+    query = query.order_by(col(Dataset.uploaded_at).desc(), col(Dataset.id).desc())
+    if limit is None and cursor is None:
+        return [DatasetRead.model_validate(row._mapping) for row in session.exec(query).all()]
+
+    limit = limit or LISTING_PAGE_SIZE
+    rows = session.exec(query.limit(limit + 1)).all()
+    datasets = [DatasetRead.model_validate(row._mapping) for row in rows[:limit]]
+    if len(rows) > limit:
+        response.headers["X-Next-Cursor"] = _encode_cursor(datasets[-1])
     return datasets
 
 
 @router.get("/{dataset_id}/content")
 def get_dataset_content(
     dataset_id: int,
+    request: Request,
     limit: int = 50,
     offset: int = 0,
+    filters: Optional[str] = None,
+    sort_by: Optional[str] = None,
+    sort_dir: str = "asc",
+    q: Optional[str] = None,
     session: Session = Depends(get_session),
     current_user: dict = Depends(get_current_user)
 ):
+    """
+    A page of rows, optionally filtered (`filters` = JSON object of column -> value
+    or operator predicate), searched (`q`) and sorted (`sort_by` = comma-separated
+    columns, "-" prefix for descending). Responds with JSON by default; `Accept: application/vnd.apache.arrow.stream`
+    streams Arrow IPC and `Accept: application/x-ndjson` streams NDJSON, with the
+    paging metadata in X-Total-Rows / X-Offset / X-Limit headers.
+    """
     dataset = session.get(Dataset, dataset_id)
     if not dataset:
         raise HTTPException(status_code=404, detail="Dataset not found")
 
     _check_dataset_access(dataset, current_user)
 
-    # Check if local file missing (skip check for GCS)
-    if not dataset.file_path.startswith("gs://") and not os.path.exists(dataset.file_path):
+    if offset < 0 or limit < 0:
+        raise HTTPException(status_code=400, detail="offset and limit must not be negative")
+    if sort_dir not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="sort_dir must be 'asc' or 'desc'")
+    try:
+        view_filters = content_service.parse_filters(filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid filters: {e}")
+    sort_keys = content_service.parse_sort(sort_by, sort_dir)
+
+    if not storage_service.exists(dataset.file_path):
          raise HTTPException(status_code=404, detail="File missing from disk")
 
     try:
-        if dataset.filename.endswith('.csv'):
-            df = pd.read_csv(dataset.file_path)
+        # Plain pages seek with the row index; total_rows comes from ingest metadata
+        chunk = None
+        if not view_filters and not sort_keys and not q:
+            chunk = dataset_loader.read_rows(dataset, offset, limit)
+        if chunk is not None:
+            total_rows = dataset.total_rows
         else:
-            df = pd.read_excel(dataset.file_path)
-
-        total_rows = len(df)
-        chunk = df.iloc[offset : offset + limit].fillna("")
-        data = chunk.to_dict(orient='records')
-        columns = df.columns.tolist()
-
+            # Sorted / filtered / searched views resolve to cached row positions
+            try:
+                view = content_service.get_view(dataset, view_filters, sort_keys, q)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            total_rows = view.total_rows
+            chunk = view.page(offset, limit)
+        columns = chunk.columns.tolist()
+
+        media_type = content_service.negotiate(request.headers.get("accept"))
+        if media_type != content_service.JSON:
+            table = content_service.to_arrow(chunk)
+            body = (
+                content_service.iter_arrow_stream(table)
+                if media_type == content_service.ARROW_STREAM
+                else content_service.iter_ndjson(table)
+            )
+            headers = {"X-Total-Rows": str(total_rows), "X-Offset": str(offset), "X-Limit": str(limit)}
+            return StreamingResponse(body, media_type=media_type, headers=headers)
+
+        data = content_service.to_records(chunk)
         return {
             "id": dataset_id,
             "filename": dataset.filename,
@@ -149,11 +328,97 @@ def get_dataset_content(
             "limit": limit,
             "offset": offset
         }
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Read Error: {e}")
         raise HTTPException(status_code=500, detail=f"Error reading file: {str(e)}")
 
 
+@router.get("/{dataset_id}/memory")
+def get_dataset_memory(
+    dataset_id: int,
+    session: Session = Depends(get_session),
+    current_user: dict = Depends(get_current_user)
+):
+    """In-memory size of the dataset's frame before and after dtype optimization at ingest."""
+    dataset = session.get(Dataset, dataset_id)
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    _check_dataset_access(dataset, current_user)
+
+    if not dataset.memory_report_json:
+        raise HTTPException(status_code=404, detail="No memory report for this dataset (not processed yet)")
+
+    report = json.loads(dataset.memory_report_json)
+    saved = report["before_bytes"] - report["after_bytes"]
+    return {
+        "id": dataset_id,
+        "status": dataset.status,
+        **report,
+        "saved_bytes": saved,
+        "saved_pct": round(saved / report["before_bytes"] * 100, 2) if report["before_bytes"] else 0,
+    }
+
+
+@router.get("/{dataset_id}/sheets")
+def list_sheets(
+    dataset_id: int,
+    session: Session = Depends(get_session),
+    current_user: dict = Depends(get_current_user)
+):
+    """Worksheets of an Excel workbook, with the sub-dataset of each sheet opened so far."""
+    dataset = session.get(Dataset, dataset_id)
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    _check_dataset_access(dataset, current_user)
+
+    workbook = session.get(Dataset, dataset.parent_id) if dataset.parent_id else dataset
+    if not workbook.sheets_json:
+        raise HTTPException(status_code=404, detail="Dataset has no worksheets (not an Excel workbook, or still processing)")
+
+    opened = {workbook.sheet_name: workbook}
+    for sheet in session.exec(select(Dataset).where(Dataset.parent_id == workbook.id)).all():
+        opened[sheet.sheet_name] = sheet
+    return [
+        {
+            "index": index,
+            "name": name,
+            "dataset_id": opened[name].id if name in opened else None,
+            "status": opened[name].status if name in opened else "not_opened",
+        }
+        for index, name in enumerate(json.loads(workbook.sheets_json))
+    ]
+
+
+@router.post("/{dataset_id}/sheets/{sheet_name}", response_model=DatasetRead)
+def open_sheet(
+    dataset_id: int,
+    sheet_name: str,
+    session: Session = Depends(get_session),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Selects a worksheet. The first access creates its sub-dataset and converts it
+    in the background; the sheet is readable right away (from the workbook) meanwhile.
+    """
+    dataset = session.get(Dataset, dataset_id)
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    _check_dataset_access(dataset, current_user)
+
+    workbook = session.get(Dataset, dataset.parent_id) if dataset.parent_id else dataset
+    if not workbook.sheets_json:
+        raise HTTPException(status_code=404, detail="Dataset has no worksheets (not an Excel workbook, or still processing)")
+    if sheet_name not in json.loads(workbook.sheets_json):
+        raise HTTPException(status_code=404, detail=f"Sheet '{sheet_name}' not found")
+
+    return ingest_service.open_sheet(session, workbook, sheet_name)
+
+
 @router.delete("/{dataset_id}")
 def delete_dataset(
     dataset_id: int,
@@ -166,46 +431,120 @@ def delete_dataset(
 
     _check_dataset_access(dataset, current_user)
 
-    # Delete file from disk/GCS
-    if not dataset.file_path.startswith("gs://") and os.path.exists(dataset.file_path):
-        os.remove(dataset.file_path)
-
-    # Delete from database
-    session.delete(dataset)
+    # Worksheets opened from a workbook go with it
+    for sheet in session.exec(select(Dataset).where(Dataset.parent_id == dataset_id)).all():
+        _remove_dataset(session, sheet)
+    _remove_dataset(session, dataset)
     session.commit()
 
     return {"message": "Dataset deleted successfully"}
 
 
+def _remove_dataset(session: Session, dataset: Dataset):
+    """Deletes a dataset row with its charts and catalog, releasing its stored files."""
+    if dataset.parent_id:
+        # A worksheet shares the workbook file but owns its Parquet copy
+        storage_service.delete(dataset.columnar_path)
+
+    # Release the stored blob; its files are removed with the last reference
+    if session.get(StoredBlob, dataset.content_hash or ""):
+        blob_store.release(session, dataset.content_hash)
+    elif not dataset.parent_id:
+        # Files stored before content addressing belong to this dataset alone
+        if not dataset.file_path.startswith("gs://") and os.path.exists(dataset.file_path):
+            os.remove(dataset.file_path)
+        if dataset.columnar_path and not dataset.columnar_path.startswith("gs://") and os.path.exists(dataset.columnar_path):
+            os.remove(dataset.columnar_path)
+
+    # Delete saved charts and catalog entries that point at this dataset
+    for viz in session.exec(select(Visualization).where(Visualization.dataset_id == dataset.id)).all():
+        session.delete(viz)
+    for column in session.exec(select(DatasetColumn).where(DatasetColumn.dataset_id == dataset.id)).all():
+        session.delete(column)
+
+    session.delete(dataset)
+
+
 @router.get("/{dataset_id}/download")
 def download_dataset(
     dataset_id: int,
+    request: Request,
+    format: Optional[str] = None,
     session: Session = Depends(get_session),
     current_user: dict = Depends(get_current_user)
 ):
+    """
+    Streams a dataset file. Without `format` (or with the file's own format) the
+    stored file is passed through in chunks and Range requests are honored;
+    `format=csv|ndjson|parquet` converts batch by batch from the columnar copy.
+    The body is gzip/zstd-compressed when Accept-Encoding allows it.
+
+    Ranges always address the uncompressed file: only identity responses
+    advertise Accept-Ranges and carry the strong ETag that `If-Range` must
+    match, so a compressed download is restarted rather than resumed.
+    """
     dataset = session.get(Dataset, dataset_id)
     if not dataset:
         raise HTTPException(status_code=404, detail="Dataset not found")
 
     _check_dataset_access(dataset, current_user)
 
-    # For GCS, stream through backend
-    if dataset.file_path.startswith("gs://"):
-         try:
-            df = pd.read_csv(dataset.file_path) if dataset.filename.endswith('.csv') else pd.read_excel(dataset.file_path)
-            stream = io.StringIO()
-            df.to_csv(stream, index=False)
-            response = StreamingResponse(iter([stream.getvalue()]), media_type="text/csv")
-            response.headers["Content-Disposition"] = f"attachment; filename={dataset.filename}"
-            return response
-         except Exception as e:
-             raise HTTPException(status_code=500, detail=f"Failed to stream from cloud: {e}")
-
-    if not os.path.exists(dataset.file_path):
+    if not storage_service.exists(dataset.file_path):
         raise HTTPException(status_code=404, detail="File missing from disk")
 
-    return FileResponse(
-        path=dataset.file_path,
-        filename=dataset.filename,
-        media_type="text/csv"
-    )
+    source_format = export_service.source_format(dataset)
+    fmt = (format or source_format).lower()
+    if fmt != source_format and fmt not in export_service.EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format: {fmt}")
+
+    headers = {
+        "Content-Disposition": f'attachment; filename="{export_service.export_filename(dataset, fmt)}"',
+        "Vary": "Accept-Encoding",
+    }
+    media_type = export_service.MEDIA_TYPES.get(fmt, "application/octet-stream")
+
+    encoding = export_service.choose_encoding(request.headers.get("accept-encoding"), fmt)
+    etag = export_service.etag(dataset)
+    identity_headers = {"Accept-Ranges": "bytes", "ETag": etag}
+
+    try:
+        if fmt == source_format:
+            size = storage_service.size(dataset.file_path)
+            range_header = request.headers.get("range")
+            if not export_service.if_range_matches(request.headers.get("if-range"), etag):
+                range_header = None  # the file changed since the client's partial copy
+            try:
+                byte_range = export_service.parse_range(range_header, size)
+            except export_service.RangeNotSatisfiable:
+                raise HTTPException(
+                    status_code=416, detail="Requested range not satisfiable",
+                    headers={"Content-Range": f"bytes */{size}"}
+                )
+            if byte_range:
+                # Resumed or partial download: the exact bytes, uncompressed
+                start, end = byte_range
+                headers.update(identity_headers)
+                headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+                headers["Content-Length"] = str(end - start + 1)
+                body = export_service.iter_file(dataset.file_path, start, end + 1)
+                return StreamingResponse(body, status_code=206, media_type=media_type, headers=headers)
+            body = export_service.iter_file(dataset.file_path)
+        else:
+            size = None
+            body = export_service.iter_export(dataset, fmt)
+
+        if encoding:
+            body = export_service.compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+            if size is not None:
+                # Another representation of the same file; weak, so it never satisfies If-Range
+                headers["ETag"] = f'W/{etag[:-1]}-{encoding}"'
+        elif size is not None:
+            headers["Content-Length"] = str(size)
+            headers.update(identity_headers)
+        return StreamingResponse(body, media_type=media_type, headers=headers)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to stream file: {e}")
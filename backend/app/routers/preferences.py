@@ -1,9 +1,8 @@
 from fastapi import APIRouter, HTTPException, Depends
 from sqlmodel import Session, select
 import json
-from datetime import datetime
 from ..database import get_session
-from ..models import DashboardPreference
+from ..models import DashboardPreference, utcnow
 from ..schemas import DashboardPreferenceBase, DashboardPreferenceRead
 from ..deps import get_current_user
 
@@ -78,14 +77,14 @@ def save_dashboard_preferences(
     if existing:
         existing.widget_config = widget_config_json
         existing.layout_order = layout_order_json
-        existing.updated_at = datetime.utcnow()
+        existing.updated_at = utcnow()
         session.add(existing)
     else:
         new_pref = DashboardPreference(
             user_email=user_email,
             widget_config=widget_config_json,
             layout_order=layout_order_json,
-            updated_at=datetime.utcnow()
+            updated_at=utcnow()
         )
         session.add(new_pref)
     
@@ -1,12 +1,14 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import Dict, Any, List, Optional
-from sqlmodel import Session
-from pydantic import BaseModel
-import pandas as pd
-import os
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
+from typing import List, Optional
+from sqlmodel import Session, select
 from ..database import get_session
-from ..models import Dataset
+from ..models import Dataset, Visualization, utcnow
+from ..schemas import (
+    ChartData, ChartSpec, BatchChartRequest, DatasetColumnRead,
+    SavedVisualizationCreate, SavedVisualizationUpdate, SavedVisualizationRead,
+)
 from ..deps import get_current_user
+from ..services import chart_service, dataset_loader, metrics, schema_catalog, visualization_service
 
 router = APIRouter(
     prefix="/visualizations",
@@ -14,12 +16,6 @@ router = APIRouter(
     dependencies=[Depends(get_current_user)]
 )
 
-class ChartData(BaseModel):
-    type: str 
-    title: str
-    data: List[Dict[str, Any]]
-    config: Dict[str, Any] 
-
 @router.get("/dataset/{dataset_id}/columns", response_model=List[str])
 def get_dataset_columns(dataset_id: int, session: Session = Depends(get_session)):
     dataset = session.get(Dataset, dataset_id)
@@ -27,64 +23,289 @@ def get_dataset_columns(dataset_id: int, session: Session = Depends(get_session)
         raise HTTPException(status_code=404, detail="Dataset not found")
         
     try:
-        df = pd.read_csv(dataset.file_path, nrows=1) # Read header only
-        return df.columns.tolist()
+        return [entry.name for entry in schema_catalog.get_catalog(session, dataset)]
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reading file: {str(e)}")
 
+
+@router.get("/dataset/{dataset_id}/schema", response_model=List[DatasetColumnRead])
+def get_dataset_schema(dataset_id: int, session: Session = Depends(get_session)):
+    """Column metadata from the schema catalog: dtype, role, cardinality, null ratio."""
+    dataset = session.get(Dataset, dataset_id)
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    try:
+        return [
+            DatasetColumnRead(
+                name=entry.name,
+                position=entry.position,
+                dtype=entry.dtype,
+                role=entry.role,
+                cardinality=entry.cardinality,
+                null_ratio=entry.null_ratio,
+                values=schema_catalog.stored_values(entry) if entry.values_json else None,
+            )
+            for entry in schema_catalog.get_catalog(session, dataset)
+        ]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading file: {str(e)}")
+
+
+def _load_frame(session: Session, dataset: Dataset, specs: List[ChartSpec]) -> chart_service.ChartFrame:
+    """Validates specs (400 on error) and loads only the columns they use."""
+    try:
+        columns = visualization_service.validate_specs(session, dataset, specs)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return chart_service.ChartFrame(dataset_loader.load_dataframe(dataset, columns=columns))
+
+
+def _build_chart(frame: chart_service.ChartFrame, spec: ChartSpec) -> ChartData:
+    try:
+        with metrics.stage("compute"):
+            return visualization_service.build_chart(frame, spec)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.get("/dataset/{dataset_id}/generate", response_model=ChartData)
-def generate_chart(dataset_id: int, type: str, x_axis: str, y_axis: Optional[str] = None, session: Session = Depends(get_session)):
+def generate_chart(
+    dataset_id: int,
+    type: str,
+    x_axis: str,
+    y_axis: Optional[str] = None,
+    points: int = chart_service.DEFAULT_POINTS,
+    bucket: Optional[str] = None,
+    agg: str = "sum",
+    value_axis: Optional[str] = None,
+    bins: Optional[int] = None,
+    session: Session = Depends(get_session)
+):
+    """
+    Computes chart data server-side, so payload size does not depend on row count.
+    - bar: `y_axis` aggregated per `x_axis` value with `agg` (row counts without `y_axis`)
+    - line: LTTB-downsampled to about `points` points, optionally bucketed by day/week/month
+    - histogram: binned distribution of `x_axis` (auto bins unless `bins` is given)
+    - heatmap: 2-D binned/grouped counts of `x_axis` x `y_axis`, or `value_axis` aggregated
+    - scatter: density-aware sample of at most `points` points
+    """
     dataset = session.get(Dataset, dataset_id)
     if not dataset:
         raise HTTPException(status_code=404, detail="Dataset not found")
-    
+
+    spec = ChartSpec(
+        type=type, x_axis=x_axis, y_axis=y_axis, agg=agg, points=points,
+        bucket=bucket, value_axis=value_axis, bins=bins
+    )
     try:
-        df = pd.read_csv(dataset.file_path)
-        
-        if x_axis not in df.columns:
-            raise HTTPException(status_code=400, detail=f"Column {x_axis} not found")
-
-        chart_data = []
-        chart_config = {}
-
-        if type == "bar":
-            if not y_axis or y_axis == "count_ops":
-                counts = df[x_axis].value_counts().head(10).reset_index()
-                counts.columns = [x_axis, "count"]
-                chart_data = counts.to_dict(orient="records")
-                chart_config = {
-                    x_axis: {"label": x_axis.title(), "color": "hsl(var(--chart-1))"},
-                    "count": {"label": "Count", "color": "hsl(var(--chart-2))"}
-                }
-            else:
-                if y_axis not in df.columns:
-                     raise HTTPException(status_code=400, detail=f"Column {y_axis} not found")
-                grouped = df.groupby(x_axis)[y_axis].sum().head(10).reset_index()
-                chart_data = grouped.to_dict(orient="records")
-                chart_config = {
-                    x_axis: {"label": x_axis.title(), "color": "hsl(var(--chart-1))"},
-                    y_axis: {"label": y_axis.title(), "color": "hsl(var(--chart-2))"}
-                }
-
-        elif type == "line":
-            if not y_axis or y_axis == "count_ops":
-                 raise HTTPException(status_code=400, detail="Line chart requires a Y axis")
-            
-            subset = df.sort_values(by=x_axis).head(50)
-            chart_data = subset[[x_axis, y_axis]].to_dict(orient="records")
-            chart_config = {
-                 x_axis: {"label": x_axis.title(), "color": "hsl(var(--chart-1))"},
-                 y_axis: {"label": y_axis.title(), "color": "hsl(var(--chart-2))"}
-            }
-            
-        else:
-             raise HTTPException(status_code=400, detail=f"Chart type {type} not supported yet")
-
-        return ChartData(
-            type=type,
-            title=f"{type.title()} Chart: {x_axis}" + (f" vs {y_axis}" if y_axis else ""),
-            data=chart_data,
-            config=chart_config
-        )
+        return _build_chart(_load_frame(session, dataset, [spec]), spec)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chart generation failed: {str(e)}")
+
+
+@router.post("/dataset/{dataset_id}/generate/batch", response_model=List[ChartData])
+def generate_charts_batch(
+    dataset_id: int,
+    request: BatchChartRequest,
+    session: Session = Depends(get_session)
+):
+    """
+    Computes several charts from a single load of the dataset.
+    Only the union of the columns used by the specs is read, and specs sharing
+    an x-axis reuse the same grouping. Charts are returned in request order.
+    """
+    dataset = session.get(Dataset, dataset_id)
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    if not request.charts:
+        return []
+    try:
+        frame = _load_frame(session, dataset, request.charts)
+        return [_build_chart(frame, spec) for spec in request.charts]
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Chart generation failed: {str(e)}")
+
+
+# ============ Saved Visualizations ============
+
+def _check_access(company_id: str, current_user: dict):
+    """Raises 403 if a non-admin user tries to access another company's data."""
+    if current_user.get("role") != "admin" and company_id != current_user["company_id"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+
+def _to_read(viz: Visualization, dataset: Dataset) -> SavedVisualizationRead:
+    return SavedVisualizationRead(
+        id=viz.id,
+        title=viz.title,
+        chart_type=viz.chart_type,
+        dataset_id=viz.dataset_id,
+        spec=visualization_service.get_spec(viz),
+        chart=visualization_service.get_chart(viz),
+        dataset_version=viz.dataset_version,
+        stale=visualization_service.is_stale(viz, dataset),
+        refresh_error=viz.refresh_error,
+        created_at=viz.created_at,
+        updated_at=viz.updated_at,
+    )
+
+
+def _compute_now(session: Session, viz: Visualization, dataset: Dataset, spec: ChartSpec):
+    """Computes a single chart synchronously (create/update), surfacing spec errors as 400."""
+    try:
+        chart = _build_chart(_load_frame(session, dataset, [spec]), spec)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Chart generation failed: {str(e)}")
+
+    viz.data_json = chart.model_dump_json()
+    viz.dataset_version = dataset.version
+    viz.refresh_error = None
+    viz.updated_at = utcnow()
+
+
+@router.post("/", response_model=SavedVisualizationRead)
+def create_visualization(
+    request: SavedVisualizationCreate,
+    session: Session = Depends(get_session),
+    current_user: dict = Depends(get_current_user)
+):
+    """Saves a chart and stores its computed payload alongside the config."""
+    dataset = session.get(Dataset, request.dataset_id)
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+    _check_access(dataset.company_id, current_user)
+
+    viz = Visualization(
+        title=request.title,
+        chart_type=request.spec.type,
+        config_json=request.spec.model_dump_json(),
+        dataset_id=dataset.id,
+        company_id=dataset.company_id,
+    )
+    _compute_now(session, viz, dataset, request.spec)
+
+    session.add(viz)
+    session.commit()
+    session.refresh(viz)
+    return _to_read(viz, dataset)
+
+
+@router.get("/", response_model=List[SavedVisualizationRead])
+def list_visualizations(
+    background_tasks: BackgroundTasks,
+    dataset_id: Optional[int] = None,
+    session: Session = Depends(get_session),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Lists saved charts with their stored payloads.
+    Charts computed from an older dataset version are returned as-is (stale=true)
+    and refreshed in the background.
+    """
+    statement = select(Visualization)
+    if current_user.get("role") != "admin":
+        statement = statement.where(Visualization.company_id == current_user["company_id"])
+    if dataset_id is not None:
+        statement = statement.where(Visualization.dataset_id == dataset_id)
+    visualizations = session.exec(statement.order_by(Visualization.id)).all()
+
+    datasets = {}
+    results = []
+    stale_datasets = set()
+    for viz in visualizations:
+        if viz.dataset_id not in datasets:
+            datasets[viz.dataset_id] = session.get(Dataset, viz.dataset_id)
+        dataset = datasets[viz.dataset_id]
+        if not dataset:
+            continue
+        if visualization_service.is_stale(viz, dataset):
+            stale_datasets.add(dataset.id)
+        results.append(_to_read(viz, dataset))
+
+    for stale_id in stale_datasets:
+        background_tasks.add_task(visualization_service.refresh_dataset_visualizations, stale_id)
+    return results
+
+
+@router.get("/{visualization_id}", response_model=SavedVisualizationRead)
+def get_visualization(
+    visualization_id: int,
+    background_tasks: BackgroundTasks,
+    session: Session = Depends(get_session),
+    current_user: dict = Depends(get_current_user)
+):
+    """Serves the stored chart payload; schedules a refresh if the dataset has changed."""
+    viz = session.get(Visualization, visualization_id)
+    if not viz:
+        raise HTTPException(status_code=404, detail="Visualization not found")
+    _check_access(viz.company_id, current_user)
+
+    dataset = session.get(Dataset, viz.dataset_id)
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    if viz.data_json is None:
+        # Never computed (e.g. created before payloads were stored) — compute once now
+        _compute_now(session, viz, dataset, visualization_service.get_spec(viz))
+        session.add(viz)
+        session.commit()
+        session.refresh(viz)
+    elif visualization_service.is_stale(viz, dataset):
+        background_tasks.add_task(visualization_service.refresh_dataset_visualizations, dataset.id)
+
+    return _to_read(viz, dataset)
+
+
+@router.patch("/{visualization_id}", response_model=SavedVisualizationRead)
+def update_visualization(
+    visualization_id: int,
+    request: SavedVisualizationUpdate,
+    session: Session = Depends(get_session),
+    current_user: dict = Depends(get_current_user)
+):
+    """Renames a saved chart and/or changes its spec (which recomputes it)."""
+    viz = session.get(Visualization, visualization_id)
+    if not viz:
+        raise HTTPException(status_code=404, detail="Visualization not found")
+    _check_access(viz.company_id, current_user)
+
+    dataset = session.get(Dataset, viz.dataset_id)
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    if request.title:
+        viz.title = request.title
+        viz.updated_at = utcnow()
+    if request.spec:
+        viz.chart_type = request.spec.type
+        viz.config_json = request.spec.model_dump_json()
+        _compute_now(session, viz, dataset, request.spec)
+
+    session.add(viz)
+    session.commit()
+    session.refresh(viz)
+    return _to_read(viz, dataset)
+
+
+@router.delete("/{visualization_id}")
+def delete_visualization(
+    visualization_id: int,
+    session: Session = Depends(get_session),
+    current_user: dict = Depends(get_current_user)
+):
+    viz = session.get(Visualization, visualization_id)
+    if not viz:
+        raise HTTPException(status_code=404, detail="Visualization not found")
+    _check_access(viz.company_id, current_user)
+
+    session.delete(viz)
+    session.commit()
+    return {"message": "Visualization deleted successfully"}
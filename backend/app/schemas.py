@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from typing import List, Optional, Any, Dict
+from datetime import datetime
 
 class UserBase(BaseModel):
     email: str
@@ -129,6 +130,64 @@ class AdvancedStats(BaseModel):
     previous_period_data: List[Dict[str, Any]] = []
 
 
+# --- Schema Catalog ---
+
+class DatasetColumnRead(BaseModel):
+    name: str
+    position: int
+    dtype: str
+    role: str  # date, value, category, id, text
+    cardinality: int
+    null_ratio: float
+    values: Optional[List[Any]] = None  # Sorted distinct values (low-cardinality and date columns)
+
+
+# --- Charts & Saved Visualizations ---
+
+class ChartSpec(BaseModel):
+    type: str  # bar, line, histogram, heatmap, scatter
+    x_axis: str
+    y_axis: Optional[str] = None
+    agg: str = "sum"
+    points: int = 1000
+    bucket: Optional[str] = None  # day, week, month (line charts)
+    value_axis: Optional[str] = None  # heatmap cell value (counts rows when omitted)
+    bins: Optional[int] = None        # histogram/heatmap bins (auto when omitted)
+    title: Optional[str] = None
+
+class ChartData(BaseModel):
+    type: str 
+    title: str
+    data: List[Dict[str, Any]]
+    config: Dict[str, Any] 
+    meta: Optional[Dict[str, Any]] = None  # downsampling info: source_points, points, bucket
+
+class BatchChartRequest(BaseModel):
+    charts: List[ChartSpec]
+
+class SavedVisualizationCreate(BaseModel):
+    title: str
+    dataset_id: int
+    spec: ChartSpec
+
+class SavedVisualizationUpdate(BaseModel):
+    title: Optional[str] = None
+    spec: Optional[ChartSpec] = None
+
+class SavedVisualizationRead(BaseModel):
+    id: int
+    title: str
+    chart_type: str
+    dataset_id: int
+    spec: ChartSpec
+    chart: Optional[ChartData] = None  # Stored payload, served without recomputation
+    dataset_version: Optional[int] = None  # Dataset version the payload was computed from
+    stale: bool = False  # True while a background refresh is pending
+    refresh_error: Optional[str] = None  # Set when the chart no longer fits the current dataset version
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+
 # --- Dashboard Preferences ---
 
 class WidgetConfig(BaseModel):
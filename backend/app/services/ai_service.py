@@ -1,13 +1,11 @@
-try:
-    from google import genai
-    from google.genai import types as genai_types
-    HAS_GENAI = True
-except ImportError:
-    HAS_GENAI = False
-
+import importlib.util
 import os
+import threading
 import pandas as pd
 import json
+
+from . import metrics
+
 try:
     from dotenv import load_dotenv
     HAS_DOTENV = True
@@ -23,13 +21,34 @@ GCP_PROJECT_ID = os.getenv("GCP_PROJECT_ID")
 GCP_LOCATION = os.getenv("GCP_LOCATION", "us-central1")
 MODEL_ID = "gemini-2.0-flash-001"
 
+# google.genai is imported when the client is first needed, not at startup
+try:
+    HAS_GENAI = importlib.util.find_spec("google.genai") is not None
+except ModuleNotFoundError:
+    HAS_GENAI = False
+
 class AiService:
     def __init__(self):
-        self.client = None
-
+        # The Vertex AI client is created on first use
+        self._client = None
+        self._connected = False
+        self._connect_lock = threading.Lock()
+
+    @property
+    def client(self):
+        """google.genai client, or None when AI features are disabled."""
+        if not self._connected:
+            with self._connect_lock:
+                if not self._connected:
+                    self._connect()
+                    self._connected = True
+        return self._client
+
+    def _connect(self):
         if HAS_GENAI and GCP_PROJECT_ID:
             try:
-                self.client = genai.Client(
+                from google import genai
+                self._client = genai.Client(
                     vertexai=True,
                     project=GCP_PROJECT_ID,
                     location=GCP_LOCATION
@@ -37,7 +56,7 @@ class AiService:
                 print(f"AI_SERVICE: Vertex AI (google.genai) initialized — project={GCP_PROJECT_ID}, location={GCP_LOCATION}, model={MODEL_ID}")
             except Exception as e:
                 print(f"AI_SERVICE: Failed to initialize google.genai client: {e}")
-                self.client = None
+                self._client = None
         else:
             if not HAS_GENAI:
                 print("AI_SERVICE: Warning: google-genai package not installed. AI features disabled.")
@@ -75,10 +94,11 @@ class AiService:
         """
 
         try:
-            response = await self.client.aio.models.generate_content(
-                model=MODEL_ID,
-                contents=prompt
-            )
+            with metrics.stage("ai"):
+                response = await self.client.aio.models.generate_content(
+                    model=MODEL_ID,
+                    contents=prompt
+                )
             text = response.text.strip()
             if text.startswith("```json"):
                 text = text[7:]
@@ -147,10 +167,11 @@ class AiService:
         """
 
         try:
-            response = await self.client.aio.models.generate_content(
-                model=MODEL_ID,
-                contents=prompt
-            )
+            with metrics.stage("ai"):
+                response = await self.client.aio.models.generate_content(
+                    model=MODEL_ID,
+                    contents=prompt
+                )
             return response.text
         except Exception as e:
             err_msg = str(e).lower()
@@ -0,0 +1,133 @@
+"""
+K2M Analytics - Content-Addressed Blob Store
+=============================================
+Uploaded files are stored once per SHA-256 content hash and reference-counted
+from Dataset rows. Re-uploading an identical file reuses the stored blob, its
+Parquet copy, schema profile and cached AI analysis; the files are removed only
+when the last referencing dataset is deleted.
+"""
+
+import json
+from typing import Optional, Tuple
+from sqlalchemy import update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, select
+
+from ..database import engine
+from ..models import Dataset, DatasetColumn, StoredBlob
+from .storage_service import storage_service
+
+
+def blob_name(content_hash: str, filename: str) -> str:
+    """Storage name of a blob: blobs/<hash><original extension>."""
+    ext = "." + filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    return f"blobs/{content_hash}{ext}"
+
+
+def acquire(session: Session, content_hash: str) -> Optional[StoredBlob]:
+    """Adds a reference to an existing blob. Returns None if the hash is unknown."""
+    # Incremented in SQL so concurrent uploads of the same file cannot lose a reference
+    result = session.execute(
+        update(StoredBlob)
+        .where(StoredBlob.content_hash == content_hash)
+        .values(ref_count=StoredBlob.ref_count + 1)
+    )
+    if not result.rowcount:
+        return None
+    blob = session.get(StoredBlob, content_hash)
+    session.refresh(blob)
+    return blob
+
+
+def register(session: Session, content_hash: str, file_path: str, file_size: int) -> Tuple[StoredBlob, bool]:
+    """
+    Records a newly stored blob with its first reference. If a concurrent upload
+    of the same content registered it first, adds a reference to that row instead.
+    Returns (blob, created).
+    """
+    insert = postgresql.insert if session.get_bind().dialect.name == "postgresql" else sqlite.insert
+    ref_count = session.execute(
+        insert(StoredBlob)
+        .values(content_hash=content_hash, file_path=file_path, file_size=file_size, ref_count=1)
+        .on_conflict_do_update(index_elements=["content_hash"], set_={"ref_count": StoredBlob.ref_count + 1})
+        .returning(StoredBlob.ref_count)
+    ).scalar_one()
+    blob = session.get(StoredBlob, content_hash)
+    session.refresh(blob)
+    return blob, ref_count == 1
+
+
+def release(session: Session, content_hash: Optional[str]) -> bool:
+    """
+    Drops one reference. When none remain, deletes the file, its Parquet copy
+    and the blob row. Returns True if the blob was removed.
+    """
+    if not content_hash:
+        return False
+    blob = session.get(StoredBlob, content_hash)
+    if not blob:
+        return False
+
+    blob.ref_count -= 1
+    if blob.ref_count > 0:
+        session.add(blob)
+        return False
+
+    storage_service.delete(blob.file_path)
+    storage_service.delete(blob.columnar_path)
+    session.delete(blob)
+    return True
+
+
+def find_processed_sibling(session: Session, content_hash: str) -> Optional[Dataset]:
+    """A fully ingested dataset with the same content, whose profile can be reused."""
+    return session.exec(
+        select(Dataset)
+        .where(Dataset.content_hash == content_hash)
+        .where(Dataset.status == "ready")
+        .where(Dataset.parent_id.is_(None))  # Worksheet sub-datasets hold other tables
+    ).first()
+
+
+def copy_profile(session: Session, source: Dataset, target: Dataset) -> None:
+    """Copies shape, Parquet location, row index and schema catalog from an identical dataset."""
+    target.total_rows = source.total_rows
+    target.total_columns = source.total_columns
+    target.columnar_path = source.columnar_path
+    target.row_index_json = source.row_index_json
+    target.memory_report_json = source.memory_report_json
+    target.sheet_name = source.sheet_name
+    target.sheets_json = source.sheets_json
+    for entry in session.exec(select(DatasetColumn).where(DatasetColumn.dataset_id == source.id)).all():
+        session.add(DatasetColumn(
+            dataset_id=target.id,
+            position=entry.position,
+            name=entry.name,
+            dtype=entry.dtype,
+            role=entry.role,
+            cardinality=entry.cardinality,
+            null_ratio=entry.null_ratio,
+            values_json=entry.values_json,
+        ))
+
+
+def get_ai_analysis(content_hash: Optional[str]) -> Optional[dict]:
+    """Cached AI analysis of a file, if one was stored for its content hash."""
+    if not content_hash:
+        return None
+    with Session(engine) as session:
+        blob = session.get(StoredBlob, content_hash)
+        if blob and blob.ai_analysis_json:
+            return json.loads(blob.ai_analysis_json)
+    return None
+
+
+def store_ai_analysis(content_hash: Optional[str], analysis: Optional[dict]) -> None:
+    if not content_hash or not analysis:
+        return
+    with Session(engine) as session:
+        blob = session.get(StoredBlob, content_hash)
+        if blob:
+            blob.ai_analysis_json = json.dumps(analysis, default=str)
+            session.add(blob)
+            session.commit()
@@ -0,0 +1,512 @@
+"""
+K2M Analytics - Chart Computation
+==================================
+Server-side reduction of large datasets into chart-sized payloads.
+Keeps the response size bounded by the requested point count, not the row count.
+"""
+
+from typing import Dict, List, Optional, Tuple
+import warnings
+import numpy as np
+import pandas as pd
+
+# Supported resample buckets and aggregations for time-series charts
+BUCKETS = {"day", "week", "month"}
+AGGREGATIONS = {"sum", "mean", "min", "max"}
+
+DEFAULT_POINTS = 1000
+MAX_POINTS = 10000
+
+# Histogram/heatmap resolution limits
+MAX_BINS = 100
+DEFAULT_HEATMAP_BINS = 20
+MAX_HEATMAP_CATEGORIES = 30
+
+# Grid used to estimate point density when sampling scatter plots
+SCATTER_GRID = 64
+
+
+def to_numeric(series: pd.Series) -> pd.Series:
+    """Coerce a column to numbers, stripping currency symbols and thousands separators."""
+    if pd.api.types.is_numeric_dtype(series):
+        return series
+    cleaned = series.astype(str).str.replace(r"[$,\s]", "", regex=True)
+    return pd.to_numeric(cleaned, errors="coerce")
+
+
+def to_datetime_if_dates(series: pd.Series) -> Optional[pd.Series]:
+    """
+    Returns the series parsed as datetimes if it looks like a date column, else None.
+    A text column counts as dates when at least 80% of its non-null values parse.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+        return None
+    non_null = series.dropna()
+    if non_null.empty:
+        return None
+    sample = non_null.iloc[:1000]
+    with warnings.catch_warnings():
+        # Mixed formats fall back to dateutil, which is fine here
+        warnings.simplefilter("ignore", UserWarning)
+        if pd.to_datetime(sample, errors="coerce").notna().mean() < 0.8:
+            return None
+        return pd.to_datetime(series, errors="coerce")
+
+
+def date_format(series: pd.Series) -> str:
+    """strftime format for a datetime column: plain dates unless some value has a time of day."""
+    values = series.dropna()
+    return "%Y-%m-%d" if (values == values.dt.normalize()).all() else "%Y-%m-%dT%H:%M:%S"
+
+
+class ChartFrame:
+    """
+    A loaded DataFrame plus memoized per-column work shared between charts.
+    Charts that use the same x-axis reuse one factorization of it, and numeric/date
+    coercion of a column happens at most once per request.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self._numeric: Dict[str, pd.Series] = {}
+        self._dates: Dict[str, Optional[pd.Series]] = {}
+        self._factorized: Dict[str, Tuple[np.ndarray, pd.Index]] = {}
+        self._aggregates: Dict[Tuple[str, str, str], pd.Series] = {}
+
+    def numeric(self, column: str) -> pd.Series:
+        if column not in self._numeric:
+            self._numeric[column] = to_numeric(self.df[column])
+        return self._numeric[column]
+
+    def dates(self, column: str) -> Optional[pd.Series]:
+        if column not in self._dates:
+            self._dates[column] = to_datetime_if_dates(self.df[column])
+        return self._dates[column]
+
+    def factorized(self, column: str) -> Tuple[np.ndarray, pd.Index]:
+        """Group codes (-1 for missing) and sorted unique keys for a column."""
+        if column not in self._factorized:
+            codes, uniques = pd.factorize(self.df[column], sort=True)
+            self._factorized[column] = (codes, pd.Index(uniques))
+        return self._factorized[column]
+
+    def group_aggregate(self, x_axis: str, y_axis: str, agg: str) -> pd.Series:
+        """`y_axis` aggregated per `x_axis` value, indexed by the sorted x keys."""
+        key = (x_axis, y_axis, agg)
+        if key not in self._aggregates:
+            codes, uniques = self.factorized(x_axis)
+            values = pd.Series(self.numeric(y_axis).to_numpy())
+            result = values.groupby(codes).agg(agg)
+            result = result[result.index >= 0]
+            result.index = uniques[result.index.to_numpy()]
+            self._aggregates[key] = result
+        return self._aggregates[key]
+
+    def group_counts(self, x_axis: str) -> pd.Series:
+        """Row count per `x_axis` value, most frequent first."""
+        codes, uniques = self.factorized(x_axis)
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        return pd.Series(counts, index=uniques).sort_values(ascending=False, kind="stable")
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+    `x` must be sorted ascending. Returns the indices of the selected points,
+    always keeping the first and last point.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = x.astype(np.float64, copy=False)
+    y = y.astype(np.float64, copy=False)
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    # Bucket edges over the interior points (first and last are fixed)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+
+        # Average of the next bucket (or the last point for the final bucket)
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+            avg_x = x[next_start:next_end].mean()
+            avg_y = y[next_start:next_end].mean()
+        else:
+            avg_x, avg_y = x[n - 1], y[n - 1]
+
+        # Pick the point forming the largest triangle with the previous pick and the next average
+        bx = x[start:end]
+        by = y[start:end]
+        areas = np.abs((x[a] - avg_x) * (by - y[a]) - (x[a] - bx) * (avg_y - y[a]))
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+
+    return selected
+
+
+def bucket_series(x: pd.Series, y: pd.Series, bucket: str, agg: str) -> Tuple[pd.Series, pd.Series]:
+    """Aggregates `y` into day/week/month buckets of the datetime series `x`."""
+    if bucket == "day":
+        keys = x.dt.floor("D")
+    elif bucket == "week":
+        keys = x.dt.to_period("W").dt.start_time
+    else:
+        keys = x.dt.to_period("M").dt.start_time
+
+    grouped = y.groupby(keys, sort=True).agg(agg)
+    return pd.Series(grouped.index), pd.Series(grouped.values)
+
+
+def downsample_line(
+    frame: ChartFrame,
+    x_axis: str,
+    y_axis: str,
+    points: int = DEFAULT_POINTS,
+    bucket: Optional[str] = None,
+    agg: str = "sum",
+) -> Tuple[list, dict]:
+    """
+    Reduces a line series to at most `points` representative points.
+    Numeric and date x-axes are downsampled with LTTB on their real values;
+    other x-axes use row position. Returns (records, meta).
+    """
+    df = frame.df
+    y = frame.numeric(y_axis)
+    x_dates = frame.dates(x_axis)
+    source_points = len(df)
+
+    if bucket:
+        if x_dates is None:
+            raise ValueError(f"Column {x_axis} is not a date column and cannot be bucketed")
+        mask = x_dates.notna() & y.notna()
+        x, y = bucket_series(x_dates[mask], y[mask], bucket, agg)
+        x_kind = "datetime"
+    elif x_dates is not None:
+        mask = x_dates.notna() & y.notna()
+        x, y = x_dates[mask], y[mask]
+        x_kind = "datetime"
+    elif pd.api.types.is_numeric_dtype(df[x_axis]):
+        mask = df[x_axis].notna() & y.notna()
+        x, y = df[x_axis][mask], y[mask]
+        x_kind = "numeric"
+    else:
+        mask = y.notna()
+        x, y = df[x_axis][mask].astype(str), y[mask]
+        x_kind = "category"
+
+    x = x.reset_index(drop=True)
+    y = y.reset_index(drop=True)
+
+    # Sort only when needed; exports are usually already in date order
+    if x_kind != "category" and not x.is_monotonic_increasing:
+        order = np.argsort(x.to_numpy(), kind="stable")
+        x = x.iloc[order].reset_index(drop=True)
+        y = y.iloc[order].reset_index(drop=True)
+
+    if x_kind == "datetime":
+        x_values = x.to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    elif x_kind == "numeric":
+        x_values = x.to_numpy(dtype=np.float64)
+    else:
+        x_values = np.arange(len(x), dtype=np.float64)
+
+    idx = lttb_indices(x_values, y.to_numpy(dtype=np.float64), points)
+    x_out = x.iloc[idx]
+    y_out = y.iloc[idx]
+
+    if x_kind == "datetime":
+        x_out = x_out.dt.strftime(date_format(x))
+
+    records = [
+        {x_axis: xv, y_axis: float(yv)}
+        for xv, yv in zip(x_out.tolist(), y_out.tolist())
+    ]
+    meta = {
+        "source_points": source_points,
+        "points": len(records),
+        "downsampled": len(idx) < len(x),
+        "bucket": bucket,
+        "agg": agg if bucket else None,
+    }
+    return records, meta
+
+
+def _series_config(x_axis: str, y_key: str, y_label: str) -> dict:
+    return {
+        x_axis: {"label": x_axis.title(), "color": "hsl(var(--chart-1))"},
+        y_key: {"label": y_label, "color": "hsl(var(--chart-2))"}
+    }
+
+
+def _bin_edges(values: np.ndarray, bins: Optional[int], default: Optional[int] = None) -> np.ndarray:
+    """Histogram edges: `bins` if given, else numpy's "auto" rule capped at MAX_BINS."""
+    if bins:
+        return np.histogram_bin_edges(values, bins=min(bins, MAX_BINS))
+    if default:
+        return np.histogram_bin_edges(values, bins=default)
+    edges = np.histogram_bin_edges(values, bins="auto")
+    if len(edges) - 1 > MAX_BINS:
+        edges = np.histogram_bin_edges(values, bins=MAX_BINS)
+    return edges
+
+
+def _bin_label(start: float, end: float) -> str:
+    return f"{start:,.4g} – {end:,.4g}"
+
+
+def histogram(frame: ChartFrame, x_axis: str, y_axis: Optional[str], agg: str, bins: Optional[int]) -> Tuple[list, dict]:
+    """
+    Distribution of a numeric column. Counts rows per bin, or aggregates
+    `y_axis` per bin when one is given (sum and mean use weighted np.histogram).
+    """
+    x = frame.numeric(x_axis)
+    if not pd.api.types.is_numeric_dtype(x) or x.notna().sum() == 0:
+        raise ValueError(f"Column {x_axis} is not numeric and cannot be binned")
+
+    if y_axis:
+        y = frame.numeric(y_axis)
+        mask = (x.notna() & y.notna()).to_numpy()
+    else:
+        mask = x.notna().to_numpy()
+    values = x.to_numpy(dtype=np.float64)[mask]
+
+    edges = _bin_edges(values, bins)
+    counts, _ = np.histogram(values, bins=edges)
+
+    value_key = "count"
+    result = counts.astype(np.float64)
+    if y_axis:
+        weights = y.to_numpy(dtype=np.float64)[mask]
+        value_key = y_axis
+        if agg in ("sum", "mean"):
+            sums, _ = np.histogram(values, bins=edges, weights=weights)
+            result = sums if agg == "sum" else np.divide(sums, counts, out=np.full_like(sums, np.nan), where=counts > 0)
+        else:
+            codes = np.clip(np.searchsorted(edges, values, side="right") - 1, 0, len(edges) - 2)
+            grouped = pd.Series(weights).groupby(codes).agg(agg)
+            result = np.full(len(counts), np.nan)
+            result[grouped.index.to_numpy()] = grouped.to_numpy()
+
+    data = [
+        {
+            x_axis: _bin_label(edges[i], edges[i + 1]),
+            "bin_start": float(edges[i]),
+            "bin_end": float(edges[i + 1]),
+            value_key: _to_json(result[i]) if y_axis else int(counts[i]),
+        }
+        for i in range(len(counts))
+    ]
+    meta = {"source_points": int(mask.sum()), "bins": len(counts), "agg": agg if y_axis else "count"}
+    return data, meta
+
+
+def _axis_codes(frame: ChartFrame, column: str, bins: Optional[int]) -> Tuple[np.ndarray, list, Optional[np.ndarray]]:
+    """
+    Integer cell codes (-1 = excluded) and labels for one heatmap axis.
+    Numeric columns are binned; other columns keep their most frequent values.
+    Returns (codes, labels, edges) where edges is None for categorical axes.
+    """
+    numeric = frame.numeric(column)
+    if pd.api.types.is_numeric_dtype(frame.df[column]) or numeric.notna().mean() > 0.9:
+        values = numeric.to_numpy(dtype=np.float64)
+        finite = np.isfinite(values)
+        if not finite.any():
+            return np.full(len(values), -1), [], None
+        edges = _bin_edges(values[finite], bins, DEFAULT_HEATMAP_BINS)
+        codes = np.clip(np.searchsorted(edges, values, side="right") - 1, 0, len(edges) - 2)
+        codes[~finite] = -1
+        labels = [_bin_label(edges[i], edges[i + 1]) for i in range(len(edges) - 1)]
+        return codes, labels, edges
+
+    codes, uniques = frame.factorized(column)
+    counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    top = np.argsort(-counts, kind="stable")[:MAX_HEATMAP_CATEGORIES]
+    remap = np.full(len(uniques) + 1, -1)
+    remap[top] = np.arange(len(top))
+    # codes of -1 index the trailing sentinel, which stays -1
+    new_codes = remap[codes]
+    labels = [_to_json(uniques[i]) for i in top]
+    return new_codes, labels, None
+
+
+def heatmap(
+    frame: ChartFrame,
+    x_axis: str,
+    y_axis: str,
+    value_axis: Optional[str],
+    agg: str,
+    bins: Optional[int],
+) -> Tuple[list, dict]:
+    """
+    2-D aggregate over two columns. Numeric pairs use np.histogram2d; categorical
+    axes are grouped on their most frequent values. Cells hold the row count, or
+    `value_axis` aggregated with `agg`. Empty cells are omitted.
+    """
+    x_codes, x_labels, x_edges = _axis_codes(frame, x_axis, bins)
+    y_codes, y_labels, y_edges = _axis_codes(frame, y_axis, bins)
+    mask = (x_codes >= 0) & (y_codes >= 0)
+    weights = None
+    if value_axis:
+        weights = frame.numeric(value_axis).to_numpy(dtype=np.float64)
+        mask &= np.isfinite(weights)
+
+    shape = (len(x_labels), len(y_labels))
+    if x_edges is not None and y_edges is not None and agg in ("sum", "mean"):
+        xv = frame.numeric(x_axis).to_numpy(dtype=np.float64)[mask]
+        yv = frame.numeric(y_axis).to_numpy(dtype=np.float64)[mask]
+        counts, _, _ = np.histogram2d(xv, yv, bins=[x_edges, y_edges])
+        if weights is not None:
+            sums, _, _ = np.histogram2d(xv, yv, bins=[x_edges, y_edges], weights=weights[mask])
+            values = sums if agg == "sum" else np.divide(sums, counts, out=np.zeros_like(sums), where=counts > 0)
+        else:
+            values = counts.astype(np.int64)
+    else:
+        cell = x_codes[mask] * shape[1] + y_codes[mask]
+        counts = np.bincount(cell, minlength=shape[0] * shape[1]).reshape(shape).astype(np.float64)
+        if weights is None:
+            values = counts.astype(np.int64)
+        elif agg in ("sum", "mean"):
+            sums = np.bincount(cell, weights=weights[mask], minlength=shape[0] * shape[1]).reshape(shape)
+            values = sums if agg == "sum" else np.divide(sums, counts, out=np.zeros_like(sums), where=counts > 0)
+        else:
+            grouped = pd.Series(weights[mask]).groupby(cell).agg(agg)
+            values = np.zeros(shape[0] * shape[1])
+            values[grouped.index.to_numpy()] = grouped.to_numpy()
+            values = values.reshape(shape)
+
+    value_key = value_axis or "count"
+    xi, yi = np.nonzero(counts)
+    data = [
+        {x_axis: x_labels[i], y_axis: y_labels[j], value_key: _to_json(values[i, j])}
+        for i, j in zip(xi.tolist(), yi.tolist())
+    ]
+    meta = {
+        "source_points": int(mask.sum()),
+        "x_labels": x_labels,
+        "y_labels": y_labels,
+        "agg": agg if value_axis else "count",
+    }
+    return data, meta
+
+
+def scatter(frame: ChartFrame, x_axis: str, y_axis: str, points: int) -> Tuple[list, dict]:
+    """
+    Scatter sample of at most `points` points.
+    Sampling weight is inversely proportional to the square root of local density
+    (estimated on a SCATTER_GRID x SCATTER_GRID grid), so dense clusters are thinned
+    while sparse regions and outliers survive. Each point carries its cell density.
+    """
+    x = frame.numeric(x_axis).to_numpy(dtype=np.float64)
+    y = frame.numeric(y_axis).to_numpy(dtype=np.float64)
+    mask = np.isfinite(x) & np.isfinite(y)
+    if not mask.any():
+        raise ValueError("Scatter chart requires numeric X and Y columns")
+    xv, yv = x[mask], y[mask]
+
+    x_edges = np.linspace(xv.min(), xv.max(), SCATTER_GRID + 1)
+    y_edges = np.linspace(yv.min(), yv.max(), SCATTER_GRID + 1)
+    cx = np.clip(np.searchsorted(x_edges, xv, side="right") - 1, 0, SCATTER_GRID - 1)
+    cy = np.clip(np.searchsorted(y_edges, yv, side="right") - 1, 0, SCATTER_GRID - 1)
+    cell = cx * SCATTER_GRID + cy
+    density = np.bincount(cell, minlength=SCATTER_GRID * SCATTER_GRID)[cell]
+
+    if len(xv) > points:
+        # Weighted sampling without replacement (Efraimidis-Spirakis), seeded for stable output
+        rng = np.random.default_rng(0)
+        keys = np.log(rng.random(len(xv))) * np.sqrt(density)
+        chosen = np.sort(np.argpartition(keys, -points)[-points:])
+    else:
+        chosen = np.arange(len(xv))
+
+    data = [
+        {x_axis: float(a), y_axis: float(b), "density": int(d)}
+        for a, b, d in zip(xv[chosen].tolist(), yv[chosen].tolist(), density[chosen].tolist())
+    ]
+    meta = {
+        "source_points": int(len(xv)),
+        "points": len(data),
+        "downsampled": len(data) < len(xv),
+    }
+    return data, meta
+
+
+def compute_chart(
+    frame: ChartFrame,
+    type: str,
+    x_axis: str,
+    y_axis: Optional[str] = None,
+    agg: str = "sum",
+    points: int = DEFAULT_POINTS,
+    bucket: Optional[str] = None,
+    value_axis: Optional[str] = None,
+    bins: Optional[int] = None,
+) -> Tuple[List[dict], dict, Optional[dict]]:
+    """
+    Computes one chart from a loaded frame. Returns (data, config, meta).
+    Raises ValueError for specs that cannot be drawn from this data.
+    """
+    df = frame.df
+    for column in (x_axis, y_axis, value_axis):
+        if column and column != "count_ops" and column not in df.columns:
+            raise ValueError(f"Column {column} not found")
+
+    if type == "bar":
+        if not y_axis or y_axis == "count_ops":
+            counts = frame.group_counts(x_axis).head(10)
+            data = [{x_axis: _to_json(k), "count": int(v)} for k, v in counts.items()]
+            return data, _series_config(x_axis, "count", "Count"), None
+
+        grouped = frame.group_aggregate(x_axis, y_axis, agg).head(10)
+        data = [{x_axis: _to_json(k), y_axis: _to_json(v)} for k, v in grouped.items()]
+        return data, _series_config(x_axis, y_axis, y_axis.title()), None
+
+    if type == "line":
+        if not y_axis or y_axis == "count_ops":
+            raise ValueError("Line chart requires a Y axis")
+        data, meta = downsample_line(frame, x_axis, y_axis, points, bucket, agg)
+        return data, _series_config(x_axis, y_axis, y_axis.title()), meta
+
+    if type == "histogram":
+        y_key = None if y_axis == "count_ops" else y_axis
+        data, meta = histogram(frame, x_axis, y_key, agg, bins)
+        value_key = y_key or "count"
+        return data, _series_config(x_axis, value_key, value_key.title()), meta
+
+    if type == "heatmap":
+        if not y_axis or y_axis == "count_ops":
+            raise ValueError("Heatmap requires a Y axis")
+        data, meta = heatmap(frame, x_axis, y_axis, value_axis, agg, bins)
+        value_key = value_axis or "count"
+        config = _series_config(x_axis, y_axis, y_axis.title())
+        config[value_key] = {"label": value_key.title(), "color": "hsl(var(--chart-3))"}
+        return data, config, meta
+
+    if type == "scatter":
+        if not y_axis or y_axis == "count_ops":
+            raise ValueError("Scatter chart requires a Y axis")
+        data, meta = scatter(frame, x_axis, y_axis, points)
+        return data, _series_config(x_axis, y_axis, y_axis.title()), meta
+
+    raise ValueError(f"Chart type {type} not supported yet")
+
+
+def _to_json(value):
+    """Converts numpy/pandas scalars to plain JSON-friendly Python values."""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        value = value.item()
+        if isinstance(value, float) and np.isnan(value):
+            return None
+    return value
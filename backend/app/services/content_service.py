@@ -0,0 +1,376 @@
+"""
+K2M Analytics - Dataset Content Views
+======================================
+Row windows of a dataset for the data grid: filter predicates, text search and
+sort keys, then an offset/limit page. A view is resolved once to an array of
+row positions (sort permutations, filter masks and per-column inverted token
+indexes are cached per dataset version), so each page costs O(page size).
+Pages are returned as JSON records, or streamed as Arrow IPC or NDJSON when
+the client asks for them via `Accept`.
+"""
+
+import json
+import operator
+import os
+import re
+import sys
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from ..models import Dataset
+from . import dataset_loader, export_service, metrics
+
+JSON = "application/json"
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+NDJSON = "application/x-ndjson"
+MEDIA_TYPES = (JSON, ARROW_STREAM, NDJSON)
+
+FILTER_OPERATORS = {
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "lt": operator.lt,
+    "lte": operator.le,
+    "in": None,        # handled separately (list membership)
+    "contains": None,  # case-insensitive substring
+}
+
+
+def negotiate(accept: Optional[str]) -> str:
+    """Picks the response media type for a content page from an Accept header (JSON by default)."""
+    if not accept:
+        return JSON
+    best, best_quality = JSON, 0.0
+    for part in accept.split(","):
+        media, _, params = part.strip().partition(";")
+        media = media.strip().lower()
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if media in MEDIA_TYPES and quality > best_quality:
+            best, best_quality = media, quality
+    return best
+
+
+def parse_filters(filters: Optional[str]) -> Dict[str, object]:
+    """
+    Decodes the `filters` query parameter: a JSON object of column -> predicate.
+    A predicate is a plain value (equality; "All" or empty is ignored) or an object
+    of operators, e.g. {"total_sales": {"gte": 1000}, "region": {"in": ["EU", "US"]}}.
+    """
+    if not filters:
+        return {}
+    parsed = json.loads(filters)
+    if not isinstance(parsed, dict):
+        raise ValueError("filters must be a JSON object of column -> value")
+    for col, predicate in parsed.items():
+        if isinstance(predicate, dict):
+            unknown = set(predicate) - set(FILTER_OPERATORS)
+            if unknown:
+                raise ValueError(f"Unknown operator(s) for {col}: {', '.join(sorted(unknown))}")
+    return parsed
+
+
+def parse_sort(sort_by: Optional[str], sort_dir: str = "asc") -> List[Tuple[str, bool]]:
+    """
+    Sort keys from `sort_by`: comma-separated columns, each optionally prefixed
+    with "-" for descending; unprefixed columns follow `sort_dir`.
+    Returns (column, descending) pairs.
+    """
+    keys = []
+    for part in (sort_by or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if part.startswith("-"):
+            keys.append((part[1:], True))
+        else:
+            keys.append((part, sort_dir == "desc"))
+    return keys
+
+
+# ============ Cached Views ============
+
+class _LRUCache:
+    """Thread-safe LRU cache bounded by the total size of its values in bytes."""
+
+    def __init__(self, name: str, max_bytes: int):
+        self.name = name
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[tuple, Tuple[object, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            metrics.cache_lookup(self.name, item is not None)
+            if item is None:
+                return None
+            self._items.move_to_end(key)
+            return item[0]
+
+    def put(self, key, value, size: int):
+        with self._lock:
+            if key in self._items:
+                self._bytes -= self._items.pop(key)[1]
+            self._items[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._items) > 1:
+                _, (_, evicted) = self._items.popitem(last=False)
+                self._bytes -= evicted
+
+    @property
+    def size(self) -> int:
+        return self._bytes
+
+
+# Loaded frames per (dataset, version), and the arrays derived from them
+_frames = _LRUCache("content_frames", int(os.getenv("CONTENT_FRAME_CACHE_BYTES", str(512 * 1024 ** 2))))
+_arrays = _LRUCache("content_arrays", int(os.getenv("CONTENT_INDEX_CACHE_BYTES", str(256 * 1024 ** 2))))
+metrics.register_gauge(
+    "k2m_cache_bytes", "Bytes held by in-memory caches.",
+    lambda: {(cache.name,): cache.size for cache in (_frames, _arrays)}, ("cache",),
+)
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def _frame(dataset: Dataset) -> pd.DataFrame:
+    key = (dataset.id, dataset.version)
+    df = _frames.get(key)
+    if df is None:
+        df = dataset_loader.load_dataframe(dataset)
+        # deep=True counts the Python strings of object columns, not just their pointers
+        _frames.put(key, df, int(df.memory_usage(deep=True).sum()))
+    return df
+
+
+def _cached(key: tuple, build) -> np.ndarray:
+    array = _arrays.get(key)
+    if array is None:
+        with metrics.stage("compute"):
+            array = build()
+        _arrays.put(key, array, array.nbytes)
+    return array
+
+
+def _check_column(df: pd.DataFrame, col: str, what: str):
+    if col not in df.columns:
+        raise ValueError(f"Unknown {what} column: {col}")
+
+
+def sort_permutation(dataset: Dataset, df: pd.DataFrame, keys: List[Tuple[str, bool]]) -> np.ndarray:
+    """Row order for the sort keys (stable, missing values last), cached per dataset version."""
+    for col, _ in keys:
+        _check_column(df, col, "sort")
+
+    def build():
+        ordered = df.sort_values(
+            [col for col, _ in keys],
+            ascending=[not descending for _, descending in keys],
+            kind="stable",
+            na_position="last",
+            ignore_index=False,
+        )
+        return np.asarray(df.index.get_indexer(ordered.index), dtype=np.int64)
+
+    return _cached((dataset.id, dataset.version, "sort", tuple(keys)), build)
+
+
+def _predicate_mask(series: pd.Series, predicate) -> Optional[np.ndarray]:
+    if not isinstance(predicate, dict):
+        if predicate is None or predicate == "" or predicate == "All":
+            return None
+        predicate = {"eq": predicate}
+
+    mask = np.ones(len(series), dtype=bool)
+    for op, value in predicate.items():
+        try:
+            if op == "in":
+                result = series.isin(value if isinstance(value, list) else [value])
+            elif op == "contains":
+                result = series.astype(str).str.contains(str(value), case=False, regex=False)
+            else:
+                if pd.api.types.is_datetime64_any_dtype(series):
+                    value = pd.Timestamp(value)
+                result = FILTER_OPERATORS[op](series, value)
+        except TypeError:
+            raise ValueError(f"Cannot compare column {series.name} with {value!r}")
+        mask &= np.asarray(result.fillna(False) if hasattr(result, "fillna") else result, dtype=bool)
+    return mask
+
+
+def filter_mask(df: pd.DataFrame, filters: Dict[str, object]) -> Optional[np.ndarray]:
+    """Boolean row mask for all predicates combined; None when nothing filters."""
+    mask = None
+    for col, predicate in filters.items():
+        _check_column(df, col, "filter")
+        col_mask = _predicate_mask(df[col], predicate)
+        if col_mask is not None:
+            mask = col_mask if mask is None else mask & col_mask
+    return mask
+
+
+def _tokens(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class _TokenIndex:
+    """
+    Inverted index of one text column: sorted vocabulary -> distinct-value codes,
+    plus the rows grouped by code, so postings are gathered in O(matches).
+    """
+
+    def __init__(self, series: pd.Series):
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        postings: Dict[str, List[int]] = {}
+        for code, value in enumerate(uniques):
+            for token in set(_tokens(str(value))):
+                postings.setdefault(token, []).append(code)
+        self.vocabulary = sorted(postings)
+        self.value_codes = [np.asarray(postings[t], dtype=np.int64) for t in self.vocabulary]
+        self.order = np.argsort(codes, kind="stable")
+        # Rows of value code c are order[starts[c]:starts[c + 1]] (code -1 = missing sorts first)
+        self.starts = np.searchsorted(codes[self.order], np.arange(len(uniques) + 1))
+        self.nbytes = (
+            self.order.nbytes + self.starts.nbytes + sum(c.nbytes for c in self.value_codes)
+            + sys.getsizeof(self.vocabulary) + sum(sys.getsizeof(t) for t in self.vocabulary)
+        )
+
+    def rows(self, prefix: str) -> np.ndarray:
+        """Rows whose value contains a token starting with `prefix`."""
+        lo = bisect_left(self.vocabulary, prefix)
+        hi = bisect_left(self.vocabulary, prefix + "\uffff")
+        if lo == hi:
+            return np.empty(0, dtype=np.int64)
+        codes = np.unique(np.concatenate(self.value_codes[lo:hi]))
+        return np.concatenate([self.order[self.starts[c]:self.starts[c + 1]] for c in codes])
+
+
+def _token_index(dataset: Dataset, df: pd.DataFrame, col: str) -> _TokenIndex:
+    key = (dataset.id, dataset.version, "tokens", col)
+    index = _arrays.get(key)
+    if index is None:
+        index = _TokenIndex(df[col])
+        _arrays.put(key, index, index.nbytes)
+    return index
+
+
+def _text_columns(df: pd.DataFrame) -> List[str]:
+    return [
+        c for c in df.columns
+        if pd.api.types.is_object_dtype(df[c]) or pd.api.types.is_string_dtype(df[c])
+        or isinstance(df[c].dtype, pd.CategoricalDtype)
+    ]
+
+
+def search_mask(dataset: Dataset, df: pd.DataFrame, query: str) -> Optional[np.ndarray]:
+    """
+    Rows matching every token of `query` (prefix match) in any text column,
+    answered from per-column inverted indexes built on first use.
+    """
+    tokens = _tokens(query or "")
+    if not tokens:
+        return None
+    columns = _text_columns(df)
+    mask = np.ones(len(df), dtype=bool)
+    for token in tokens:
+        hits = np.zeros(len(df), dtype=bool)
+        for col in columns:
+            hits[_token_index(dataset, df, col).rows(token)] = True
+        mask &= hits
+    return mask
+
+
+@dataclass
+class ContentView:
+    frame: pd.DataFrame
+    rows: Optional[np.ndarray]  # Row positions of the view in order; None = all rows in file order
+
+    @property
+    def total_rows(self) -> int:
+        return len(self.frame) if self.rows is None else len(self.rows)
+
+    def page(self, offset: int, limit: int) -> pd.DataFrame:
+        if self.rows is None:
+            return self.frame.iloc[offset:offset + limit]
+        return self.frame.take(self.rows[offset:offset + limit])
+
+
+def get_view(
+    dataset: Dataset,
+    filters: Dict[str, object],
+    sort_keys: List[Tuple[str, bool]],
+    query: Optional[str] = None,
+) -> ContentView:
+    """
+    Resolves a filtered / searched / sorted view to an array of row positions.
+    The result is cached per dataset version, so paging through a view only
+    slices that array and takes the page rows. Raises ValueError for bad specs.
+    """
+    df = _frame(dataset)
+    if not filters and not sort_keys and not (query or "").strip():
+        return ContentView(df, None)
+
+    view_key = (
+        dataset.id, dataset.version, "view",
+        json.dumps(filters, sort_keys=True, default=str), tuple(sort_keys), " ".join(_tokens(query or "")),
+    )
+
+    def build():
+        mask = filter_mask(df, filters)
+        matches = search_mask(dataset, df, query)
+        if matches is not None:
+            mask = matches if mask is None else mask & matches
+        if sort_keys:
+            order = sort_permutation(dataset, df, sort_keys)
+            return order if mask is None else order[mask[order]]
+        return np.arange(len(df), dtype=np.int64) if mask is None else np.flatnonzero(mask)
+
+    return ContentView(df, _cached(view_key, build))
+
+
+def to_records(df: pd.DataFrame) -> List[dict]:
+    """JSON rows of a page; missing values become "" and date-only datetimes are shown as dates."""
+    with metrics.stage("serialize"):
+        page = export_service.format_dates(df).astype(object)
+        return page.where(df.notna(), "").to_dict(orient="records")
+
+
+def to_arrow(df: pd.DataFrame) -> pa.Table:
+    """Arrow table of a page; mixed-type object columns fall back to strings."""
+    with metrics.stage("serialize"):
+        try:
+            return pa.Table.from_pandas(df, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            mixed = {c: df[c].map(lambda v: None if pd.isna(v) else str(v)) for c in df.columns if df[c].dtype == object}
+            return pa.Table.from_pandas(df.assign(**mixed), preserve_index=False)
+
+
+def iter_arrow_stream(table: pa.Table) -> Iterator[bytes]:
+    """Streams a table in the Arrow IPC stream format, one record batch at a time."""
+    sink = export_service.ChunkSink()
+    with pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), table.schema) as writer:
+        yield sink.drain()
+        for batch in table.to_batches(max_chunksize=export_service.BATCH_ROWS):
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def iter_ndjson(table: pa.Table) -> Iterator[bytes]:
+    return export_service.iter_ndjson_batches(table.to_batches(max_chunksize=export_service.BATCH_ROWS))
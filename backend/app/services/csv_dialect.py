@@ -0,0 +1,193 @@
+"""
+K2M Analytics - CSV Dialect Detection
+======================================
+Sniffs how a CSV file is written from the first bytes of the upload: encoding,
+delimiter, header row (title lines above the header are skipped), decimal and
+thousands separators, the date format of each date column, and whether quoted
+values span lines (which stops Arrow from parsing blocks in parallel).
+The result is stored on the dataset and every later parse reuses it with
+Arrow's multi-threaded CSV reader.
+"""
+
+import codecs
+import csv
+import json
+import re
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import pyarrow.csv as pa_csv
+
+from ..models import Dataset
+
+try:
+    import charset_normalizer
+    HAS_CHARSET_NORMALIZER = True
+except ImportError:
+    HAS_CHARSET_NORMALIZER = False
+
+DELIMITERS = [",", ";", "\t", "|"]
+FALLBACK_ENCODING = "cp1252"
+SNIFF_LINES = 200
+DATE_FORMATS = [
+    "%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%Y/%m/%d",
+    "%d.%m.%Y", "%d.%m.%Y %H:%M", "%d.%m.%Y %H:%M:%S",
+    "%m/%d/%Y", "%m/%d/%Y %H:%M", "%d/%m/%Y", "%d/%m/%Y %H:%M",
+    "%d-%m-%Y",
+]
+ARROW_BLOCK_SIZE = 16 * 1024 * 1024  # Bytes per parse block (blocks are parsed in parallel)
+
+DEFAULT_DIALECT = {
+    "encoding": "utf-8",
+    "delimiter": ",",
+    "header_row": 0,
+    "decimal": ".",
+    "thousands": None,
+    "date_formats": {},
+    "newlines_in_values": False,
+}
+
+_COMMA_DECIMAL = re.compile(r"^-?\d{1,3}(\.\d{3})*,\d+$|^-?\d+,\d+$")
+_DOT_DECIMAL = re.compile(r"^-?\d{1,3}(,\d{3})*\.\d+$|^-?\d+\.\d+$")
+_DATE_LIKE = re.compile(r"^\d{1,4}[-./]\d{1,2}[-./]\d{1,4}")
+
+
+def detect_encoding(head: bytes) -> str:
+    """UTF-8 when the bytes decode as such, otherwise the best charset guess."""
+    try:
+        # Incremental decode: the sample may end in the middle of a multi-byte character
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    if HAS_CHARSET_NORMALIZER:
+        best = charset_normalizer.from_bytes(head).best()
+        if best and best.encoding:
+            return best.encoding
+    return FALLBACK_ENCODING
+
+
+def _split_rows(lines: List[str], delimiter: str) -> List[List[str]]:
+    return list(csv.reader(lines, delimiter=delimiter))
+
+
+def _detect_layout(lines: List[str]):
+    """(delimiter, header_row): the delimiter giving the most lines with one consistent field count."""
+    best = None
+    for delimiter in DELIMITERS:
+        counts = [len(row) for row in _split_rows(lines, delimiter)]
+        if not counts:
+            continue
+        fields, frequency = Counter(counts).most_common(1)[0]
+        score = (fields > 1, frequency, fields)
+        if best is None or score > best[0]:
+            best = (score, delimiter, counts.index(fields))
+    if best is None:
+        return ",", 0
+    return best[1], best[2]
+
+
+def _detect_decimal(values: List[str]):
+    comma = sum(1 for v in values if _COMMA_DECIMAL.match(v))
+    dot = sum(1 for v in values if _DOT_DECIMAL.match(v))
+    if comma > dot:
+        thousands = "." if any("." in v for v in values if _COMMA_DECIMAL.match(v)) else None
+        return ",", thousands
+    return ".", None
+
+
+def _detect_date_format(values: List[str]) -> Optional[str]:
+    if not values or not all(_DATE_LIKE.match(v) for v in values):
+        return None
+    for fmt in DATE_FORMATS:
+        try:
+            for v in values:
+                datetime.strptime(v, fmt)
+            return fmt
+        except ValueError:
+            continue
+    return None
+
+
+def sniff(head: bytes) -> dict:
+    """Detects the dialect of a CSV from its first bytes."""
+    encoding = detect_encoding(head)
+    text = head.decode("utf-8-sig" if encoding == "utf-8" else encoding, errors="replace")
+    lines = text.splitlines()
+    if len(lines) > 1 and not text.endswith(("\n", "\r")):
+        lines = lines[:-1]  # the last line was cut off by the sample size
+    lines = lines[:SNIFF_LINES]  # raw lines, so header_row counts the same lines the parsers skip
+    if not any(line.strip() for line in lines):
+        return dict(DEFAULT_DIALECT, encoding=encoding)
+
+    delimiter, header_row = _detect_layout(lines)
+    rows = _split_rows(lines[header_row:], delimiter)
+    header, data = rows[0], [row for row in rows[1:] if row]
+
+    cells = [v.strip() for row in data for v in row if v.strip()]
+    decimal, thousands = _detect_decimal(cells)
+
+    date_formats = {}
+    for i, name in enumerate(header):
+        values = [row[i].strip() for row in data if i < len(row) and row[i].strip()]
+        fmt = _detect_date_format(values)
+        if fmt:
+            date_formats[name] = fmt
+
+    return {
+        "encoding": encoding,
+        "delimiter": delimiter,
+        "header_row": header_row,
+        "decimal": decimal,
+        "thousands": thousands,
+        "date_formats": date_formats,
+        # An odd number of quotes on a line means a quoted value continues on the next one
+        "newlines_in_values": any(line.count('"') % 2 for line in lines[header_row:]),
+    }
+
+
+def load(dataset: Dataset) -> dict:
+    """
+    Stored dialect of a dataset; datasets uploaded before sniffing use the defaults.
+    Dialects sniffed before quoted newlines were detected keep assuming them.
+    """
+    if dataset.csv_dialect_json:
+        return {**DEFAULT_DIALECT, "newlines_in_values": True, **json.loads(dataset.csv_dialect_json)}
+    return dict(DEFAULT_DIALECT)
+
+
+def arrow_options(dialect: dict, columns: Optional[List[str]] = None):
+    """(read, parse, convert) options for pyarrow.csv.read_csv."""
+    encoding = dialect["encoding"]
+    read_options = pa_csv.ReadOptions(
+        skip_rows=dialect["header_row"],
+        encoding="utf8" if encoding.lower().replace("-", "") in ("utf8", "utf8sig") else encoding,
+        use_threads=True,
+        block_size=ARROW_BLOCK_SIZE,
+    )
+    parse_options = pa_csv.ParseOptions(
+        delimiter=dialect["delimiter"], newlines_in_values=dialect["newlines_in_values"]
+    )
+    convert_options = pa_csv.ConvertOptions(
+        include_columns=columns,
+        timestamp_parsers=[pa_csv.ISO8601, *dict.fromkeys(dialect["date_formats"].values())],
+        decimal_point=dialect["decimal"],
+        strings_can_be_null=True,
+    )
+    return read_options, parse_options, convert_options
+
+
+def pandas_kwargs(dialect: dict) -> Dict[str, object]:
+    """Equivalent options for pandas' C parser (header-less page reads and fallbacks)."""
+    kwargs = {
+        "sep": dialect["delimiter"],
+        "encoding": "utf-8-sig" if dialect["encoding"] == "utf-8" else dialect["encoding"],
+        "decimal": dialect["decimal"],
+    }
+    if dialect["thousands"]:
+        kwargs["thousands"] = dialect["thousands"]
+    if dialect["date_formats"]:
+        # Read dates as text ("01.02.2024" must not become a number) and parse them with their format
+        kwargs["dtype"] = {col: str for col in dialect["date_formats"]}
+    return kwargs
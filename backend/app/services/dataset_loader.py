@@ -0,0 +1,206 @@
+"""
+K2M Analytics - Dataset Loader
+===============================
+Single place where uploaded dataset files are read into pandas.
+Routers ask for the columns they need so wide files are not parsed in full.
+Once ingest has written a Parquet copy, reads are served from it, with the
+compact dtypes chosen at ingest (categories, downcast numbers, datetimes,
+Arrow-backed strings).
+CSV files are parsed with Arrow's multi-threaded reader using the dialect
+(encoding, delimiter, header row, date formats) sniffed at upload; .xlsx sheets
+are streamed with openpyxl's read-only mode.
+Single pages are read by seeking with the row index built at ingest.
+gs:// files go through the storage read layer (disk cache and ranged reads).
+Each read is timed as a request stage and counts the bytes it touched.
+"""
+
+import os
+from bisect import bisect_right
+from typing import Iterable, List, Optional
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+from ..models import Dataset
+from . import csv_dialect, excel_reader, metrics, row_index
+from .storage_service import storage_service
+
+
+def _is_csv(dataset: Dataset) -> bool:
+    return dataset.filename.lower().endswith(".csv")
+
+
+def has_columnar(dataset: Dataset) -> bool:
+    path = dataset.columnar_path
+    return bool(path) and (storage_service.is_remote(path) or os.path.exists(path))
+
+
+# Text read from Parquet stays Arrow-backed instead of becoming Python objects
+_ARROW_STRINGS = {pa.string(): pd.StringDtype("pyarrow"), pa.large_string(): pd.StringDtype("pyarrow")}
+
+
+def to_pandas(table: pa.Table) -> pd.DataFrame:
+    return table.to_pandas(types_mapper=_ARROW_STRINGS.get)
+
+
+def _source(path: str) -> str:
+    """Where a read of `path` is served from, for the bytes-read metric."""
+    return "gcs" if storage_service.is_remote(path) and not storage_service.is_cached(path) else "disk"
+
+
+def _chunk_bytes(parquet: pq.ParquetFile, columns: Optional[List[str]], row_groups: Iterable[int]) -> int:
+    """Compressed size of the column chunks a read touches."""
+    meta = parquet.metadata
+    wanted = None if columns is None else set(columns)
+    total = 0
+    for i in row_groups:
+        group = meta.row_group(i)
+        for j in range(group.num_columns):
+            chunk = group.column(j)
+            if wanted is None or chunk.path_in_schema.split(".")[0] in wanted:
+                total += chunk.total_compressed_size
+    return total
+
+
+def _read_parquet(path: str, columns: Optional[List[str]]) -> pd.DataFrame:
+    if columns is not None and not storage_service.is_cached(path):
+        # Column subset of an uncached remote file: ranged reads fetch only the
+        # footer and the needed column chunks instead of the whole object
+        source, label = storage_service.open_input(path), "gcs"
+    else:
+        source, label = open(storage_service.local_path(path), "rb"), "disk"
+    with metrics.stage("read_parquet"), source as f:
+        parquet = pq.ParquetFile(f)
+        table = parquet.read(columns=columns)
+        metrics.add_bytes_read(_chunk_bytes(parquet, columns, range(parquet.num_row_groups)), label)
+    return to_pandas(table)
+
+
+def _unique_names(table: pa.Table) -> pa.Table:
+    """Renames repeated header names the way pandas does (x, x.1, x.2)."""
+    seen, names = {}, []
+    for name in table.column_names:
+        count = seen.get(name, 0)
+        seen[name] = count + 1
+        names.append(f"{name}.{count}" if count else name)
+    return table.rename_columns(names) if len(set(table.column_names)) != len(names) else table
+
+
+def _parse_dates(df: pd.DataFrame, dialect: dict) -> pd.DataFrame:
+    for col, fmt in dialect["date_formats"].items():
+        if col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = pd.to_datetime(df[col], format=fmt, errors="coerce")
+    return df
+
+
+def _parse_thousands(df: pd.DataFrame, dialect: dict) -> pd.DataFrame:
+    """Arrow has no thousands separator option: convert text columns like "1.234,50" afterwards."""
+    if not dialect["thousands"]:
+        return df
+    for col in df.columns:
+        series = df[col]
+        if not (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)) or not series.notna().any():
+            continue
+        cleaned = (
+            series.astype(str)
+            .str.replace(dialect["thousands"], "", regex=False)
+            .str.replace(dialect["decimal"], ".", regex=False)
+        )
+        numbers = pd.to_numeric(cleaned.where(series.notna()), errors="coerce")
+        if numbers.notna().sum() == series.notna().sum():
+            df[col] = numbers
+    return df
+
+
+def read_csv(path: str, dialect: dict, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Parses a local CSV with the Arrow reader (multi-threaded) using a sniffed dialect."""
+    try:
+        try:
+            table = pa_csv.read_csv(path, *csv_dialect.arrow_options(dialect, columns))
+        except pa.ArrowInvalid:
+            if dialect["newlines_in_values"]:
+                raise
+            # A quoted newline past the sniffed sample: parse again, serially
+            dialect = dict(dialect, newlines_in_values=True)
+            table = pa_csv.read_csv(path, *csv_dialect.arrow_options(dialect, columns))
+        df = to_pandas(_unique_names(table))
+    except (pa.ArrowInvalid, UnicodeDecodeError) as e:
+        # Ragged rows and similar: pandas' C parser is more forgiving
+        print(f"WARN: Arrow CSV parse failed, using the C parser: {e}")
+        df = pd.read_csv(path, usecols=columns, skiprows=dialect["header_row"], **csv_dialect.pandas_kwargs(dialect))
+    return _parse_thousands(_parse_dates(df, dialect), dialect)
+
+
+def load_dataframe(
+    dataset: Dataset,
+    columns: Optional[Iterable[str]] = None,
+    columnar: bool = True,
+) -> pd.DataFrame:
+    """
+    Loads a dataset into a DataFrame.
+    If `columns` is given, only those columns are parsed.
+    Reads the Parquet copy when one exists, unless `columnar` is False.
+    """
+    usecols = list(dict.fromkeys(columns)) if columns is not None else None
+    if columnar and has_columnar(dataset):
+        return _read_parquet(dataset.columnar_path, usecols)
+
+    path = storage_service.local_path(dataset.file_path)
+    metrics.add_bytes_read(os.path.getsize(path), "disk")
+    if _is_csv(dataset):
+        with metrics.stage("parse_csv"):
+            return read_csv(path, csv_dialect.load(dataset), usecols)
+    with metrics.stage("parse_excel"):
+        if excel_reader.is_xlsx(dataset):
+            return excel_reader.read_sheet(path, dataset.sheet_name, usecols)
+        return pd.read_excel(path, sheet_name=dataset.sheet_name or 0, usecols=usecols)
+
+
+def _read_row_groups(dataset: Dataset, starts: List[int], total: int, offset: int, limit: int) -> pd.DataFrame:
+    path = dataset.columnar_path
+    label = _source(path)
+    with storage_service.open_input(path) as f:
+        parquet = pq.ParquetFile(f)
+        if offset >= total or limit <= 0:
+            return to_pandas(parquet.schema_arrow.empty_table())
+        first = bisect_right(starts, offset) - 1
+        last = bisect_right(starts, min(offset + limit, total) - 1) - 1
+        groups = list(range(first, last + 1))
+        table = parquet.read_row_groups(groups)
+        metrics.add_bytes_read(_chunk_bytes(parquet, None, groups), label)
+    return to_pandas(table.slice(offset - starts[first], limit))
+
+
+def _read_csv_rows(dataset: Dataset, index: dict, offset: int, limit: int) -> pd.DataFrame:
+    offsets, step = index["csv_offsets"], index["step"]
+    block = offset // step
+    if block >= len(offsets) or offset >= index["rows"] or limit <= 0:
+        return pd.DataFrame(columns=index["columns"])
+    dialect = csv_dialect.load(dataset)
+    label = _source(dataset.file_path)
+    with storage_service.open_input(dataset.file_path) as f:
+        f.seek(offsets[block])
+        df = pd.read_csv(
+            f, header=None, names=index["columns"], skiprows=offset - block * step, nrows=limit,
+            **csv_dialect.pandas_kwargs(dialect)
+        )
+        metrics.add_bytes_read(f.tell() - offsets[block], label)
+    return _parse_thousands(_parse_dates(df, dialect), dialect)
+
+
+def read_rows(dataset: Dataset, offset: int, limit: int) -> Optional[pd.DataFrame]:
+    """
+    Rows [offset, offset + limit) read by seeking with the dataset's row index:
+    only the overlapping Parquet row groups, or the CSV bytes from the nearest
+    indexed offset. Returns None when the dataset has no usable index.
+    """
+    index = row_index.load_index(dataset)
+    if not index:
+        return None
+    with metrics.stage("read_rows"):
+        if index.get("row_groups") and has_columnar(dataset):
+            return _read_row_groups(dataset, index["row_groups"], index["rows"], offset, limit)
+        if index.get("csv_offsets") and _is_csv(dataset):
+            return _read_csv_rows(dataset, index, offset, limit)
+    return None
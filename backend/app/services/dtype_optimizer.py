@@ -0,0 +1,89 @@
+"""
+K2M Analytics - Dtype Optimizer
+================================
+Compacts a freshly parsed DataFrame before it is written to the columnar store:
+
+- low-cardinality text -> category (dictionary-encoded in Parquet), except
+  text that parses as numbers ("$1,200.00"), which analytics convert per value
+- other text -> Arrow-backed strings
+- integers and floats -> the smallest dtype that holds every value exactly
+
+The Parquet schema keeps these types, so every later load gets the compact frame.
+Only the storage changes: text dates stay text, so /stats and the other
+analytics see the same column types as before.
+"""
+
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from . import chart_service
+
+# Text columns become categories when distinct values are at most this share of rows
+CATEGORY_MAX_RATIO = 0.5
+CATEGORY_MAX_DISTINCT = 65_535
+ARROW_STRING = pd.StringDtype("pyarrow")
+
+
+def _downcast_float(series: pd.Series) -> pd.Series:
+    compact = series.astype(np.float32)
+    if np.array_equal(compact.to_numpy(np.float64), series.to_numpy(np.float64), equal_nan=True):
+        return compact
+    return series
+
+
+def _is_numeric_text(series: pd.Series, non_null: int) -> bool:
+    """True when every value parses as a number (currency symbols and separators allowed)."""
+    sample = series.dropna().iloc[:1000]
+    if chart_service.to_numeric(sample).notna().sum() < len(sample):
+        return False
+    return int(chart_service.to_numeric(series).notna().sum()) == non_null
+
+
+def _optimize_text(series: pd.Series) -> pd.Series:
+    if pd.api.types.infer_dtype(series, skipna=True) not in ("string", "empty"):
+        return series  # mixed Python objects stay as they are
+    non_null = int(series.notna().sum())
+    if non_null and _is_numeric_text(series, non_null):
+        # "$1,200.00"-style values: analytics parse these as numbers, which a category would block
+        return series.astype(ARROW_STRING)
+    distinct = int(series.nunique())
+    if non_null and distinct <= CATEGORY_MAX_DISTINCT and distinct <= non_null * CATEGORY_MAX_RATIO:
+        return series.astype("category")
+    return series.astype(ARROW_STRING)
+
+
+def optimize_column(series: pd.Series) -> pd.Series:
+    if pd.api.types.is_bool_dtype(series) or isinstance(series.dtype, pd.CategoricalDtype):
+        return series
+    if pd.api.types.is_integer_dtype(series):
+        return pd.to_numeric(series, downcast="integer")
+    if pd.api.types.is_float_dtype(series):
+        return _downcast_float(series)
+    if pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+        return _optimize_text(series)
+    return series
+
+
+def optimize(df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict]:
+    """
+    Returns the compacted frame and a memory report:
+    {"before_bytes", "after_bytes", "columns": [{"name", "before_dtype", "after_dtype", "before_bytes", "after_bytes"}]}.
+    """
+    before = df.memory_usage(deep=True, index=False)
+    optimized = pd.DataFrame({col: optimize_column(df[col]) for col in df.columns})
+    after = optimized.memory_usage(deep=True, index=False)
+
+    columns = [
+        {
+            "name": str(col),
+            "before_dtype": str(df[col].dtype),
+            "after_dtype": str(optimized[col].dtype),
+            "before_bytes": int(before[col]),
+            "after_bytes": int(after[col]),
+        }
+        for col in df.columns
+    ]
+    report = {"before_bytes": int(before.sum()), "after_bytes": int(after.sum()), "columns": columns}
+    return optimized, report
@@ -0,0 +1,71 @@
+"""
+K2M Analytics - Excel Reader
+=============================
+Streams .xlsx worksheets with openpyxl's read-only mode, which reads rows from
+the sheet XML as it goes instead of building the whole workbook in memory.
+Each sheet becomes its own table; legacy .xls files still go through pandas.
+"""
+
+from typing import Iterable, List, Optional
+
+import pandas as pd
+from ..models import Dataset
+
+
+def is_xlsx(dataset: Dataset) -> bool:
+    return dataset.filename.lower().endswith(".xlsx")
+
+
+def is_excel(dataset: Dataset) -> bool:
+    return dataset.filename.lower().endswith((".xlsx", ".xls"))
+
+
+def sheet_names(path: str) -> List[str]:
+    """Worksheet names in workbook order (reads only the workbook index)."""
+    from openpyxl import load_workbook  # imported on first Excel use, not at startup
+    workbook = load_workbook(path, read_only=True)
+    try:
+        return list(workbook.sheetnames)
+    finally:
+        workbook.close()
+
+
+def _header_names(row: tuple) -> List[str]:
+    """Column names as pandas would produce them: blanks become "Unnamed: i", repeats get ".1", ".2"."""
+    names, seen = [], {}
+    for i, value in enumerate(row):
+        name = f"Unnamed: {i}" if value is None or str(value).strip() == "" else str(value)
+        count = seen.get(name, 0)
+        seen[name] = count + 1
+        names.append(f"{name}.{count}" if count else name)
+    return names
+
+
+def read_sheet(path: str, sheet_name: Optional[str] = None, columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """
+    Reads one worksheet (the first if `sheet_name` is None) row by row.
+    The first non-empty row is the header; trailing empty rows and unnamed empty
+    columns are dropped.
+    """
+    from openpyxl import load_workbook
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook[sheet_name] if sheet_name else workbook.worksheets[0]
+        rows = sheet.iter_rows(values_only=True)
+        header = next((row for row in rows if any(v is not None for v in row)), None)
+        if header is None:
+            return pd.DataFrame()
+        names = _header_names(header)
+        records = [row[:len(names)] for row in rows]
+    finally:
+        workbook.close()
+
+    while records and all(v is None for v in records[-1]):
+        records.pop()
+    df = pd.DataFrame.from_records(records, columns=names).infer_objects()
+
+    empty_unnamed = [c for c in df.columns if c.startswith("Unnamed: ") and df[c].isna().all()]
+    df = df.drop(columns=empty_unnamed)
+    if columns is not None:
+        df = df[list(columns)]
+    return df
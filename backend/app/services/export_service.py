@@ -0,0 +1,247 @@
+"""
+K2M Analytics - Dataset Export
+===============================
+Streaming download of dataset files.
+
+- Pass-through: the stored file is read in chunks from the storage reader
+  (ranged reads for gs://), never loaded into memory. Byte ranges are supported
+  for resumable downloads.
+- Conversion: CSV, NDJSON and Parquet exports are written batch by batch from
+  the columnar (Parquet) copy.
+- Compression: gzip or zstd is applied on the fly when the client accepts it.
+"""
+
+import io
+import os
+import zlib
+from typing import Iterable, Iterator, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+from ..models import Dataset
+from . import chart_service, dataset_loader
+from .storage_service import storage_service
+
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+CHUNK_SIZE = 1024 * 1024  # 1 MB per read
+BATCH_ROWS = 64 * 1024    # Rows per converted batch
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "xls": "application/vnd.ms-excel",
+}
+EXPORT_FORMATS = {"csv", "ndjson", "parquet"}
+# Formats that are already compressed; re-compressing them wastes CPU
+COMPRESSED_FORMATS = {"parquet", "xlsx"}
+
+
+def source_format(dataset: Dataset) -> str:
+    return os.path.splitext(dataset.filename)[1].lstrip(".").lower() or "csv"
+
+
+def export_filename(dataset: Dataset, fmt: str) -> str:
+    if fmt == source_format(dataset):
+        return dataset.filename
+    return f"{os.path.splitext(dataset.filename)[0]}.{fmt}"
+
+
+# ============ Byte Ranges ============
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parses a single `Range: bytes=...` header into an inclusive (start, end) pair.
+    Returns None when the whole file should be sent (no header, or a multi-range
+    request, which is answered with the full body). Raises RangeNotSatisfiable
+    for ranges outside the file.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_text, _, end_text = header[len("bytes="):].strip().partition("-")
+    try:
+        if start_text == "":
+            # Suffix range: the last N bytes
+            length = int(end_text)
+            if length <= 0 or size == 0:
+                raise RangeNotSatisfiable(header)
+            return max(size - length, 0), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except RangeNotSatisfiable:
+        raise
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        raise RangeNotSatisfiable(header)
+    return start, min(end, size - 1)
+
+
+def etag(dataset: Dataset) -> str:
+    """Strong ETag of the stored file: its content hash, or the dataset version for files stored before hashing."""
+    return f'"{dataset.content_hash}"' if dataset.content_hash else f'"dataset-{dataset.id}-v{dataset.version}"'
+
+
+def if_range_matches(if_range: Optional[str], current: str) -> bool:
+    """
+    True when a Range request may be answered partially: there is no If-Range,
+    or it names the current strong ETag. Weak tags and dates never match.
+    """
+    if not if_range:
+        return True
+    return not if_range.startswith("W/") and if_range.strip() == current
+
+
+def iter_file(path: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+    """Yields bytes [start, end) of a stored file in CHUNK_SIZE pieces."""
+    with storage_service.open_input(path) as f:
+        if start:
+            f.seek(start)
+        remaining = None if end is None else end - start
+        while remaining is None or remaining > 0:
+            chunk = f.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+# ============ Format Conversion ============
+
+def _record_batches(dataset: Dataset) -> Iterator[pa.RecordBatch]:
+    if dataset_loader.has_columnar(dataset):
+        with storage_service.open_input(dataset.columnar_path) as f:
+            yield from pq.ParquetFile(f).iter_batches(batch_size=BATCH_ROWS)
+        return
+    # No Parquet copy yet (still processing, or conversion failed): read the source once
+    df = dataset_loader.load_dataframe(dataset, columnar=False)
+    df.columns = [str(c) for c in df.columns]
+    yield from pa.Table.from_pandas(df, preserve_index=False).to_batches(max_chunksize=BATCH_ROWS)
+
+
+def _iter_csv(batches: Iterable[pa.RecordBatch]) -> Iterator[bytes]:
+    header = True
+    for batch in batches:
+        buffer = io.BytesIO()
+        pa_csv.write_csv(batch, buffer, write_options=pa_csv.WriteOptions(include_header=header))
+        header = False
+        yield buffer.getvalue()
+
+
+def format_dates(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Datetime columns as text: "2024-01-05" when every value is a plain date,
+    "2024-01-05T13:30:00" otherwise. Shared by JSON pages and NDJSON so both show the same values.
+    """
+    dates = {}
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            dates[col] = df[col].dt.strftime(chart_service.date_format(df[col])).astype(object)
+    return df.assign(**dates) if dates else df
+
+
+def iter_ndjson_batches(batches: Iterable[pa.RecordBatch]) -> Iterator[bytes]:
+    for batch in batches:
+        if batch.num_rows:
+            text = format_dates(batch.to_pandas()).to_json(orient="records", lines=True)
+            yield text.encode("utf-8") if text.endswith("\n") else (text + "\n").encode("utf-8")
+
+
+class ChunkSink(io.RawIOBase):
+    """Write-only stream that hands written bytes back out, keeping an absolute position for the Parquet footer."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _iter_parquet(batches: Iterable[pa.RecordBatch]) -> Iterator[bytes]:
+    sink = ChunkSink()
+    writer = None
+    for batch in batches:
+        if writer is None:
+            writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), batch.schema)
+        writer.write_batch(batch)
+        yield sink.drain()
+    if writer is not None:
+        writer.close()
+        yield sink.drain()
+
+
+def iter_export(dataset: Dataset, fmt: str) -> Iterator[bytes]:
+    """Streams a dataset converted to `fmt` (csv, ndjson or parquet)."""
+    if fmt == "parquet" and dataset_loader.has_columnar(dataset):
+        # The columnar copy already is the export
+        return iter_file(dataset.columnar_path)
+    batches = _record_batches(dataset)
+    if fmt == "csv":
+        return _iter_csv(batches)
+    if fmt == "ndjson":
+        return iter_ndjson_batches(batches)
+    return _iter_parquet(batches)
+
+
+# ============ Compression ============
+
+def choose_encoding(accept_encoding: Optional[str], fmt: str) -> Optional[str]:
+    """Picks zstd or gzip from an Accept-Encoding header; None for identity."""
+    if not accept_encoding or fmt in COMPRESSED_FORMATS:
+        return None
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip()] = quality
+    if HAS_ZSTD and accepted.get("zstd", 0) > 0:
+        return "zstd"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress(chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+    """Compresses a byte stream chunk by chunk."""
+    if encoding == "zstd":
+        compressor = zstandard.ZstdCompressor(level=3).compressobj()
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
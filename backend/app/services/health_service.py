@@ -0,0 +1,116 @@
+"""
+K2M Analytics - Health Checks
+==============================
+Liveness only says the process answers. Readiness checks what a request needs:
+
+- database: a SELECT 1 round-trip
+- storage: the GCS bucket answers, or uploads/ is writable (local storage)
+- warm_up: background startup work (seeding, client connections) has finished
+- auth: Google's token signing certificates are loaded (skipped with DISABLE_AUTH)
+- ingest_pool: queued conversions are at most READY_MAX_INGEST_QUEUE
+
+Each check reports its latency, so slow dependencies show up before they fail.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import text
+
+from ..database import engine
+from ..deps import DISABLE_AUTH
+from ..models import utcnow
+from . import ingest_service
+from .storage_service import storage_service
+from .token_cache import token_verifier
+
+# An instance with more conversions waiting than this reports not ready, so the
+# load balancer sends new work elsewhere until the queue drains
+READY_MAX_INGEST_QUEUE = int(os.getenv("READY_MAX_INGEST_QUEUE", "20"))
+
+
+class WarmUpState:
+    """Progress of the background startup work."""
+
+    def __init__(self):
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.failed: List[str] = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            self.started_at, self.finished_at, self.failed = utcnow(), None, []
+
+    def fail(self, step: str):
+        with self._lock:
+            self.failed.append(step)
+
+    def finish(self):
+        with self._lock:
+            self.finished_at = utcnow()
+
+
+warm_up_state = WarmUpState()
+
+
+def _check_database() -> dict:
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    return {"backend": engine.dialect.name}
+
+
+def _check_storage() -> dict:
+    if not storage_service.connected:
+        raise RuntimeError("storage client is still connecting")
+    return {"backend": storage_service.check()}
+
+
+def _check_warm_up() -> dict:
+    if warm_up_state.finished_at is None:
+        raise RuntimeError("startup warm-up still running")
+    # Failed steps fall back (e.g. to local storage) rather than block traffic
+    return {"finished_at": warm_up_state.finished_at.isoformat(), "failed_steps": list(warm_up_state.failed)}
+
+
+def _check_auth() -> dict:
+    if DISABLE_AUTH:
+        return {"skipped": "DISABLE_AUTH"}
+    if not token_verifier.store.loaded:
+        raise RuntimeError("token signing certificates not loaded")
+    return {"certificates": len(token_verifier.store.certificates())}
+
+
+def _check_ingest_pool() -> dict:
+    stats = ingest_service.pool_stats()
+    # Saturated is not broken: report the load along with the failure
+    return {**stats, "max_queue": READY_MAX_INGEST_QUEUE, "ok": stats["queued"] <= READY_MAX_INGEST_QUEUE}
+
+
+CHECKS: Dict[str, Callable[[], dict]] = {
+    "database": _check_database,
+    "storage": _check_storage,
+    "warm_up": _check_warm_up,
+    "auth": _check_auth,
+    "ingest_pool": _check_ingest_pool,
+}
+
+
+def readiness() -> dict:
+    """
+    {"ready": bool, "checks": {name: {"ok", "latency_ms", ...details or "error"}}}.
+    A check fails by raising or by returning "ok": False.
+    """
+    results = {}
+    for name, check in CHECKS.items():
+        start = time.perf_counter()
+        try:
+            result = {"ok": True, **check()}
+        except Exception as e:
+            result = {"ok": False, "error": str(e)}
+        result["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        results[name] = result
+    return {"ready": all(r["ok"] for r in results.values()), "checks": results}
@@ -0,0 +1,329 @@
+"""
+K2M Analytics - Upload Ingestion
+=================================
+Two-stage ingest pipeline for uploaded datasets.
+
+1. Request path (`stream_upload`): the upload is streamed to storage in chunks
+   while the content hash, row count, header and CSV dialect are computed in the same pass.
+2. Background (`process_dataset`): columnar (Parquet) conversion, exact row count
+   and schema profiling run on a dedicated worker pool, after the response is sent.
+   Excel workbooks convert their first sheet; other sheets are converted when
+   first opened (`open_sheet`).
+"""
+
+import hashlib
+import io
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import pandas as pd
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+from sqlmodel import Session, select
+
+from ..database import engine
+from ..models import Dataset, StoredBlob
+from . import blob_store, csv_dialect, dataset_loader, dtype_optimizer, excel_reader, metrics, row_index, schema_catalog
+from .storage_service import storage_service
+from .visualization_service import refresh_dataset_visualizations
+
+CHUNK_SIZE = 1024 * 1024  # 1 MB per read/write
+SNIFF_BYTES = 64 * 1024   # Bytes kept from the start of the file for header sniffing
+
+# Dedicated pool so heavy conversions never starve the request threadpool
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+ingest_executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+_pool_lock = threading.Lock()
+_pool_counts = {"queued": 0, "running": 0}  # Tasks waiting for a worker / being processed
+
+
+@dataclass
+class IngestResult:
+    file_path: str
+    file_size: int = 0
+    content_hash: str = ""
+    total_rows: Optional[int] = None     # Estimated from line count (CSV only)
+    columns: List[str] = field(default_factory=list)
+    csv_dialect: Optional[dict] = None   # Sniffed from the first SNIFF_BYTES (CSV only)
+
+
+class _StreamState:
+    """Incremental hash, size and line count of a stream, plus its first bytes."""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.hasher = hashlib.sha256()
+        self.size = 0
+        self.newlines = 0
+        self.head = b""
+        self.last_byte = b""
+
+    def consume(self, chunk: bytes):
+        self.hasher.update(chunk)
+        self.size += len(chunk)
+        self.newlines += chunk.count(b"\n")
+        if len(self.head) < SNIFF_BYTES:
+            self.head += chunk[:SNIFF_BYTES - len(self.head)]
+        self.last_byte = chunk[-1:]
+        self.writer.write(chunk)
+
+
+def _sniff_columns(head: bytes, dialect: dict) -> List[str]:
+    try:
+        return pd.read_csv(
+            io.BytesIO(head), nrows=0, skiprows=dialect["header_row"], **csv_dialect.pandas_kwargs(dialect)
+        ).columns.tolist()
+    except Exception:
+        return []
+
+
+def _incoming_name(filename: str) -> str:
+    """Temporary storage name for an upload whose hash is not known yet."""
+    return f"incoming/{uuid.uuid4().hex}-{os.path.basename(filename)}"
+
+
+async def stream_upload(file: UploadFile, destination_name: str) -> IngestResult:
+    """
+    Streams an upload to a temporary storage name chunk by chunk without parsing it.
+    Hashing and writing run in the threadpool so the event loop stays free.
+    """
+    writer, file_path = storage_service.open_writer(_incoming_name(destination_name), file.content_type)
+    state = _StreamState(writer)
+    try:
+        try:
+            while True:
+                chunk = await file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                await run_in_threadpool(state.consume, chunk)
+        finally:
+            await run_in_threadpool(writer.close)
+    except BaseException:
+        # Failed read or write, or the client went away: drop the partial file
+        await run_in_threadpool(storage_service.delete, file_path)
+        raise
+
+    result = IngestResult(file_path=file_path, file_size=state.size, content_hash=state.hasher.hexdigest())
+    if destination_name.lower().endswith(".csv") and state.size:
+        result.csv_dialect = csv_dialect.sniff(state.head)
+        lines = state.newlines + (0 if state.last_byte == b"\n" else 1)
+        # Minus header and title lines; refined by process_dataset
+        result.total_rows = max(lines - 1 - result.csv_dialect["header_row"], 0)
+        result.columns = _sniff_columns(state.head, result.csv_dialect)
+    return result
+
+
+def hash_file(path: str) -> str:
+    """SHA-256 of a local file, read in chunks."""
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def store_blob(session: Session, temp_path: str, content_hash: str, file_size: int, filename: str):
+    """
+    Files a freshly written temporary file under its content hash.
+    If the hash is already stored, the temporary copy is dropped and the existing
+    blob gains a reference. Returns (blob, reused).
+    """
+    blob = blob_store.acquire(session, content_hash)
+    if blob:
+        storage_service.delete(temp_path)
+        return blob, True
+
+    # A concurrent upload of the same content promotes identical bytes to the same name
+    file_path = storage_service.promote(temp_path, blob_store.blob_name(content_hash, filename))
+    blob, created = blob_store.register(session, content_hash, file_path, file_size)
+    return blob, not created
+
+
+async def ingest_upload(session: Session, file: UploadFile, company_id: str) -> Dataset:
+    """
+    Request-path ingest: stream, hash, dedupe and create the Dataset row.
+    Known content is ready instantly (profile and Parquet copy are reused);
+    new content is queued for background processing.
+    """
+    ingest = await stream_upload(file, file.filename)
+    try:
+        blob, reused = store_blob(session, ingest.file_path, ingest.content_hash, ingest.file_size, file.filename)
+    except Exception:
+        # Nothing references the temporary file yet (already gone if it was promoted)
+        storage_service.delete(ingest.file_path)
+        raise
+
+    dataset = Dataset(
+        filename=file.filename,
+        file_path=blob.file_path,
+        file_size=ingest.file_size,
+        total_rows=ingest.total_rows,
+        total_columns=len(ingest.columns) or None,
+        content_hash=ingest.content_hash,
+        csv_dialect_json=json.dumps(ingest.csv_dialect) if ingest.csv_dialect else None,
+        status="processing",
+        company_id=company_id
+    )
+    sibling = blob_store.find_processed_sibling(session, ingest.content_hash) if reused else None
+    session.add(dataset)
+    session.commit()
+    session.refresh(dataset)
+
+    if sibling:
+        blob_store.copy_profile(session, sibling, dataset)
+        dataset.status = "ready"
+        session.add(dataset)
+        session.commit()
+        session.refresh(dataset)
+        print(f"OK: Upload deduplicated — dataset {dataset.id} reuses blob {ingest.content_hash[:12]}")
+    else:
+        schedule_processing(dataset.id)
+    return dataset
+
+
+def _write_parquet(df: pd.DataFrame, path: str):
+    """
+    Writes a Parquet copy. Local files are written under a temporary name and
+    renamed, so a concurrent writer or reader never sees a partial file
+    (gs:// objects only appear once their upload completes).
+    """
+    if storage_service.is_remote(path):
+        df.to_parquet(path, index=False, row_group_size=row_index.ROW_GROUP_ROWS)
+        return
+    temp_path = f"{path}.{uuid.uuid4().hex}.part"
+    try:
+        df.to_parquet(temp_path, index=False, row_group_size=row_index.ROW_GROUP_ROWS)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def process_dataset(dataset_id: int) -> None:
+    """
+    Follow-up ingest stage, run off the request path:
+    take exact shape, compact dtypes, convert to Parquet, profile columns into
+    the schema catalog, build the row index for paging, then refresh any saved
+    visualizations of the dataset.
+    """
+    with Session(engine) as session:
+        dataset = session.get(Dataset, dataset_id)
+        if not dataset:
+            return
+
+        try:
+            if excel_reader.is_xlsx(dataset) and dataset.parent_id is None:
+                # The workbook dataset reads the first sheet; the others open as sub-datasets
+                sheets = excel_reader.sheet_names(storage_service.local_path(dataset.file_path))
+                dataset.sheets_json = json.dumps(sheets)
+                dataset.sheet_name = dataset.sheet_name or (sheets[0] if sheets else None)
+
+            df = dataset_loader.load_dataframe(dataset, columnar=False)
+            dataset.total_rows, dataset.total_columns = df.shape
+            df.columns = [str(c) for c in df.columns]
+
+            # Compact dtypes once; the Parquet schema carries them to every later load
+            df, memory_report = dtype_optimizer.optimize(df)
+            dataset.memory_report_json = json.dumps(memory_report)
+
+            # The blob's shared Parquet copy holds its first sheet; other sheets get their own
+            blob = session.get(StoredBlob, dataset.content_hash) if dataset.content_hash and dataset.parent_id is None else None
+            if blob and blob.columnar_path:
+                # Identical content was already converted for another dataset
+                dataset.columnar_path = blob.columnar_path
+            else:
+                try:
+                    key = dataset.content_hash if blob else f"dataset-{dataset.id}"
+                    columnar_path = storage_service.columnar_path(key)
+                    _write_parquet(df, columnar_path)
+                    dataset.columnar_path = columnar_path
+                    if blob:
+                        blob.columnar_path = columnar_path
+                        session.add(blob)
+                except Exception as e:
+                    # Mixed-type columns can fail Arrow conversion; the raw file stays usable
+                    print(f"WARN: Columnar conversion skipped for dataset {dataset_id}: {e}")
+                    dataset.columnar_path = None
+
+            schema_catalog.store_catalog(session, dataset, df)
+            dataset.row_index_json = row_index.build_index(dataset, df)
+            dataset.status = "ready"
+            print(f"OK: Dataset {dataset_id} processed: {dataset.total_rows} rows, {dataset.total_columns} columns")
+        except Exception as e:
+            dataset.status = "failed"
+            print(f"WARN: Processing failed for dataset {dataset_id}: {e}")
+
+        session.add(dataset)
+        session.commit()
+
+    refresh_dataset_visualizations(dataset_id)
+
+
+def _tracked(dataset_id: int):
+    with _pool_lock:
+        _pool_counts["queued"] -= 1
+        _pool_counts["running"] += 1
+    try:
+        with metrics.stage("ingest"):
+            process_dataset(dataset_id)
+    finally:
+        with _pool_lock:
+            _pool_counts["running"] -= 1
+
+
+def schedule_processing(dataset_id: int):
+    """Queues the follow-up ingest stage on the ingest worker pool."""
+    with _pool_lock:
+        _pool_counts["queued"] += 1
+    return ingest_executor.submit(_tracked, dataset_id)
+
+
+def pool_stats() -> dict:
+    """Ingest worker pool load: {"workers", "running", "queued"}."""
+    with _pool_lock:
+        return {"workers": INGEST_WORKERS, **_pool_counts}
+
+
+metrics.register_gauge(
+    "k2m_ingest_pool_tasks", "Ingest worker pool tasks by state.",
+    lambda: {(state,): count for state, count in pool_stats().items() if state != "workers"}, ("state",),
+)
+
+
+def open_sheet(session: Session, workbook: Dataset, sheet_name: str) -> Dataset:
+    """
+    The dataset for one worksheet of a workbook. The first sheet is the workbook
+    dataset itself; other sheets become sub-datasets on first access, sharing the
+    stored file, and are converted to Parquet in the background.
+    """
+    if sheet_name == workbook.sheet_name:
+        return workbook
+    existing = session.exec(
+        select(Dataset).where(Dataset.parent_id == workbook.id).where(Dataset.sheet_name == sheet_name)
+    ).first()
+    if existing:
+        return existing
+
+    if workbook.content_hash:
+        blob_store.acquire(session, workbook.content_hash)
+    stem, ext = os.path.splitext(workbook.filename)
+    sheet = Dataset(
+        filename=f"{stem} ({sheet_name}){ext}",
+        file_path=workbook.file_path,
+        file_size=workbook.file_size,
+        content_hash=workbook.content_hash,
+        parent_id=workbook.id,
+        sheet_name=sheet_name,
+        status="processing",
+        company_id=workbook.company_id,
+    )
+    session.add(sheet)
+    session.commit()
+    session.refresh(sheet)
+    schedule_processing(sheet.id)
+    return sheet
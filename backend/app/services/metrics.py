@@ -0,0 +1,178 @@
+"""
+K2M Analytics - Metrics
+========================
+Stage timing for requests and a Prometheus text endpoint.
+
+    with metrics.stage("parse"):
+        df = read_csv(...)
+
+A stage is timed into the `k2m_stage_seconds{stage}` histogram and, inside a
+request, into that request's Server-Timing header. Stages nest: an outer stage
+reports only its own time, so the header's entries add up to the total (the
+rest is shown as "app"). `stage` also works as a decorator on sync functions.
+Cache lookups, bytes read and request latency are recorded the same way; gauges
+(queue depths, cache sizes) are read when /metrics is scraped.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Seconds; covers cached lookups through slow AI calls
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BYTES_BUCKETS = (1024, 16 * 1024, 256 * 1024, 1024 ** 2, 16 * 1024 ** 2, 256 * 1024 ** 2, 1024 ** 3)
+
+
+class RequestTimings:
+    """Stages and bytes read during one request (shared with its worker thread)."""
+
+    def __init__(self):
+        self.stages: List[Tuple[str, float]] = []
+        self.bytes_read = 0
+
+    def server_timing(self, total: float) -> str:
+        """Server-Timing header value; repeated stages are summed, in first-seen order."""
+        summed: Dict[str, float] = {}
+        for name, seconds in self.stages:
+            summed[name] = summed.get(name, 0.0) + seconds
+        entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in summed.items()]
+        entries.append(f"app;dur={max(total - sum(summed.values()), 0.0) * 1000:.1f}")
+        entries.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(entries)
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("k2m_request_timings", default=None)
+# Seconds spent in nested stages of the innermost open stage ([0.0] per open stage)
+_parent: ContextVar[Optional[list]] = ContextVar("k2m_stage_parent", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name, self.help, self.label_names = name, help, labels
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.label_names, labels)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name, self.help, self.label_names, self.buckets = name, help, labels, buckets
+        self._series: Dict[tuple, list] = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            series = self._series.setdefault(labels, [0] * len(self.buckets) + [0.0, 0])
+            i = bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    le = _labels(self.label_names + ("le",), labels + (f"{bound:g}",))
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                lines.append(f"{self.name}_bucket{_labels(self.label_names + ('le',), labels + ('+Inf',))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {series[-2]:g}")
+                lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {series[-1]}")
+        return lines
+
+
+request_seconds = Histogram("k2m_request_seconds", "Request latency by route.", ("method", "route", "status"))
+stage_seconds = Histogram("k2m_stage_seconds", "Time spent per processing stage.", ("stage",))
+request_bytes_read = Histogram("k2m_request_bytes_read", "Dataset bytes read per request.", ("route",), BYTES_BUCKETS)
+bytes_read_total = Counter("k2m_bytes_read_total", "Dataset bytes read, by source.", ("source",))
+cache_requests = Counter("k2m_cache_requests_total", "Cache lookups by cache and result (hit/miss).", ("cache", "result"))
+
+_gauges: List[Tuple[str, str, Callable[[], Dict[tuple, float]], Tuple[str, ...]]] = []
+
+
+def register_gauge(name: str, help: str, read: Callable[[], Dict[tuple, float]], labels: Tuple[str, ...] = ()):
+    """A gauge read at scrape time; `read` returns {label values tuple: value}."""
+    _gauges.append((name, help, read, labels))
+
+
+@contextmanager
+def stage(name: str):
+    """Times a block into the stage histogram and the current request's Server-Timing."""
+    nested = [0.0]
+    parent = _parent.get()
+    token = _parent.set(nested)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _parent.reset(token)
+        if parent is not None:
+            parent[0] += elapsed
+        seconds = max(elapsed - nested[0], 0.0)
+        stage_seconds.observe(seconds, name)
+        timings = _current.get()
+        if timings is not None:
+            timings.stages.append((name, seconds))
+
+
+def add_bytes_read(n: int, source: str):
+    bytes_read_total.inc(source, amount=n)
+    timings = _current.get()
+    if timings is not None:
+        timings.bytes_read += n
+
+
+def cache_lookup(cache: str, hit: bool):
+    cache_requests.inc(cache, "hit" if hit else "miss")
+
+
+def begin_request() -> Tuple[RequestTimings, object]:
+    timings = RequestTimings()
+    return timings, _current.set(timings)
+
+
+def end_request(token, timings: RequestTimings, method: str, route: str, status: int, seconds: float):
+    _current.reset(token)
+    request_seconds.observe(seconds, method, route, str(status))
+    request_bytes_read.observe(timings.bytes_read, route)
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in (request_seconds, stage_seconds, request_bytes_read, bytes_read_total, cache_requests):
+        lines.extend(metric.render())
+    for name, help, read, label_names in _gauges:
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+        try:
+            for labels, value in sorted(read().items()):
+                lines.append(f"{name}{_labels(label_names, labels)} {value:g}")
+        except Exception as e:
+            lines.append(f"# {name} unavailable: {e}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,232 @@
+"""
+K2M Analytics - Request Profiler
+=================================
+On-demand profiling of single requests for admins (send `X-Profile: 1`).
+
+A sampling thread records the Python stack of every busy thread every
+PROFILE_INTERVAL_MS, which covers both the event loop and the worker thread a
+sync endpoint runs in (cProfile only sees the thread that enabled it).
+With `X-Profile-Memory: 1` tracemalloc also runs for the same window to report
+peak memory and the top allocation sites. It is off by default: tracemalloc is
+process-global and slows every allocation of every concurrent request while it
+runs. Results are stored under PROFILE_DIR by request id:
+
+- {id}.folded: collapsed stacks ("thread;frame;frame count"), the input format
+  of flamegraph.pl, speedscope and inferno
+- {id}.json: request details, hottest functions and (with memory) allocation sites
+
+Only one request is profiled at a time; other requests are never sampled on
+purpose, but anything running concurrently on the instance shows up under its
+own thread name.
+"""
+
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import List, Optional
+
+from ..models import utcnow
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "k2m-profiles"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "2"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))  # Older profiles are deleted
+TOP_N = 30
+
+REQUEST_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# Leaf frames of threads that are waiting, not working (idle pool workers, the idle event loop)
+_IDLE = {("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"), ("queue.py", "get"),
+         ("selectors.py", "select")}
+
+_active = threading.Lock()
+
+
+def _label(code) -> str:
+    parts = code.co_filename.replace("\\", "/").rsplit("/", 2)
+    path = "/".join(parts[-2:])
+    return f"{code.co_name} ({path}:{code.co_firstlineno})".replace(";", ":")
+
+
+class RequestProfile:
+    """Samples thread stacks, and traces allocations if `memory`, between start() and stop()."""
+
+    def __init__(self, request_id: str, method: str, path: str, interval_ms: float = PROFILE_INTERVAL_MS,
+                 memory: bool = False):
+        self.request_id, self.method, self.path = request_id, method, path
+        self.memory = memory
+        self.interval = interval_ms / 1000
+        self.status: Optional[int] = None
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at = utcnow()
+        self.duration = 0.0
+        self.peak_bytes: Optional[int] = None
+        self.allocations: List[dict] = []
+        self._owns_tracemalloc = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def _sample(self):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        own = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            code = frame.f_code
+            if (os.path.basename(code.co_filename), code.co_name) in _IDLE:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_label(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}").replace(";", ":"))
+            self.stacks[tuple(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._owns_tracemalloc = True
+            tracemalloc.reset_peak()
+        self._start = time.perf_counter()
+        self._thread.start()
+
+    def stop(self, status: Optional[int] = None):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self._start
+        self.status = status
+        if self.memory:
+            self._stop_tracing()
+
+    def _stop_tracing(self):
+        self.peak_bytes = tracemalloc.get_traced_memory()[1]
+        stats = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        )).statistics("lineno")
+        self.allocations = [
+            {"site": f"{s.traceback[0].filename}:{s.traceback[0].lineno}", "bytes": s.size, "count": s.count}
+            for s in stats[:TOP_N]
+        ]
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+
+    def folded(self) -> str:
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self) -> dict:
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for frame in set(stack[1:]):
+                total[frame] += count
+        interval_ms = self.interval * 1000
+        return {
+            "request_id": self.request_id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round(self.duration * 1000, 2),
+            "interval_ms": interval_ms,
+            "samples": self.samples,
+            "memory": self.memory,
+            "top_self": [{"frame": f, "ms": round(n * interval_ms, 1)} for f, n in own.most_common(TOP_N)],
+            "top_total": [{"frame": f, "ms": round(n * interval_ms, 1)} for f, n in total.most_common(TOP_N)],
+            "peak_traced_bytes": self.peak_bytes,
+            "allocations": self.allocations,
+        }
+
+
+def begin(request_id: str, method: str, path: str, memory: bool = False) -> Optional[RequestProfile]:
+    """
+    Starts a profile, or returns None while another request is being profiled.
+    Allocations are traced only if `memory` is set.
+    """
+    if not _active.acquire(blocking=False):
+        return None
+    try:
+        profile = RequestProfile(request_id, method, path, memory=memory)
+        profile.start()
+    except Exception:
+        _active.release()
+        raise
+    return profile
+
+
+def finish(profile: RequestProfile, status: Optional[int]):
+    """Stops a profile and stores it under PROFILE_DIR."""
+    try:
+        profile.stop(status)
+    finally:
+        _active.release()
+    save(profile)
+
+
+def save(profile: RequestProfile):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, profile.request_id)
+    with open(base + ".folded", "w", encoding="utf-8") as f:
+        f.write(profile.folded())
+    with open(base + ".json", "w", encoding="utf-8") as f:
+        json.dump(profile.summary(), f, indent=2)
+    _prune()
+
+
+def _prune():
+    summaries = sorted(
+        (os.path.join(PROFILE_DIR, name) for name in os.listdir(PROFILE_DIR) if name.endswith(".json")),
+        key=os.path.getmtime,
+    )
+    for path in summaries[:max(len(summaries) - PROFILE_KEEP, 0)]:
+        for stale in (path, path[:-len(".json")] + ".folded"):
+            if os.path.exists(stale):
+                os.remove(stale)
+
+
+def _path(request_id: str, ext: str) -> Optional[str]:
+    if not REQUEST_ID.match(request_id):
+        return None
+    path = os.path.join(PROFILE_DIR, request_id + ext)
+    return path if os.path.exists(path) else None
+
+
+def list_profiles() -> List[dict]:
+    """Stored profiles, newest first (without stacks and allocation sites)."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in os.listdir(PROFILE_DIR):
+        if name.endswith(".json"):
+            with open(os.path.join(PROFILE_DIR, name), encoding="utf-8") as f:
+                summary = json.load(f)
+            profiles.append({k: summary[k] for k in ("request_id", "method", "path", "status", "started_at", "duration_ms", "samples")})
+    return sorted(profiles, key=lambda p: p["started_at"], reverse=True)
+
+
+def load_summary(request_id: str) -> Optional[dict]:
+    path = _path(request_id, ".json")
+    if path is None:
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_folded(request_id: str) -> Optional[str]:
+    path = _path(request_id, ".folded")
+    if path is None:
+        return None
+    with open(path, encoding="utf-8") as f:
+        return f.read()
@@ -0,0 +1,101 @@
+"""
+K2M Analytics - Row Index
+==========================
+Built once at ingest so content pages can seek instead of parsing the whole file.
+
+- CSV: byte offset of every ROW_INDEX_STEP-th data row (quote-aware, so quoted
+  newlines do not split rows).
+- Parquet copy: first row of every row group; pages read only the groups they overlap.
+"""
+
+import json
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from ..models import Dataset
+from . import csv_dialect
+from .storage_service import storage_service
+
+ROW_INDEX_STEP = 10_000    # CSV rows between two recorded byte offsets
+ROW_GROUP_ROWS = 64 * 1024  # Rows per row group in the Parquet copy
+SCAN_CHUNK = 4 * 1024 * 1024
+
+NEWLINE, QUOTE = 10, 34
+
+
+def csv_row_offsets(path: str, step: int = ROW_INDEX_STEP, header_row: int = 0):
+    """
+    Scans a local CSV once and returns (offsets, data_rows): the byte offset of
+    data rows 0, step, 2*step, ... and the number of data rows.
+    A newline ends a row only outside quotes (even number of quotes before it).
+    `header_row` title lines above the header are skipped.
+    """
+    offsets: List[int] = []
+    boundaries = 0  # row-ending newlines seen so far; number header_row ends the header
+    quote_parity = 0
+    base = 0
+    last_byte = b""
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(SCAN_CHUNK), b""):
+            data = np.frombuffer(chunk, dtype=np.uint8)
+            parity = (np.cumsum(data == QUOTE) + quote_parity) % 2
+            ends = np.flatnonzero((data == NEWLINE) & (parity == 0))
+            # Boundary header_row + k (0-based) is followed by data row k
+            numbers = np.arange(boundaries, boundaries + len(ends)) - header_row
+            offsets.extend((base + ends[(numbers >= 0) & (numbers % step == 0)] + 1).tolist())
+            boundaries += len(ends)
+            quote_parity = int(parity[-1])
+            base += len(chunk)
+            last_byte = chunk[-1:]
+
+    data_rows = (boundaries - 1 if last_byte == b"\n" else boundaries) - header_row
+    # A trailing newline yields an offset at EOF that starts no row
+    offsets = [o for o in offsets if o < base]
+    return offsets, max(data_rows, 0)
+
+
+def row_group_starts(columnar_path: str) -> List[int]:
+    """First row number of every row group in a Parquet file (footer read only)."""
+    with storage_service.open_input(columnar_path) as f:
+        metadata = pq.ParquetFile(f).metadata
+    starts, row = [], 0
+    for i in range(metadata.num_row_groups):
+        starts.append(row)
+        row += metadata.row_group(i).num_rows
+    return starts
+
+
+def build_index(dataset: Dataset, df: pd.DataFrame) -> Optional[str]:
+    """
+    Row index JSON for a freshly processed dataset, or None if nothing can be indexed.
+    CSV offsets are kept only if the scan agrees with the parsed row count
+    (blank lines or unusual quoting would otherwise shift pages).
+    """
+    step = ROW_INDEX_STEP
+    index = {"rows": len(df), "columns": [str(c) for c in df.columns], "step": step}
+
+    if dataset.filename.lower().endswith(".csv"):
+        try:
+            header_row = csv_dialect.load(dataset)["header_row"]
+            offsets, data_rows = csv_row_offsets(storage_service.local_path(dataset.file_path), step, header_row)
+            if data_rows == len(df):
+                index["csv_offsets"] = offsets
+        except Exception as e:
+            print(f"WARN: CSV row index skipped for dataset {dataset.id}: {e}")
+
+    if dataset.columnar_path:
+        try:
+            index["row_groups"] = row_group_starts(dataset.columnar_path)
+        except Exception as e:
+            print(f"WARN: Row group index skipped for dataset {dataset.id}: {e}")
+
+    if "csv_offsets" not in index and "row_groups" not in index:
+        return None
+    return json.dumps(index)
+
+
+def load_index(dataset: Dataset) -> Optional[dict]:
+    return json.loads(dataset.row_index_json) if dataset.row_index_json else None
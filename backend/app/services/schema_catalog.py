@@ -0,0 +1,161 @@
+"""
+K2M Analytics - Schema Catalog
+===============================
+Per-column metadata stored in the database when a dataset is uploaded:
+dtype, semantic role, cardinality, null ratio and (for low-cardinality and
+date columns) the distinct values. Column listings, filter suggestions and
+key-column detection answer from here instead of re-reading the data file.
+"""
+
+import json
+from typing import Dict, List, Optional
+import pandas as pd
+from sqlmodel import Session, select
+
+from ..models import Dataset, DatasetColumn
+from . import chart_service, dataset_loader
+
+# Distinct values are stored for columns with at most this many values (plus date columns)
+MAX_STORED_VALUES = 50
+
+DATE_KEYWORDS = ['date', 'time', 'day', 'month', 'year', 'timestamp', 'period', 'created']
+HIGH_PRIORITY_VALUE = ['sales', 'revenue', 'total', 'profit', 'turnover', 'billing', 'gross', 'net']
+LOW_PRIORITY_VALUE = ['amount', 'price', 'cost', 'value', 'sum']
+PRODUCT_KEYWORDS = ['product', 'item', 'model', 'sku']
+CATEGORY_KEYWORDS = ['category', 'region', 'client', 'customer', 'brand', 'market', 'segment', 'type', 'style']
+
+
+def _is_id_name(name: str) -> bool:
+    lowered = name.lower()
+    return lowered in ("id", "uuid") or lowered.endswith(("_id", " id")) or name.endswith(("ID", "Id"))
+
+
+def infer_role(name: str, series: pd.Series, cardinality: int) -> str:
+    """Semantic role of a column: date, value, category, id or text."""
+    non_null = int(series.notna().sum())
+
+    if _is_id_name(name):
+        return "id"
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return "date"
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return "value"
+    if any(k in name.lower() for k in DATE_KEYWORDS) and chart_service.to_datetime_if_dates(series) is not None:
+        return "date"
+    if non_null and chart_service.to_numeric(series).notna().sum() >= 0.9 * non_null:
+        return "value"  # currency-formatted numbers such as "$1,299.99"
+    if cardinality < 2000 and cardinality <= max(non_null * 0.5, 30):
+        return "category"
+    return "text"
+
+
+def _format_value(value):
+    if isinstance(value, pd.Timestamp):
+        # Dates parsed at ingest keep their plain date form
+        return value.strftime("%Y-%m-%d") if value == value.normalize() else value.isoformat()
+    return value
+
+
+def _distinct_values(series: pd.Series) -> list:
+    values = series.dropna().unique().tolist()
+    try:
+        values = sorted(values)
+    except TypeError:
+        pass
+    return [_format_value(v) for v in values[:MAX_STORED_VALUES]]
+
+
+def profile_columns(df: pd.DataFrame) -> List[DatasetColumn]:
+    """Builds (unsaved) catalog rows for every column of a DataFrame."""
+    total = len(df)
+    entries = []
+    for position, col in enumerate(df.columns):
+        series = df[col]
+        cardinality = int(series.nunique())
+        role = infer_role(str(col), series, cardinality)
+        values = None
+        date_like = any(k in str(col).lower() for k in DATE_KEYWORDS + ['quarter', 'week'])
+        if cardinality <= MAX_STORED_VALUES or role == "date" or date_like:
+            values = json.dumps(_distinct_values(series), default=str)
+        entries.append(DatasetColumn(
+            dataset_id=0,
+            position=position,
+            name=str(col),
+            dtype=str(series.dtype),
+            role=role,
+            cardinality=cardinality,
+            null_ratio=round(float(series.isna().sum()) / total, 6) if total else 0.0,
+            values_json=values,
+        ))
+    return entries
+
+
+def store_catalog(session: Session, dataset: Dataset, df: pd.DataFrame) -> List[DatasetColumn]:
+    """Replaces the catalog of a dataset with a fresh profile of `df` (caller commits)."""
+    for existing in session.exec(select(DatasetColumn).where(DatasetColumn.dataset_id == dataset.id)).all():
+        session.delete(existing)
+    entries = profile_columns(df)
+    for entry in entries:
+        entry.dataset_id = dataset.id
+        session.add(entry)
+    return entries
+
+
+def get_catalog(session: Session, dataset: Dataset) -> List[DatasetColumn]:
+    """
+    Returns the catalog of a dataset, ordered by column position.
+    Datasets uploaded before the catalog existed are profiled once and stored.
+    While a dataset is still processing, the catalog is computed but not stored:
+    process_dataset stores its own, and storing here too could duplicate rows.
+    """
+    entries = session.exec(
+        select(DatasetColumn)
+        .where(DatasetColumn.dataset_id == dataset.id)
+        .order_by(DatasetColumn.position)
+    ).all()
+    if entries:
+        return list(entries)
+
+    if dataset.status == "processing":
+        entries = profile_columns(dataset_loader.load_dataframe(dataset))
+        for entry in entries:
+            entry.dataset_id = dataset.id
+        return entries
+
+    entries = store_catalog(session, dataset, dataset_loader.load_dataframe(dataset))
+    session.commit()
+    return entries
+
+
+def stored_values(entry: DatasetColumn) -> list:
+    return json.loads(entry.values_json) if entry.values_json else []
+
+
+def identify_key_columns(catalog: List[DatasetColumn]) -> Dict[str, Optional[str]]:
+    """
+    Picks the primary date, value and category columns from catalog metadata,
+    using the same name priorities as the smart analysis heuristics.
+    """
+    def first(predicate) -> Optional[str]:
+        return next((c.name for c in catalog if predicate(c)), None)
+
+    def not_key_like(c: DatasetColumn) -> bool:
+        return not any(x in c.name.lower() for x in ['id', 'date', 'time'])
+
+    value_col = (
+        first(lambda c: c.role == "value" and any(x in c.name.lower() for x in HIGH_PRIORITY_VALUE))
+        or first(lambda c: c.role == "value" and any(x in c.name.lower() for x in LOW_PRIORITY_VALUE))
+    )
+    date_col = (
+        first(lambda c: c.role == "date" and any(x in c.name.lower() for x in DATE_KEYWORDS))
+        or first(lambda c: c.role == "date")
+    )
+    category_col = (
+        first(lambda c: any(x in c.name.lower() for x in PRODUCT_KEYWORDS) and not_key_like(c) and c.cardinality < 2000)
+        or first(lambda c: any(x in c.name.lower() for x in CATEGORY_KEYWORDS) and not_key_like(c) and c.cardinality < 100)
+    )
+    return {
+        "identified_date_col": date_col,
+        "identified_value_col": value_col,
+        "identified_category_col": category_col,
+    }
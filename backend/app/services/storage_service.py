@@ -1,40 +1,281 @@
 import os
-from google.cloud import storage
-from fastapi import UploadFile
-import shutil
+import glob
+import hashlib
+import tempfile
+import threading
+import time
+
+from . import metrics
+
+# Local read-through cache for gs:// files (LRU by total size, keyed by blob generation)
+CACHE_DIR = os.getenv("STORAGE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "k2m-storage-cache"))
+CACHE_MAX_BYTES = int(os.getenv("STORAGE_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+# How long a blob generation check is trusted before GCS is asked again
+CACHE_VALIDATE_SECONDS = float(os.getenv("STORAGE_CACHE_VALIDATE_SECONDS", "30"))
+# Ranged reads fetch this much per request (Parquet footers, row groups)
+RANGE_CHUNK_SIZE = 1024 * 1024
+HTTP_POOL_SIZE = int(os.getenv("GCS_HTTP_POOL_SIZE", "32"))
+
+
+def _touch(path: str) -> bool:
+    """Marks a cache file as recently used; False if it does not exist (or was just evicted)."""
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass  # already removed by another worker
+
 
 class StorageService:
     def __init__(self):
+        self.bucket_name = os.getenv("GCS_BUCKET_NAME", "k2m-uploads")
+        # The GCS client is created on first use (importing and authenticating it is slow)
+        self._client = None
+        self._bucket = None
+        self._connected = False
+        self._connect_lock = threading.Lock()
+
+        self._generations = {}  # uri -> (generation, checked_at)
+        self._cache_lock = threading.Lock()
+
+    @property
+    def client(self):
+        """GCS client, or None when GCS is not configured (local storage)."""
+        if not self._connected:
+            with self._connect_lock:
+                if not self._connected:
+                    self._connect()
+                    self._connected = True
+        return self._client
+
+    @property
+    def bucket(self):
+        return self._bucket if self.client else None
+
+    @property
+    def connected(self) -> bool:
+        """True once the backend (GCS or local fallback) has been chosen."""
+        return self._connected
+
+    def check(self, timeout: float = 5) -> str:
+        """
+        Confirms the storage backend is usable: the bucket answers (GCS) or the
+        upload directory is writable (local). Returns the backend name; raises if not.
+        """
+        if self.client:
+            self.bucket.reload(timeout=timeout)
+            return "gcs"
+        if not os.access("uploads", os.W_OK):
+            raise OSError("uploads/ is missing or not writable")
+        return "local"
+
+    def _connect(self):
         # Assumes GOOGLE_APPLICATION_CREDENTIALS is set in env or default credentials work
         # If running locally without env var, valid gcloud auth login setup is needed
         try:
-            self.client = storage.Client()
-            self.bucket_name = os.getenv("GCS_BUCKET_NAME", "k2m-uploads")
-            self.bucket = self.client.bucket(self.bucket_name)
+            from google.cloud import storage
+            self._client = storage.Client()
+            self._bucket = self._client.bucket(self.bucket_name)
+            self._pool_connections()
         except Exception as e:
             print(f"Warning: GCS Client failed to initialize. {e}")
-            self.client = None
+            self._client = None
+
+    def _pool_connections(self):
+        """Size the client's HTTP connection pool so concurrent reads reuse connections."""
+        try:
+            from requests.adapters import HTTPAdapter
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+            self._client._http.mount("https://", adapter)
+        except Exception as e:
+            print(f"Warning: GCS connection pool not configured. {e}")
 
-    def upload_file(self, file: UploadFile, destination_blob_name: str) -> str:
+    def open_writer(self, destination_blob_name: str, content_type: str = None):
+        """
+        Opens a streaming writer for a new upload.
+        Returns (file_like, path) where path is the local path or gs:// URI.
+        """
         if not self.client:
-            # Fallback to local storage if GCS is not configured
-            # Ensure directory exists
-            os.makedirs("uploads", exist_ok=True)
-            
             local_path = f"uploads/{destination_blob_name}"
-            print(f"Using Local Storage: Saving to {local_path}")
-            
-            with open(local_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-            return local_path
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            print(f"Using Local Storage: Streaming to {local_path}")
+            return open(local_path, "wb"), local_path
 
         blob = self.bucket.blob(destination_blob_name)
-        
-        # Reset file pointer just in case
-        file.file.seek(0)
-        blob.upload_from_file(file.file, content_type=file.content_type)
-        
-        return f"gs://{self.bucket_name}/{destination_blob_name}"
+        # Resumable upload in 8 MB chunks; nothing is buffered beyond one chunk
+        writer = blob.open("wb", content_type=content_type, chunk_size=8 * 1024 * 1024)
+        return writer, f"gs://{self.bucket_name}/{destination_blob_name}"
+
+    def _blob_name(self, uri: str) -> str:
+        return uri[len(f"gs://{self.bucket_name}/"):]
+
+    def promote(self, path: str, destination_blob_name: str) -> str:
+        """Moves a finished upload to its final (content-addressed) name."""
+        if path.startswith("gs://"):
+            blob = self.bucket.blob(self._blob_name(path))
+            self.bucket.rename_blob(blob, destination_blob_name)
+            return f"gs://{self.bucket_name}/{destination_blob_name}"
+
+        local_path = f"uploads/{destination_blob_name}"
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        os.replace(path, local_path)
+        return local_path
+
+    def delete(self, path: str) -> None:
+        """Removes a stored file; missing files are ignored."""
+        if not path:
+            return
+        if path.startswith("gs://"):
+            try:
+                self.bucket.blob(self._blob_name(path)).delete()
+            except Exception as e:
+                print(f"WARN: Could not delete {path}: {e}")
+            return
+        if os.path.exists(path):
+            os.remove(path)
+
+    def columnar_path(self, key: str) -> str:
+        """Location of the Parquet copy of a dataset."""
+        if not self.client:
+            os.makedirs(os.path.join("uploads", "columnar"), exist_ok=True)
+            return f"uploads/columnar/{key}.parquet"
+        return f"gs://{self.bucket_name}/columnar/{key}.parquet"
+
+    # ============ Read Layer ============
+
+    @staticmethod
+    def is_remote(path: str) -> bool:
+        return bool(path) and path.startswith("gs://")
+
+    def _remote_blob(self, uri: str):
+        if not self.client:
+            raise RuntimeError(f"Cannot read {uri}: GCS client is not configured")
+        bucket_name, _, name = uri[len("gs://"):].partition("/")
+        return self.client.bucket(bucket_name).blob(name)
+
+    def _generation(self, uri: str):
+        """Current generation of a blob (None if missing), re-checked every CACHE_VALIDATE_SECONDS."""
+        cached = self._generations.get(uri)
+        if cached and time.monotonic() - cached[1] < CACHE_VALIDATE_SECONDS:
+            return cached[0]
+        if not self.client:
+            raise RuntimeError(f"Cannot read {uri}: GCS client is not configured")
+        bucket_name, _, name = uri[len("gs://"):].partition("/")
+        current = self.client.bucket(bucket_name).get_blob(name)
+        generation = current.generation if current else None
+        self._generations[uri] = (generation, time.monotonic())
+        return generation
+
+    def _cache_file(self, uri: str, generation) -> str:
+        key = hashlib.sha1(uri.encode()).hexdigest()
+        ext = os.path.splitext(uri)[1]
+        return os.path.join(CACHE_DIR, f"{key}-{generation}{ext}")
+
+    def exists(self, path: str) -> bool:
+        if not self.is_remote(path):
+            return os.path.exists(path)
+        return self._generation(path) is not None
+
+    def size(self, path: str) -> int:
+        """Size of a stored file in bytes."""
+        if not self.is_remote(path):
+            return os.path.getsize(path)
+        bucket_name, _, name = path[len("gs://"):].partition("/")
+        current = self.client.bucket(bucket_name).get_blob(name) if self.client else None
+        if current is None:
+            raise FileNotFoundError(path)
+        return current.size
+
+    def is_cached(self, path: str) -> bool:
+        if not self.is_remote(path):
+            return True
+        return os.path.exists(self._cache_file(path, self._generation(path)))
+
+    def local_path(self, path: str) -> str:
+        """
+        A local filesystem path for reading `path`.
+        gs:// files are downloaded once into the disk cache and reused while
+        their blob generation is unchanged.
+        """
+        if not self.is_remote(path):
+            return path
+
+        generation = self._generation(path)
+        if generation is None:
+            raise FileNotFoundError(path)
+        cache_file = self._cache_file(path, generation)
+        hit = _touch(cache_file)  # mark as recently used
+        metrics.cache_lookup("storage_disk", hit)
+        if hit:
+            return cache_file
+
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix=".part")
+        os.close(fd)
+        try:
+            with metrics.stage("storage_download"):
+                self._remote_blob(path).download_to_filename(tmp_path, if_generation_match=generation)
+            metrics.add_bytes_read(os.path.getsize(tmp_path), "gcs")
+            os.replace(tmp_path, cache_file)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        # Older generations of the same object are never valid again
+        for stale in glob.glob(cache_file.rsplit("-", 1)[0] + "-*"):
+            if stale != cache_file:
+                _remove_quietly(stale)
+        self._evict()
+        return cache_file
+
+    def _evict(self):
+        """
+        Removes least recently used cache files until the cache fits CACHE_MAX_BYTES.
+        Other workers share the directory, so files may vanish while this runs.
+        """
+        with self._cache_lock:
+            entries = []
+            for name in os.listdir(CACHE_DIR):
+                full = os.path.join(CACHE_DIR, name)
+                if name.endswith(".part"):
+                    continue
+                try:
+                    stat = os.stat(full)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, full))
+            total = sum(size for _, size, _ in entries)
+            for _, size, full in sorted(entries):
+                if total <= CACHE_MAX_BYTES:
+                    break
+                _remove_quietly(full)
+                total -= size
+
+    def open_input(self, path: str):
+        """
+        A seekable binary reader. Cached or local files are opened directly;
+        uncached gs:// files are read with ranged requests of RANGE_CHUNK_SIZE,
+        so Parquet readers fetch only the footer and the row groups they need.
+        """
+        if not self.is_remote(path):
+            return open(path, "rb")
+        generation = self._generation(path)
+        cache_file = self._cache_file(path, generation)
+        hit = _touch(cache_file)
+        metrics.cache_lookup("storage_disk", hit)
+        if hit:
+            try:
+                return open(cache_file, "rb")
+            except FileNotFoundError:
+                pass  # evicted just now; read from GCS instead
+        return self._remote_blob(path).open("rb", chunk_size=RANGE_CHUNK_SIZE, if_generation_match=generation)
 
     def get_file_url(self, file_path_or_uri: str) -> str:
         # Generate a signed URL for frontend download if needed
@@ -0,0 +1,221 @@
+"""
+K2M Analytics - Token Cache
+============================
+Verifies Firebase ID tokens once and remembers the result.
+
+A dashboard load sends the same token on every request, so verified claims are
+cached under a SHA-256 of the token until the token's own `exp`. Google's signing
+certificates are kept in memory and refreshed in the background before their
+Cache-Control max-age runs out, so the first verification does not wait on the
+network either. Revocation (and disabled accounts) are re-checked against
+Firebase at most every AUTH_REVOCATION_CHECK_SECONDS per token.
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+import requests
+from google.auth import jwt
+from firebase_admin import auth
+import firebase_admin
+
+from . import metrics
+
+ID_TOKEN_CERT_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+ID_TOKEN_ISSUER_PREFIX = "https://securetoken.google.com/"
+
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_TOKEN_CACHE_MAX_ENTRIES", "10000"))
+# 0 turns revocation checks off; verified tokens are then trusted until they expire
+REVOCATION_CHECK_SECONDS = float(os.getenv("AUTH_REVOCATION_CHECK_SECONDS", "300"))
+CERT_FETCH_TIMEOUT = 10
+CERT_DEFAULT_MAX_AGE = 3600   # Used when the response carries no max-age
+CERT_REFRESH_MARGIN = 0.8     # Refresh after this share of max-age has passed
+CERT_RETRY_SECONDS = 60
+
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+def _fetch_certificates(url: str) -> Tuple[Dict[str, str], float]:
+    """(kid -> PEM certificate, max-age seconds) from Google's x509 endpoint."""
+    response = requests.get(url, timeout=CERT_FETCH_TIMEOUT)
+    response.raise_for_status()
+    match = _MAX_AGE.search(response.headers.get("Cache-Control", ""))
+    return response.json(), float(match.group(1)) if match else CERT_DEFAULT_MAX_AGE
+
+
+class CertificateStore:
+    """
+    In-memory copy of a signing key set.
+    `fetch` returns (certificates, max_age); tests can pass a fake key set via
+    `set_certificates` instead and never touch the network.
+    """
+
+    def __init__(self, url: str = ID_TOKEN_CERT_URL, fetch: Optional[Callable] = None):
+        self.url = url
+        self._fetch = fetch or _fetch_certificates
+        self._certs: Dict[str, str] = {}
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def set_certificates(self, certs: Dict[str, str], max_age: float = CERT_DEFAULT_MAX_AGE):
+        with self._lock:
+            self._certs = dict(certs)
+            self._expires_at = time.time() + max_age
+
+    def refresh(self) -> float:
+        """Fetches the key set now; returns its max-age."""
+        certs, max_age = self._fetch(self.url)
+        self.set_certificates(certs, max_age)
+        return max_age
+
+    @property
+    def loaded(self) -> bool:
+        """True while a fetched key set is within its max-age."""
+        return bool(self._certs) and time.time() < self._expires_at
+
+    def certificates(self) -> Dict[str, str]:
+        """Current key set, fetched in the foreground only if the background refresh fell behind."""
+        if time.time() >= self._expires_at:
+            try:
+                self.refresh()
+            except Exception as e:
+                raise auth.CertificateFetchError(f"Could not fetch token signing certificates: {e}", cause=e)
+        return self._certs
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                wait = self.refresh() * CERT_REFRESH_MARGIN
+            except Exception as e:
+                print(f"WARN: Token certificate refresh failed: {e}")
+                wait = CERT_RETRY_SECONDS
+            self._stop.wait(wait)
+
+    def start(self):
+        """Prefetches the key set and keeps it fresh from a daemon thread."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="token-cert-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+class TokenVerifier:
+    """
+    Verifies Firebase ID tokens (the same checks as firebase_admin's verify_id_token)
+    and caches the claims of valid ones.
+    Raises the firebase_admin.auth errors, so callers handle both paths alike.
+    """
+
+    def __init__(self, project_id: Optional[str] = None, store: Optional[CertificateStore] = None,
+                 revocation_check_seconds: float = REVOCATION_CHECK_SECONDS,
+                 max_entries: int = TOKEN_CACHE_MAX_ENTRIES):
+        self.project_id = project_id
+        self.store = store or CertificateStore()
+        self.revocation_check_seconds = revocation_check_seconds
+        self.max_entries = max_entries
+        # sha256(token) -> [claims, exp, last revocation check]
+        self._entries: "OrderedDict[bytes, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _project_id(self) -> str:
+        if not self.project_id:
+            self.project_id = firebase_admin.get_app().project_id
+            if not self.project_id:
+                raise ValueError("Firebase project ID is not configured (set GOOGLE_CLOUD_PROJECT).")
+        return self.project_id
+
+    def _decode(self, token: str) -> dict:
+        """Signature, expiry and claim checks without the cache."""
+        if os.getenv("FIREBASE_AUTH_EMULATOR_HOST"):
+            return auth.verify_id_token(token)  # emulator tokens are unsigned
+
+        project_id = self._project_id()
+        try:
+            header = jwt.decode_header(token)
+            claims = jwt.decode(token, certs=self.store.certificates(), audience=project_id)
+        except auth.CertificateFetchError:
+            raise
+        except ValueError as e:
+            if "expired" in str(e).lower():
+                raise auth.ExpiredIdTokenError(str(e), cause=e)
+            raise auth.InvalidIdTokenError(str(e), cause=e)
+
+        subject = claims.get("sub")
+        if header.get("alg") != "RS256":
+            raise auth.InvalidIdTokenError(f'Firebase ID token has incorrect algorithm "{header.get("alg")}"')
+        if claims.get("iss") != ID_TOKEN_ISSUER_PREFIX + project_id:
+            raise auth.InvalidIdTokenError(f'Firebase ID token has incorrect "iss" claim "{claims.get("iss")}"')
+        if not isinstance(subject, str) or not subject or len(subject) > 128:
+            raise auth.InvalidIdTokenError('Firebase ID token has an invalid "sub" claim')
+        claims["uid"] = subject
+        return claims
+
+    def _check_revoked(self, claims: dict):
+        user = auth.get_user(claims["uid"])
+        if user.disabled:
+            raise auth.UserDisabledError("The user record is disabled.")
+        valid_after = (user.tokens_valid_after_timestamp or 0) / 1000
+        if claims.get("auth_time", claims.get("iat", 0)) < valid_after:
+            raise auth.RevokedIdTokenError("The Firebase ID token has been revoked.")
+
+    def verify(self, token: str) -> dict:
+        """Decoded claims of a valid token (cached until its exp)."""
+        key = hashlib.sha256(token.encode("utf-8")).digest()
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now >= entry[1]:
+                    del self._entries[key]
+                    entry = None
+                else:
+                    self._entries.move_to_end(key)
+        metrics.cache_lookup("auth_tokens", entry is not None)
+
+        if entry is None:
+            claims = self._decode(token)
+            entry = [claims, float(claims["exp"]), 0.0]
+        else:
+            claims = entry[0]
+
+        if self.revocation_check_seconds and now - entry[2] >= self.revocation_check_seconds:
+            try:
+                self._check_revoked(claims)
+            except Exception:
+                self.forget(token)
+                raise
+            entry[2] = now
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return dict(claims)
+
+    def forget(self, token: str):
+        with self._lock:
+            self._entries.pop(hashlib.sha256(token.encode("utf-8")).digest(), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+token_verifier = TokenVerifier()
+metrics.register_gauge("k2m_auth_token_cache_entries", "Verified tokens held in the cache.", lambda: {(): len(token_verifier)})
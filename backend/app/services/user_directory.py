@@ -0,0 +1,190 @@
+"""
+K2M Analytics - User Directory
+===============================
+Keeps a local table of Firebase users (uid, email, company_id, role) so admin
+listings page and filter from SQLite instead of walking the whole Firebase user
+base on every request.
+
+- Write-through: admin actions that change a user record it right away.
+- Sync: a background pass walks `list_users` page by page, writes only rows that
+  changed, and after a complete pass removes users that no longer exist.
+
+Firebase has no change feed, so every pass still reads the whole user base:
+one list_users call per 1000 users (about 100 calls for 100k users), repeated
+every USER_DIRECTORY_SYNC_SECONDS. Only the database writes are incremental.
+For large user bases USER_DIRECTORY_SYNC_PAGES caps the pages read per run;
+the next run resumes from the stored page token, so a pass is spread over
+several intervals instead of one burst.
+
+The background sync only runs with auth enabled. Under DISABLE_AUTH the
+directory holds just the users written through by admin actions until a sync
+is started by hand (POST /admin/directory/sync).
+
+`api` is anything with Firebase's `list_users(page_token, max_results)`, so the
+sync can run against an in-memory stand-in.
+"""
+
+import os
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from firebase_admin import auth
+from sqlalchemy import delete, func, update
+from sqlmodel import Session, col, select
+
+from ..database import engine
+from ..models import DirectoryUser, utcnow
+
+SYNC_INTERVAL_SECONDS = float(os.getenv("USER_DIRECTORY_SYNC_SECONDS", "600"))
+SYNC_PAGE_SIZE = 1000  # Firebase's maximum for list_users
+# Pages per background run (0 = finish the pass in one run)
+SYNC_PAGES_PER_RUN = int(os.getenv("USER_DIRECTORY_SYNC_PAGES", "0"))
+
+
+def _fields(user, claims: Optional[dict] = None) -> Dict[str, object]:
+    """Directory columns of a Firebase user record (claims override its custom claims)."""
+    claims = claims if claims is not None else (user.custom_claims or {})
+    return {
+        "email": user.email,
+        "company_id": claims.get("company_id"),
+        "role": claims.get("role"),
+        "email_verified": bool(user.email_verified),
+        "disabled": bool(user.disabled),
+    }
+
+
+class UserDirectory:
+    def __init__(self, api=auth, page_size: int = SYNC_PAGE_SIZE):
+        self.api = api
+        self.page_size = page_size
+        self._page_token: Optional[str] = None    # Where the current pass continues
+        self._pass_started: Optional[datetime] = None
+        self.last_complete_sync: Optional[datetime] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ----- write-through -----
+
+    def record(self, session: Session, user, claims: Optional[dict] = None, **changes) -> DirectoryUser:
+        """
+        Upserts one user from a Firebase user record. `claims` replaces the record's
+        custom claims and `changes` override single fields (for updates Firebase has
+        accepted but the record predates). Commits.
+        """
+        values = {**_fields(user, claims), **changes}
+        row = session.get(DirectoryUser, user.uid) or DirectoryUser(uid=user.uid)
+        for name, value in values.items():
+            setattr(row, name, value)
+        row.synced_at = utcnow()
+        session.add(row)
+        session.commit()
+        session.refresh(row)
+        return row
+
+    # ----- sync -----
+
+    def _apply_page(self, session: Session, users: List, now: datetime) -> Tuple[int, int]:
+        """Writes the rows of one page that differ from Firebase; returns (added, updated)."""
+        by_uid = {user.uid: user for user in users}
+        existing = {
+            row.uid: row
+            for row in session.exec(select(DirectoryUser).where(col(DirectoryUser.uid).in_(list(by_uid))))
+        }
+        added = updated = 0
+        for uid, user in by_uid.items():
+            values = _fields(user)
+            row = existing.get(uid)
+            if row is None:
+                session.add(DirectoryUser(uid=uid, synced_at=now, **values))
+                added += 1
+            elif any(getattr(row, name) != value for name, value in values.items()):
+                for name, value in values.items():
+                    setattr(row, name, value)
+                session.add(row)
+                updated += 1
+        # Stamp every existing row Firebase still has, in one statement
+        if existing:
+            session.execute(update(DirectoryUser).where(col(DirectoryUser.uid).in_(list(existing))).values(synced_at=now))
+        return added, updated
+
+    def sync(self, max_pages: Optional[int] = None) -> dict:
+        """
+        Continues the current sync pass for up to `max_pages` pages (all if None).
+        Users not seen during a complete pass are removed from the directory.
+        """
+        with self._lock:
+            stats = {"pages": 0, "seen": 0, "added": 0, "updated": 0, "removed": 0, "complete": False}
+            with Session(engine) as session:
+                while max_pages is None or stats["pages"] < max_pages:
+                    if self._pass_started is None:
+                        self._pass_started = utcnow()
+                    page = self.api.list_users(page_token=self._page_token, max_results=self.page_size)
+                    added, updated = self._apply_page(session, list(page.users), utcnow())
+                    stats["pages"] += 1
+                    stats["seen"] += len(page.users)
+                    stats["added"] += added
+                    stats["updated"] += updated
+                    self._page_token = page.next_page_token or None
+                    if self._page_token is None:
+                        result = session.execute(delete(DirectoryUser).where(DirectoryUser.synced_at < self._pass_started))
+                        stats["removed"] = result.rowcount
+                        stats["complete"] = True
+                        self.last_complete_sync = self._pass_started
+                        self._pass_started = None
+                        session.commit()
+                        break
+                    session.commit()
+            return stats
+
+    def _run(self, interval: float):
+        while not self._stop.is_set():
+            try:
+                stats = self.sync(max_pages=SYNC_PAGES_PER_RUN or None)
+                if stats["added"] or stats["updated"] or stats["removed"]:
+                    print(f"OK: User directory synced: {stats['seen']} users "
+                          f"(+{stats['added']} ~{stats['updated']} -{stats['removed']})")
+            except Exception as e:
+                print(f"WARN: User directory sync failed: {e}")
+            self._stop.wait(interval)
+
+    def start(self, interval: float = SYNC_INTERVAL_SECONDS):
+        """Syncs now and then every `interval` seconds from a daemon thread."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), name="user-directory-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    # ----- queries -----
+
+    def list_users(self, session: Session, limit: Optional[int] = None, offset: int = 0, company_id: Optional[str] = None,
+                   role: Optional[str] = None, email_prefix: Optional[str] = None) -> Tuple[List[DirectoryUser], int]:
+        """Users ordered by email (one page if `limit` is given), plus the number of matching users."""
+        query = select(DirectoryUser)
+        if company_id:
+            query = query.where(DirectoryUser.company_id == company_id)
+        if role:
+            query = query.where(DirectoryUser.role == role)
+        if email_prefix:
+            query = query.where(col(DirectoryUser.email).startswith(email_prefix, autoescape=True))
+        total = session.exec(select(func.count()).select_from(query.subquery())).one()
+        query = query.order_by(DirectoryUser.email, DirectoryUser.uid).offset(offset)
+        rows = session.exec(query.limit(limit) if limit is not None else query).all()
+        return rows, total
+
+    def list_companies(self, session: Session) -> List[Tuple[str, int]]:
+        """(company_id, number of users) for every assigned company."""
+        return session.exec(
+            select(DirectoryUser.company_id, func.count())
+            .where(DirectoryUser.company_id.is_not(None))
+            .group_by(DirectoryUser.company_id)
+            .order_by(DirectoryUser.company_id)
+        ).all()
+
+
+user_directory = UserDirectory()
@@ -0,0 +1,137 @@
+"""
+K2M Analytics - Saved Visualizations
+=====================================
+Computes and stores chart payloads for saved visualizations.
+A stored payload is valid while its dataset_version matches Dataset.version;
+stale charts are recomputed together, from one load of the dataset. A chart
+that no longer fits its dataset records the error for that version instead.
+"""
+
+from typing import List, Optional
+from sqlmodel import Session, select
+
+from ..database import engine
+from ..models import Dataset, Visualization, utcnow
+from ..schemas import ChartData, ChartSpec
+from . import chart_service, dataset_loader, schema_catalog
+
+
+def spec_columns(spec: ChartSpec) -> List[str]:
+    """Columns a chart spec reads from the dataset."""
+    return [c for c in (spec.x_axis, spec.y_axis, spec.value_axis) if c and c != "count_ops"]
+
+
+def validate_specs(session: Session, dataset: Dataset, specs: List[ChartSpec]) -> List[str]:
+    """
+    Checks chart specs against the chart limits and the dataset's columns.
+    Returns the columns they read; raises ValueError describing the first problem.
+    """
+    for spec in specs:
+        if not 3 <= spec.points <= chart_service.MAX_POINTS:
+            raise ValueError(f"points must be between 3 and {chart_service.MAX_POINTS}")
+        if spec.bucket and spec.bucket not in chart_service.BUCKETS:
+            raise ValueError(f"bucket must be one of {sorted(chart_service.BUCKETS)}")
+        if spec.agg not in chart_service.AGGREGATIONS:
+            raise ValueError(f"agg must be one of {sorted(chart_service.AGGREGATIONS)}")
+        if spec.bins is not None and not 1 <= spec.bins <= chart_service.MAX_BINS:
+            raise ValueError(f"bins must be between 1 and {chart_service.MAX_BINS}")
+
+    needed = list(dict.fromkeys(c for spec in specs for c in spec_columns(spec)))
+    available = {entry.name for entry in schema_catalog.get_catalog(session, dataset)}
+    missing = [c for c in needed if c not in available]
+    if missing:
+        raise ValueError(f"Column {missing[0]} not found")
+    return needed
+
+
+def build_chart(frame: chart_service.ChartFrame, spec: ChartSpec) -> ChartData:
+    """Computes a ChartData payload. Raises ValueError for invalid specs."""
+    data, config, meta = chart_service.compute_chart(
+        frame, spec.type, spec.x_axis, spec.y_axis, spec.agg, spec.points, spec.bucket,
+        spec.value_axis, spec.bins
+    )
+    return ChartData(
+        type=spec.type,
+        title=spec.title or f"{spec.type.title()} Chart: {spec.x_axis}" + (f" vs {spec.y_axis}" if spec.y_axis else ""),
+        data=data,
+        config=config,
+        meta=meta
+    )
+
+
+def get_spec(viz: Visualization) -> ChartSpec:
+    return ChartSpec.model_validate_json(viz.config_json)
+
+
+def get_chart(viz: Visualization) -> Optional[ChartData]:
+    return ChartData.model_validate_json(viz.data_json) if viz.data_json else None
+
+
+def is_stale(viz: Visualization, dataset: Dataset) -> bool:
+    if viz.dataset_version != dataset.version:
+        return True
+    return viz.data_json is None and viz.refresh_error is None
+
+
+def store_charts(session: Session, dataset: Dataset, visualizations: List[Visualization]) -> int:
+    """
+    Recomputes the given visualizations of one dataset from a single load of
+    the columns they use. Charts whose spec no longer fits the data keep their
+    previous payload, record the error and are stamped with the dataset version,
+    so they are not retried until the dataset changes again.
+    Returns the number of charts refreshed.
+    """
+    if not visualizations:
+        return 0
+
+    specs = [get_spec(viz) for viz in visualizations]
+    available = {entry.name for entry in schema_catalog.get_catalog(session, dataset)}
+    needed = list(dict.fromkeys(c for spec in specs for c in spec_columns(spec) if c in available))
+    frame = chart_service.ChartFrame(dataset_loader.load_dataframe(dataset, columns=needed))
+
+    refreshed = 0
+    for viz, spec in zip(visualizations, specs):
+        viz.dataset_version = dataset.version
+        try:
+            chart = build_chart(frame, spec)
+        except ValueError as e:
+            print(f"WARN: Visualization {viz.id} could not be refreshed: {e}")
+            viz.refresh_error = str(e)
+            continue
+        viz.data_json = chart.model_dump_json()
+        viz.refresh_error = None
+        viz.updated_at = utcnow()
+        refreshed += 1
+    return refreshed
+
+
+def refresh_dataset_visualizations(dataset_id: int) -> int:
+    """
+    Background task: recompute only the saved charts of a dataset whose stored
+    payload was computed from an older dataset version. Returns the number refreshed.
+    """
+    with Session(engine) as session:
+        dataset = session.get(Dataset, dataset_id)
+        if not dataset:
+            return 0
+
+        stale = [
+            viz for viz in session.exec(
+                select(Visualization).where(Visualization.dataset_id == dataset_id)
+            ).all()
+            if is_stale(viz, dataset)
+        ]
+        if not stale:
+            return 0
+
+        try:
+            refreshed = store_charts(session, dataset, stale)
+        except Exception as e:
+            print(f"WARN: Visualization refresh failed for dataset {dataset_id}: {e}")
+            return 0
+
+        for viz in stale:
+            session.add(viz)
+        session.commit()
+        print(f"OK: Refreshed {refreshed} of {len(stale)} stale visualization(s) for dataset {dataset_id}")
+        return refreshed
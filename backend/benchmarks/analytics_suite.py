@@ -0,0 +1,333 @@
+"""
+K2M Analytics - Analytics Benchmark Suite
+==========================================
+Runs every analytics endpoint against synthetic sales datasets and records
+latency, peak RSS and throughput to a JSON baseline.
+
+Datasets look like assets/demo_data.csv (dates, products, categories,
+currency-formatted totals, regions, customer types) at 10k, 1M and 10M rows;
+"-wide" variants add 60 extra numeric and categorical columns. Files are
+generated from a fixed seed and kept in --data-dir, so reruns compare like
+with like. Each dataset is uploaded through the API and ingested before
+the endpoints are timed in-process with the FastAPI TestClient (DISABLE_AUTH):
+
+    stats, advanced-stats, anomalies, filters, stats/filtered,
+    chart (bar, line), content (first page, deep page, sorted, filtered)
+
+The first call of each endpoint is reported as cold, then --repeat warm calls
+give the median / p95. Peak RSS is sampled while each endpoint runs; the
+stage breakdown comes from the Server-Timing header of the median call.
+
+benchmarks/baseline.json is the reference run (10k and 1m, plain and wide,
+--repeat 5); the machine it ran on is recorded in the file, so compare on
+similar hardware or regenerate it first.
+
+Usage (from backend/):
+    python benchmarks/analytics_suite.py --sizes 10k,1m --wide --repeat 5 --compare benchmarks/baseline.json
+    python benchmarks/analytics_suite.py --sizes 10k,1m --wide --repeat 5 --output benchmarks/baseline.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, BACKEND_DIR)
+
+LAUNCH_DIR = os.getcwd()
+SCRATCH_DIR = tempfile.mkdtemp(prefix="k2m-suite-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(SCRATCH_DIR, 'bench.db')}"
+os.environ["DISABLE_AUTH"] = "true"
+os.environ.setdefault("PROFILE_DIR", os.path.join(SCRATCH_DIR, "profiles"))
+os.chdir(SCRATCH_DIR)  # uploads/ is relative to the working directory
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.main import app  # noqa: E402
+
+SIZES = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+WIDE_EXTRA_COLUMNS = 60
+CHUNK_ROWS = 500_000
+SEED = 42
+INGEST_TIMEOUT = 3600
+# Latency changes below this are run-to-run noise on small datasets, not regressions
+MIN_REGRESSION_MS = 5
+
+PRODUCTS = {
+    "Electronics": ["Laptop Pro X", "Wireless Earbuds", "Smart Watch S3", "Gaming Console", "4K Monitor", "Tablet Air"],
+    "Furniture": ["Ergonomic Chair", "Standing Desk", "Bookshelf Oak", "Office Lamp"],
+    "Clothing": ["Winter Jacket", "Running Shoes", "Denim Jeans", "Cotton T-Shirt", "Wool Sweater"],
+    "Home": ["Coffee Maker", "Air Purifier", "Robot Vacuum", "Blender Max"],
+    "Sports": ["Yoga Mat", "Mountain Bike", "Tennis Racket", "Dumbbell Set"],
+}
+REGIONS = ["North America", "Europe", "Asia Pacific", "Latin America", "Middle East"]
+CUSTOMER_TYPES = ["Business", "Consumer"]
+
+
+# ============ Synthetic Data ============
+
+def make_chunk(rng: np.random.Generator, rows: int, wide: bool) -> pd.DataFrame:
+    catalog = [(category, product) for category, products in PRODUCTS.items() for product in products]
+    base_price = rng.uniform(9.99, 1999.99, len(catalog)).round(2)
+    picks = rng.integers(0, len(catalog), rows)
+    quantity = rng.integers(1, 60, rows)
+    price = base_price[picks]
+    df = pd.DataFrame({
+        "date": (pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 730, rows), unit="D")).strftime("%Y-%m-%d"),
+        "product": [catalog[i][1] for i in picks],
+        "category": [catalog[i][0] for i in picks],
+        "quantity": quantity,
+        "price": price,
+        "total_sales": pd.Series(quantity * price).map("${:,.2f}".format),
+        "region": rng.choice(REGIONS, rows),
+        "customer_type": rng.choice(CUSTOMER_TYPES, rows),
+    })
+    if wide:
+        extra = {}
+        for i in range(WIDE_EXTRA_COLUMNS):
+            if i % 3 == 2:
+                extra[f"segment_{i}"] = rng.choice([f"S{j}" for j in range(12)], rows)
+            else:
+                extra[f"metric_{i}"] = rng.normal(100, 25, rows).round(3)
+        df = pd.concat([df, pd.DataFrame(extra)], axis=1)
+    return df
+
+
+def generate(name: str, rows: int, wide: bool, data_dir: str) -> str:
+    """Writes (or reuses) the CSV for one dataset; the content depends only on name and seed."""
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"sales_{name}_seed{SEED}.csv")
+    if os.path.exists(path):
+        return path
+    rng = np.random.default_rng(SEED)
+    start = time.perf_counter()
+    tmp_path = path + ".part"
+    with open(tmp_path, "w", newline="") as f:
+        for first in range(0, rows, CHUNK_ROWS):
+            make_chunk(rng, min(CHUNK_ROWS, rows - first), wide).to_csv(f, index=False, header=first == 0)
+    os.replace(tmp_path, path)
+    print(f"  generated {path} ({os.path.getsize(path) / 1024 ** 2:.0f} MB) in {time.perf_counter() - start:.1f}s")
+    return path
+
+
+# ============ Measurement ============
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # No procfs (macOS): fall back to the lifetime peak
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+class PeakRss:
+    """Highest resident set size seen while the block runs (sampled every 5 ms)."""
+
+    def __enter__(self):
+        self.peak = _rss_bytes()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(0.005):
+            self.peak = max(self.peak, _rss_bytes())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _rss_bytes())
+
+
+def _server_timing(header: str) -> dict:
+    stages = {}
+    for entry in filter(None, (part.strip() for part in header.split(","))):
+        name, _, dur = entry.partition(";dur=")
+        if dur:
+            stages[name] = float(dur)
+    return stages
+
+
+def measure(client: TestClient, method: str, url: str, body, rows: int, repeat: int) -> dict:
+    def call():
+        start = time.perf_counter()
+        response = client.request(method, url, json=body)
+        elapsed = time.perf_counter() - start
+        if response.status_code != 200:
+            raise RuntimeError(f"{method} {url} -> {response.status_code}: {response.text[:300]}")
+        return elapsed, response
+
+    with PeakRss() as rss:
+        cold, _ = call()
+        runs = [call() for _ in range(repeat)]
+    runs.sort(key=lambda run: run[0])
+    samples = [elapsed for elapsed, _ in runs]
+    median, median_response = runs[len(runs) // 2]
+    return {
+        "cold_ms": round(cold * 1000, 2),
+        "median_ms": round(median * 1000, 2),
+        "p95_ms": round(samples[min(int(len(samples) * 0.95), len(samples) - 1)] * 1000, 2),
+        "min_ms": round(samples[0] * 1000, 2),
+        "requests_per_s": round(1 / median, 2),
+        "rows_per_s": round(rows / median),
+        "peak_rss_mb": round(rss.peak / 1024 ** 2, 1),
+        "response_kb": round(len(median_response.content) / 1024, 1),
+        "stages_ms": _server_timing(median_response.headers.get("Server-Timing", "")),
+    }
+
+
+# ============ Suite ============
+
+def upload(client: TestClient, path: str) -> tuple:
+    """Uploads a CSV and waits for ingest; returns (dataset, seconds)."""
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        response = client.post("/datasets/upload", files={"file": (os.path.basename(path), f, "text/csv")})
+    if response.status_code != 200:
+        raise RuntimeError(f"Upload failed: {response.status_code} {response.text[:300]}")
+    dataset_id = response.json()["id"]
+    while time.perf_counter() - start < INGEST_TIMEOUT:
+        dataset = next((d for d in client.get("/datasets/?limit=1000").json() if d["id"] == dataset_id), None)
+        if dataset and dataset["status"] != "processing":
+            if dataset["status"] != "ready":
+                raise RuntimeError(f"Ingest of {path} ended with status {dataset['status']}")
+            return dataset, time.perf_counter() - start
+        time.sleep(0.2)
+    raise TimeoutError(f"Ingest of {path} did not finish within {INGEST_TIMEOUT}s")
+
+
+def cases(dataset_id: int, rows: int) -> list:
+    deep_offset = max(rows - 100, 0) // 2
+    filters = json.dumps({"region": "Europe"})
+    return [
+        ("stats", "GET", f"/analytics/{dataset_id}/stats", None),
+        ("advanced_stats", "GET", f"/analytics/{dataset_id}/advanced-stats", None),
+        ("anomalies", "GET", f"/analytics/{dataset_id}/anomalies", None),
+        ("filters", "GET", f"/analytics/{dataset_id}/filters", None),
+        ("filtered_stats", "POST", f"/analytics/{dataset_id}/stats/filtered", {"filters": {"region": "Europe"}}),
+        ("chart_bar", "GET", f"/visualizations/dataset/{dataset_id}/generate?type=bar&x_axis=category&y_axis=quantity", None),
+        ("chart_line", "GET", f"/visualizations/dataset/{dataset_id}/generate?type=line&x_axis=date&y_axis=price&bucket=week", None),
+        ("content_first_page", "GET", f"/datasets/{dataset_id}/content?limit=100", None),
+        ("content_deep_page", "GET", f"/datasets/{dataset_id}/content?limit=100&offset={deep_offset}", None),
+        ("content_sorted", "GET", f"/datasets/{dataset_id}/content?limit=100&sort_by=-price", None),
+        ("content_filtered", "GET", f"/datasets/{dataset_id}/content?limit=100&filters={filters}", None),
+    ]
+
+
+def run_dataset(client: TestClient, name: str, rows: int, wide: bool, data_dir: str, repeat: int) -> dict:
+    path = generate(name, rows, wide, data_dir)
+    dataset, ingest_seconds = upload(client, path)
+    result = {
+        "rows": rows,
+        "columns": dataset["total_columns"],
+        "file_mb": round(os.path.getsize(path) / 1024 ** 2, 1),
+        "ingest_s": round(ingest_seconds, 2),
+        "endpoints": {},
+    }
+    print(f"\n{name} — {rows:,} rows x {dataset['total_columns']} columns, "
+          f"{result['file_mb']} MB, upload + ingest {ingest_seconds:.1f}s")
+    print(f"  {'endpoint':<20} {'cold':>9} {'median':>9} {'p95':>9} {'rows/s':>13} {'peak RSS':>10}")
+    for label, method, url, body in cases(dataset["id"], rows):
+        stats = measure(client, method, url, body, rows, repeat)
+        result["endpoints"][label] = stats
+        print(f"  {label:<20} {stats['cold_ms']:7.1f}ms {stats['median_ms']:7.1f}ms {stats['p95_ms']:7.1f}ms "
+              f"{stats['rows_per_s']:13,} {stats['peak_rss_mb']:8.0f}MB")
+    client.delete(f"/datasets/{dataset['id']}")
+    return result
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def compare(results: dict, baseline_path: str, tolerance: float) -> int:
+    """Prints endpoints whose median latency or peak RSS grew by more than `tolerance`; returns their count."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["datasets"]
+    regressions = 0
+    print(f"\nCompared with {baseline_path} (tolerance {tolerance:.0%})")
+    for name, current in results.items():
+        if name not in baseline:
+            print(f"  {name}: not in baseline")
+            continue
+        for label, stats in current["endpoints"].items():
+            before = baseline[name]["endpoints"].get(label)
+            if before is None:
+                continue
+            for metric in ("median_ms", "peak_rss_mb"):
+                grew = stats[metric] - before[metric]
+                if metric == "median_ms" and grew < MIN_REGRESSION_MS:
+                    continue
+                if before[metric] and stats[metric] > before[metric] * (1 + tolerance):
+                    regressions += 1
+                    print(f"  REGRESSION {name}/{label} {metric}: {before[metric]} -> {stats[metric]}")
+    if not regressions:
+        print("  no regressions")
+    return regressions
+
+
+def run(sizes: list, wide: bool, data_dir: str, repeat: int, output: str, baseline: str, tolerance: float) -> int:
+    names = [(size, SIZES[size], False) for size in sizes]
+    if wide:
+        names += [(f"{size}-wide", SIZES[size], True) for size in sizes]
+
+    results = {}
+    with TestClient(app) as client:
+        for name, rows, is_wide in names:
+            results[name] = run_dataset(client, name, rows, is_wide, data_dir, repeat)
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "repeat": repeat,
+        "seed": SEED,
+        "datasets": results,
+    }
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nOK: Baseline written to {output}")
+    return compare(results, baseline, tolerance) if baseline else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10k", help=f"comma-separated, from {', '.join(SIZES)}")
+    parser.add_argument("--wide", action="store_true", help=f"also run variants with {WIDE_EXTRA_COLUMNS} extra columns")
+    parser.add_argument("--repeat", type=int, default=10, help="warm calls per endpoint")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "k2m-bench-data"))
+    parser.add_argument("--output", help="write results as a JSON baseline")
+    parser.add_argument("--compare", help="baseline JSON to check for regressions (exit code 1 if any)")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed growth before a regression is reported")
+    args = parser.parse_args()
+
+    sizes = [s.strip().lower() for s in args.sizes.split(",") if s.strip()]
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        parser.error(f"unknown size(s): {', '.join(unknown)}")
+    # Paths are relative to where the suite was started, not the scratch directory
+    data_dir = os.path.join(LAUNCH_DIR, args.data_dir)
+    output = os.path.join(LAUNCH_DIR, args.output) if args.output else None
+    baseline = os.path.join(LAUNCH_DIR, args.compare) if args.compare else None
+    sys.exit(1 if run(sizes, args.wide, data_dir, args.repeat, output, baseline, args.tolerance) else 0)
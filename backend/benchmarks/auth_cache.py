@@ -0,0 +1,99 @@
+"""
+K2M Analytics - Auth Cache Benchmark
+=====================================
+Measures ID-token verification with and without the verified-token cache.
+
+Tokens are minted locally with a throwaway RSA key set, which the certificate
+store is given directly, so nothing talks to Google or Firebase.
+
+Usage (from backend/):
+    python benchmarks/auth_cache.py --calls 10000
+"""
+
+import argparse
+import datetime
+import os
+import sys
+import time
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from google.auth import crypt, jwt
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.token_cache import ID_TOKEN_ISSUER_PREFIX, CertificateStore, TokenVerifier  # noqa: E402
+
+PROJECT_ID = "k2m-bench"
+KEY_ID = "bench-key"
+
+
+def make_key_set():
+    """(signer, {kid: PEM certificate}) for a fresh self-signed RSA key."""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "k2m-bench")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now).not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    private_pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    signer = crypt.RSASigner.from_string(private_pem, key_id=KEY_ID)
+    return signer, {KEY_ID: cert.public_bytes(serialization.Encoding.PEM).decode()}
+
+
+def mint_token(signer, uid: str, lifetime: int = 3600) -> str:
+    now = int(time.time())
+    payload = {
+        "iss": ID_TOKEN_ISSUER_PREFIX + PROJECT_ID,
+        "aud": PROJECT_ID,
+        "sub": uid,
+        "auth_time": now,
+        "iat": now,
+        "exp": now + lifetime,
+        "email": f"{uid}@example.com",
+    }
+    return jwt.encode(signer, payload).decode()
+
+
+def timed(fn, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls
+
+
+def run(calls: int, users: int):
+    signer, certs = make_key_set()
+    store = CertificateStore(fetch=lambda url: (certs, 3600))
+    store.refresh()
+    verifier = TokenVerifier(project_id=PROJECT_ID, store=store, revocation_check_seconds=0)
+    tokens = [mint_token(signer, f"user-{i}") for i in range(users)]
+
+    uncached = timed(lambda: verifier._decode(tokens[0]), max(calls // 10, 1))
+    verifier.verify(tokens[0])
+    cached = timed(lambda: verifier.verify(tokens[0]), calls)
+
+    counter = iter(range(calls * users))
+    mixed = timed(lambda: verifier.verify(tokens[next(counter) % users]), calls)
+
+    print(f"{calls:,} calls, {users} distinct tokens")
+    print(f"  full verification : {uncached * 1e6:9.1f} us/call")
+    print(f"  cached, one token : {cached * 1e6:9.1f} us/call  ({uncached / cached:.0f}x)")
+    print(f"  cached, {users:>3} tokens: {mixed * 1e6:9.1f} us/call")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=10_000)
+    parser.add_argument("--users", type=int, default=50)
+    args = parser.parse_args()
+    run(args.calls, args.users)
@@ -0,0 +1,100 @@
+"""
+K2M Analytics - Cold Start Benchmark
+=====================================
+Two views of a cold start, each in a fresh interpreter:
+
+- import profile: `python -X importtime -c "import app.main"`, summarized as
+  the slowest modules by cumulative and by self time
+- time to first request: process start until GET /health answers, with the
+  lifespan (migrations, Firebase, background warm-up) running in between
+
+Runs in a scratch working directory with DISABLE_AUTH=true, so it needs no
+credentials and leaves the local database alone.
+
+Usage (from backend/):
+    python benchmarks/cold_start.py --runs 5
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+FIRST_REQUEST = """
+import time
+start = time.perf_counter()
+from fastapi.testclient import TestClient
+from app.main import app
+imported = time.perf_counter()
+with TestClient(app) as client:
+    started = time.perf_counter()
+    assert client.get("/health").status_code == 200
+    answered = time.perf_counter()
+print(f"TIMING {imported - start} {started - imported} {answered - started}")
+"""
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def _env(directory: str) -> dict:
+    env = dict(os.environ, DISABLE_AUTH="true", PYTHONPATH=BACKEND_DIR, PYTHONDONTWRITEBYTECODE="")
+    env["DATABASE_URL"] = f"sqlite:///{os.path.join(directory, 'database.db')}"
+    return env
+
+
+def import_profile(top: int):
+    with tempfile.TemporaryDirectory() as directory:
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import app.main"],
+            cwd=directory, env=_env(directory), capture_output=True, text=True,
+        )
+    modules = []
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            modules.append((int(match.group(1)), int(match.group(2)), len(match.group(3)), match.group(4)))
+    total = next((cumulative for _, cumulative, _, name in modules if name == "app.main"), 0)
+
+    print(f"import app.main: {total / 1000:8.1f} ms")
+    print(f"\n  slowest by cumulative time (top-level imports of app modules included)")
+    for self_us, cumulative, _, name in sorted(modules, key=lambda m: -m[1])[:top]:
+        print(f"    {cumulative / 1000:8.1f} ms  {name}")
+    print(f"\n  slowest by self time")
+    for self_us, cumulative, _, name in sorted(modules, key=lambda m: -m[0])[:top]:
+        print(f"    {self_us / 1000:8.1f} ms  {name}")
+
+
+def first_request(runs: int):
+    samples = []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as directory:
+            start = time.perf_counter()
+            result = subprocess.run(
+                [sys.executable, "-c", FIRST_REQUEST],
+                cwd=directory, env=_env(directory), capture_output=True, text=True,
+            )
+            total = time.perf_counter() - start
+        timing = next((line.split()[1:] for line in result.stdout.splitlines() if line.startswith("TIMING")), None)
+        if timing is None:
+            print(result.stdout[-2000:], result.stderr[-2000:])
+            raise SystemExit("first request failed")
+        samples.append([total] + [float(t) for t in timing])
+
+    print(f"\ntime to first request (median of {runs}):")
+    for i, label in enumerate(["process total", "imports", "lifespan startup", "first request"]):
+        print(f"  {label:<17} {statistics.median(s[i] for s in samples) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+    import_profile(args.top)
+    first_request(args.runs)
@@ -0,0 +1,103 @@
+"""
+K2M Analytics - Dataset Listing Benchmark
+==========================================
+Times GET /datasets/ against a scratch SQLite database holding many datasets,
+for an admin (all companies) and a client (one company), on the first page,
+deep cursor pages and filtered queries.
+
+Usage (from backend/):
+    python benchmarks/dataset_listing.py --datasets 100000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+SCRATCH_DIR = tempfile.mkdtemp(prefix="k2m-listing-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(SCRATCH_DIR, 'bench.db')}"
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from app.database import create_db_and_tables, engine  # noqa: E402
+from app.deps import get_current_user  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import Dataset  # noqa: E402
+
+COMPANIES = 50
+
+
+def populate(count: int):
+    start = datetime(2022, 1, 1)
+    rows = [
+        {
+            "filename": f"report_{i % 997:03d}_{i}.csv",
+            "file_path": f"uploads/blobs/{i}.csv",
+            "file_size": 1024 + i,
+            "total_rows": 1000,
+            "total_columns": 8,
+            "uploaded_at": start + timedelta(minutes=7 * i),
+            "version": 1,
+            "status": "ready",
+            "company_id": f"company-{i % COMPANIES:03d}",
+            "row_index_json": "[" + ",".join(["1234567"] * 200) + "]",  # heavy column the listing skips
+        }
+        for i in range(count)
+    ]
+    with engine.begin() as conn:
+        conn.execute(insert(Dataset), rows)
+
+
+def timed(client: TestClient, url: str, repeat: int):
+    samples = []
+    response = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(url)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2], response
+
+
+def run(count: int, repeat: int):
+    create_db_and_tables()
+    populate(count)
+    client = TestClient(app)
+
+    for label, user in [
+        ("admin ", {"uid": "bench", "email": "admin@k2m-analytics.com", "company_id": "company-000", "role": "admin"}),
+        ("client", {"uid": "bench", "email": "client@example.com", "company_id": "company-007", "role": "client"}),
+    ]:
+        app.dependency_overrides[get_current_user] = lambda user=user: user
+
+        _, first = timed(client, "/datasets/?limit=100", 1)
+        cursor = first.headers["X-Next-Cursor"]
+        # Walk 10 pages in to get a deep cursor
+        deep = cursor
+        for _ in range(10):
+            deep = client.get(f"/datasets/?limit=100&cursor={deep}").headers["X-Next-Cursor"]
+
+        cases = [
+            ("first page", "/datasets/?limit=100"),
+            ("next page", f"/datasets/?limit=100&cursor={cursor}"),
+            ("page 11", f"/datasets/?limit=100&cursor={deep}"),
+            ("name prefix", "/datasets/?limit=100&name=report_042"),
+            ("date range", "/datasets/?limit=100&uploaded_from=2022-06-01&uploaded_to=2022-07-01"),
+        ]
+        print(f"\n{label} — {count:,} datasets")
+        for case, url in cases:
+            median, response = timed(client, url, repeat)
+            print(f"  {case:<12} {median * 1000:7.2f} ms  {len(response.json()):4d} rows")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--datasets", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    run(args.datasets, args.repeat)
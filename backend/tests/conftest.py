@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# Tests import the app as `app.*` from backend/, against a scratch database
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='k2m-tests-'), 'test.db')}"
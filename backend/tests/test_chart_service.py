@@ -0,0 +1,154 @@
+"""
+Chart reductions: LTTB line downsampling, histogram and heatmap binning, scatter sampling.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services import chart_service
+from app.services.chart_service import ChartFrame, downsample_line, lttb_indices
+
+
+def test_lttb_keeps_endpoints_and_threshold():
+    x = np.arange(1000, dtype=np.float64)
+    y = np.sin(x / 20)
+
+    idx = lttb_indices(x, y, 100)
+
+    assert len(idx) == 100
+    assert idx[0] == 0 and idx[-1] == 999
+    assert (np.diff(idx) > 0).all()
+
+
+def test_lttb_keeps_spikes():
+    x = np.arange(500, dtype=np.float64)
+    y = np.zeros(500)
+    y[123], y[377] = 50, -50
+
+    idx = lttb_indices(x, y, 20)
+
+    assert 123 in idx and 377 in idx
+
+
+@pytest.mark.parametrize("threshold", [2, 10, 50])
+def test_lttb_returns_everything_below_threshold_or_minimum(threshold):
+    x = np.arange(10, dtype=np.float64)
+    assert lttb_indices(x, x, threshold).tolist() == list(range(10))
+
+
+def test_line_dates_stay_plain_dates_without_bucket():
+    df = pd.DataFrame({"date": pd.date_range("2024-01-01", periods=50).astype(str), "sales": range(50)})
+
+    records, meta = downsample_line(ChartFrame(df), "date", "sales", points=10)
+
+    assert records[0] == {"date": "2024-01-01", "sales": 0.0}
+    assert records[-1]["date"] == "2024-02-19"
+    assert meta["downsampled"] and meta["points"] == 10
+
+
+def test_line_timestamps_keep_time_of_day():
+    df = pd.DataFrame({"at": pd.date_range("2024-01-01", periods=5, freq="6h"), "v": range(5)})
+
+    records, _ = downsample_line(ChartFrame(df), "at", "v")
+
+    assert [r["at"] for r in records[:2]] == ["2024-01-01T00:00:00", "2024-01-01T06:00:00"]
+
+
+def test_line_bucketed_by_month():
+    df = pd.DataFrame({"date": pd.date_range("2024-01-01", periods=60), "sales": 1})
+
+    records, meta = downsample_line(ChartFrame(df), "date", "sales", bucket="month", agg="sum")
+
+    assert records == [
+        {"date": "2024-01-01", "sales": 31.0},
+        {"date": "2024-02-01", "sales": 29.0},
+    ]
+    assert meta["bucket"] == "month" and meta["agg"] == "sum"
+
+
+def test_line_bucket_requires_dates():
+    df = pd.DataFrame({"region": ["a", "b"], "sales": [1, 2]})
+    with pytest.raises(ValueError):
+        downsample_line(ChartFrame(df), "region", "sales", bucket="day")
+
+
+def test_date_format():
+    assert chart_service.date_format(pd.Series(pd.to_datetime(["2024-01-05", None]))) == "%Y-%m-%d"
+    assert chart_service.date_format(pd.Series(pd.to_datetime(["2024-01-05 13:30"]))) == "%Y-%m-%dT%H:%M:%S"
+
+
+def test_histogram_counts_every_value_once():
+    df = pd.DataFrame({"price": [1, 2, 2, 3, 9, 10, None]})
+
+    data, meta = chart_service.histogram(ChartFrame(df), "price", None, "sum", bins=3)
+
+    assert [d["count"] for d in data] == [4, 0, 2]
+    assert data[0]["bin_start"] == 1.0 and data[-1]["bin_end"] == 10.0
+    assert meta == {"source_points": 6, "bins": 3, "agg": "count"}
+
+
+@pytest.mark.parametrize("agg, expected", [("sum", [30.0, 0.0, 70.0]), ("mean", [15.0, None, 35.0]), ("max", [20.0, None, 40.0])])
+def test_histogram_aggregates_y_per_bin(agg, expected):
+    df = pd.DataFrame({"price": [1, 2, 9, 10], "qty": [10, 20, 30, 40]})
+
+    data, _ = chart_service.histogram(ChartFrame(df), "price", "qty", agg, bins=3)
+
+    assert [d["qty"] for d in data] == expected
+
+
+def test_histogram_rejects_text():
+    with pytest.raises(ValueError):
+        chart_service.histogram(ChartFrame(pd.DataFrame({"region": ["a", "b"]})), "region", None, "sum", None)
+
+
+def test_heatmap_categorical_counts_omit_empty_cells():
+    df = pd.DataFrame({"region": ["N", "N", "S", "S", "S"], "segment": ["A", "B", "A", "A", "B"]})
+
+    data, meta = chart_service.heatmap(ChartFrame(df), "region", "segment", None, "sum", None)
+
+    cells = {(d["region"], d["segment"]): d["count"] for d in data}
+    assert cells == {("N", "A"): 1, ("N", "B"): 1, ("S", "A"): 2, ("S", "B"): 1}
+    assert meta["x_labels"] == ["S", "N"]   # most frequent first
+
+
+def test_heatmap_numeric_axes_are_binned_with_values():
+    df = pd.DataFrame({"x": [0, 0, 10, 10], "y": [0, 10, 0, 10], "v": [1, 2, 3, 4]})
+
+    data, meta = chart_service.heatmap(ChartFrame(df), "x", "y", "v", "sum", bins=2)
+
+    assert sorted(d["v"] for d in data) == [1.0, 2.0, 3.0, 4.0]
+    assert len(meta["x_labels"]) == 2 and meta["source_points"] == 4
+
+
+def test_scatter_keeps_small_inputs_whole():
+    df = pd.DataFrame({"x": [1.0, 2.0, 3.0], "y": [3.0, 2.0, 1.0]})
+
+    data, meta = chart_service.scatter(ChartFrame(df), "x", "y", points=10)
+
+    assert [(d["x"], d["y"]) for d in data] == [(1.0, 3.0), (2.0, 2.0), (3.0, 1.0)]
+    assert not meta["downsampled"]
+
+
+def test_scatter_thins_dense_clusters_and_keeps_outliers():
+    rng = np.random.default_rng(1)
+    cluster = rng.normal(0, 0.01, size=(20_000, 2))
+    outliers = np.array([[5.0, 5.0], [-5.0, 5.0], [5.0, -5.0]])
+    xy = np.vstack([cluster, outliers])
+    df = pd.DataFrame({"x": xy[:, 0], "y": xy[:, 1]})
+
+    first, meta = chart_service.scatter(ChartFrame(df), "x", "y", points=500)
+    again, _ = chart_service.scatter(ChartFrame(df), "x", "y", points=500)
+
+    assert meta == {"source_points": 20_003, "points": 500, "downsampled": True}
+    assert first == again   # seeded, so repeated requests render the same sample
+    kept = {(d["x"], d["y"]) for d in first}
+    assert sum(tuple(o) in kept for o in outliers.tolist()) >= 2
+
+
+def test_compute_chart_rejects_unknown_columns_and_types():
+    frame = ChartFrame(pd.DataFrame({"a": [1, 2]}))
+    with pytest.raises(ValueError, match="not found"):
+        chart_service.compute_chart(frame, "bar", "missing")
+    with pytest.raises(ValueError, match="not supported"):
+        chart_service.compute_chart(frame, "pie", "a")
@@ -0,0 +1,61 @@
+"""
+Content view caches and view resolution (filters, search, sort) on an in-memory frame.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.models import Dataset
+from app.services import content_service
+from app.services.content_service import _LRUCache
+
+
+def test_lru_cache_stays_within_its_byte_bound():
+    cache = _LRUCache("test", max_bytes=100)
+    cache.put("a", "A", 60)
+    cache.put("b", "B", 30)
+    assert cache.get("a") == "A"   # a is now the most recently used
+
+    cache.put("c", "C", 30)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "A" and cache.get("c") == "C"
+    assert cache.size == 90
+
+
+@pytest.fixture
+def frame(monkeypatch):
+    df = pd.DataFrame({
+        "customer": [f"customer {i:04d}" for i in range(1000)],
+        "region": ["North", "South", "East", "West"] * 250,
+        "sales": np.arange(1000, dtype=np.float64),
+    })
+    monkeypatch.setattr(content_service, "_frames", _LRUCache("content_frames", 1024 ** 3))
+    monkeypatch.setattr(content_service, "_arrays", _LRUCache("content_arrays", 1024 ** 3))
+    monkeypatch.setattr(content_service.dataset_loader, "load_dataframe", lambda dataset: df)
+    return df
+
+
+def dataset():
+    return Dataset(id=1, filename="sales.csv", file_path="sales.csv", version=1)
+
+
+def test_frames_are_sized_with_their_strings(frame):
+    content_service.get_view(dataset(), {}, [], None)
+
+    assert content_service._frames.size == frame.memory_usage(deep=True).sum()
+    assert content_service._frames.size > 2 * frame.memory_usage(deep=False).sum()
+
+
+def test_view_filters_searches_and_sorts(frame):
+    view = content_service.get_view(
+        dataset(),
+        content_service.parse_filters('{"region": "North", "sales": {"gte": 100}}'),
+        content_service.parse_sort("sales", "desc"),
+        "customer 09",
+    )
+
+    page = view.page(0, 3)
+    assert view.total_rows == 25   # customer 0900..0999 in the North region
+    assert page["sales"].tolist() == [996.0, 992.0, 988.0]
@@ -0,0 +1,83 @@
+"""
+CSV dialect sniffing and parsing with the sniffed dialect.
+"""
+
+import json
+
+import pytest
+
+from app.models import Dataset
+from app.services import csv_dialect, dataset_loader
+
+
+def test_sniffs_plain_utf8_csv():
+    dialect = csv_dialect.sniff(b"date,region,total\n2024-01-05,North,1200.50\n2024-01-06,South,35.00\n")
+
+    assert dialect == {
+        "encoding": "utf-8", "delimiter": ",", "header_row": 0, "decimal": ".", "thousands": None,
+        "date_formats": {"date": "%Y-%m-%d"}, "newlines_in_values": False,
+    }
+
+
+def test_sniffs_european_export():
+    head = "Umsatzbericht Januar 2024\nDatum;Region;Betrag\n05.01.2024;Nord;1.200,50\n06.01.2024;Süd;35,00\n".encode("cp1250")
+
+    dialect = csv_dialect.sniff(head)
+
+    assert dialect["encoding"] != "utf-8"   # the exact code page is charset_normalizer's guess
+    assert dialect["delimiter"] == ";"
+    assert dialect["header_row"] == 1
+    assert (dialect["decimal"], dialect["thousands"]) == (",", ".")
+    assert dialect["date_formats"] == {"Datum": "%d.%m.%Y"}
+
+
+@pytest.mark.parametrize("delimiter", ["\t", "|"])
+def test_sniffs_other_delimiters(delimiter):
+    head = delimiter.join(["a", "b", "c"]).encode() + b"\n" + delimiter.join(["1", "2", "3"]).encode() + b"\n"
+    assert csv_dialect.sniff(head)["delimiter"] == delimiter
+
+
+def test_cut_off_last_line_is_ignored():
+    dialect = csv_dialect.sniff(b"id,name\n1,alpha\n2,be")
+    assert dialect["delimiter"] == "," and dialect["header_row"] == 0
+
+
+def test_detects_quoted_newlines():
+    assert csv_dialect.sniff(b'id,note\n1,"two\nlines"\n2,plain\n')["newlines_in_values"]
+    assert not csv_dialect.sniff(b'id,note\n1,"quoted, one line"\n2,"say ""hi"""\n')["newlines_in_values"]
+
+
+def test_stored_dialects_without_the_flag_assume_quoted_newlines():
+    old = Dataset(filename="a.csv", file_path="a.csv", csv_dialect_json=json.dumps({"delimiter": ";"}))
+    new = Dataset(filename="a.csv", file_path="a.csv", csv_dialect_json=json.dumps({"newlines_in_values": False}))
+
+    assert csv_dialect.load(old)["newlines_in_values"] and csv_dialect.load(old)["delimiter"] == ";"
+    assert not csv_dialect.load(new)["newlines_in_values"]
+    assert csv_dialect.load(Dataset(filename="a.csv", file_path="a.csv")) == csv_dialect.DEFAULT_DIALECT
+
+
+def test_read_csv_applies_dialect(tmp_path):
+    path = tmp_path / "eu.csv"
+    path.write_bytes("Datum;Region;Betrag\n05.01.2024;Nord;1.200,50\n06.01.2024;Süd;35,00\n".encode("cp1250"))
+    dialect = dict(csv_dialect.DEFAULT_DIALECT, encoding="cp1250", delimiter=";", decimal=",", thousands=".",
+                   date_formats={"Datum": "%d.%m.%Y"})
+
+    df = dataset_loader.read_csv(str(path), dialect)
+
+    assert df["Betrag"].tolist() == [1200.5, 35.0]
+    assert df["Region"].tolist() == ["Nord", "Süd"]
+    assert df["Datum"].dt.strftime("%Y-%m-%d").tolist() == ["2024-01-05", "2024-01-06"]
+
+
+def test_quoted_newline_past_the_sample_is_retried(tmp_path, monkeypatch):
+    monkeypatch.setattr(csv_dialect, "ARROW_BLOCK_SIZE", 4096)
+    rows = ["id,note,amount"] + [f"{i},plain,{i}" for i in range(500)] + [f'{i},"two\nlines",{i}' for i in range(500, 1000)]
+    path = tmp_path / "late.csv"
+    path.write_text("\n".join(rows) + "\n")
+    dialect = csv_dialect.sniff(path.read_bytes()[:2048])
+    assert not dialect["newlines_in_values"]
+
+    df = dataset_loader.read_csv(str(path), dialect)
+
+    assert len(df) == 1000
+    assert df["note"].iloc[-1] == "two\nlines"
@@ -0,0 +1,81 @@
+"""
+Keyset pagination of the dataset listing.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException, Response
+from sqlmodel import Session
+
+from app.database import create_db_and_tables, engine
+from app.models import Dataset
+from app.routers import datasets as datasets_router
+
+USER = {"uid": "u1", "company_id": "listing-test", "role": "client"}
+START = datetime(2024, 3, 1, 12, 0)
+
+
+@pytest.fixture(scope="module")
+def session():
+    create_db_and_tables()
+    with Session(engine) as session:
+        # Two uploads share a timestamp so the id has to break the tie
+        times = [START, START + timedelta(hours=1), START + timedelta(hours=1), START + timedelta(hours=2),
+                 START + timedelta(hours=3)]
+        for i, uploaded_at in enumerate(times):
+            session.add(Dataset(filename=f"report-{i}.csv", file_path=f"uploads/report-{i}.csv", file_size=1,
+                                uploaded_at=uploaded_at, company_id=USER["company_id"]))
+        session.add(Dataset(filename="other.csv", file_path="uploads/other.csv", file_size=1,
+                            uploaded_at=START, company_id="someone-else"))
+        session.commit()
+        yield session
+
+
+def listing(session, **params):
+    response = Response()
+    params = {"limit": None, "cursor": None, "name": None, "uploaded_from": None, "uploaded_to": None, **params}
+    rows = datasets_router.get_datasets(response, session=session, current_user=USER, **params)
+    return [row.filename for row in rows], response.headers.get("X-Next-Cursor")
+
+
+def test_without_limit_or_cursor_everything_is_returned(session):
+    names, cursor = listing(session)
+
+    assert names == ["report-4.csv", "report-3.csv", "report-2.csv", "report-1.csv", "report-0.csv"]
+    assert cursor is None
+
+
+def test_pages_follow_the_cursor_without_gaps_or_repeats(session):
+    pages, cursor = [], None
+    while True:
+        names, cursor = listing(session, limit=2, cursor=cursor)
+        pages.append(names)
+        if cursor is None:
+            break
+
+    assert pages == [["report-4.csv", "report-3.csv"], ["report-2.csv", "report-1.csv"], ["report-0.csv"]]
+
+
+def test_cursor_alone_uses_the_default_page_size(session, monkeypatch):
+    monkeypatch.setattr(datasets_router, "LISTING_PAGE_SIZE", 3)
+    _, cursor = listing(session, limit=1)
+
+    names, next_cursor = listing(session, cursor=cursor)
+
+    assert names == ["report-3.csv", "report-2.csv", "report-1.csv"]
+    assert next_cursor is not None
+
+
+def test_filters_apply_to_pages(session):
+    names, _ = listing(session, limit=10, uploaded_from=START + timedelta(hours=1), uploaded_to=START + timedelta(hours=2))
+    assert names == ["report-3.csv", "report-2.csv", "report-1.csv"]
+
+    names, _ = listing(session, limit=10, name="REPORT-4")
+    assert names == ["report-4.csv"]
+
+
+def test_invalid_cursor_is_rejected(session):
+    with pytest.raises(HTTPException) as error:
+        listing(session, cursor="not-a-cursor")
+    assert error.value.status_code == 400
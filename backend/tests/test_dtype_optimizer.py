@@ -0,0 +1,43 @@
+"""
+Ingest dtype compaction: smaller storage, same values and column types for analytics.
+"""
+
+import pandas as pd
+
+from app.services import dtype_optimizer
+
+
+def test_text_dates_stay_text():
+    df = pd.DataFrame({"order_date": ["2024-01-05", "2024-01-06"] * 50})
+
+    optimized, _ = dtype_optimizer.optimize(df)
+
+    assert not pd.api.types.is_datetime64_any_dtype(optimized["order_date"])
+    assert optimized["order_date"].tolist() == df["order_date"].tolist()
+
+
+def test_low_cardinality_text_becomes_category():
+    df = pd.DataFrame({"region": ["North", "South", "East"] * 100})
+
+    optimized, report = dtype_optimizer.optimize(df)
+
+    assert isinstance(optimized["region"].dtype, pd.CategoricalDtype)
+    assert report["after_bytes"] < report["before_bytes"]
+
+
+def test_currency_text_is_not_categorized():
+    df = pd.DataFrame({"total_sales": ["$1,200.00", "$35.50"] * 100})
+
+    optimized, _ = dtype_optimizer.optimize(df)
+
+    assert optimized["total_sales"].dtype == dtype_optimizer.ARROW_STRING
+
+
+def test_numbers_downcast_only_when_lossless():
+    df = pd.DataFrame({"qty": [1, 2, 300], "ratio": [0.5, 0.25, 1.0], "price": [0.1, 0.2, 0.3]})
+
+    optimized, _ = dtype_optimizer.optimize(df)
+
+    assert optimized["qty"].dtype == "int16"
+    assert optimized["ratio"].dtype == "float32"
+    assert optimized["price"].dtype == "float64"   # 0.1 is not exact in float32
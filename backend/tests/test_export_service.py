@@ -0,0 +1,72 @@
+"""
+Byte ranges, conditional ranges and Accept-Encoding negotiation for downloads.
+"""
+
+import gzip
+
+import pytest
+
+from app.models import Dataset
+from app.services import export_service
+from app.services.export_service import RangeNotSatisfiable, choose_encoding, if_range_matches, parse_range
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=900-5000", (900, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    ("bytes=0-1,5-9", None),   # multi-range: full body
+    ("items=0-9", None),
+    ("bytes=a-b", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=50-10", "bytes=-0"])
+def test_parse_range_outside_file(header):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range(header, 1000)
+
+
+@pytest.mark.parametrize("accept, fmt, expected", [
+    (None, "csv", None),
+    ("gzip, deflate", "csv", "gzip"),
+    ("gzip;q=0", "csv", None),
+    ("br", "csv", None),
+    ("gzip", "parquet", None),   # already compressed
+    ("gzip", "xlsx", None),
+])
+def test_choose_encoding(accept, fmt, expected):
+    assert choose_encoding(accept, fmt) == expected
+
+
+def test_choose_encoding_prefers_zstd(monkeypatch):
+    monkeypatch.setattr(export_service, "HAS_ZSTD", True)
+    assert choose_encoding("gzip, zstd", "csv") == "zstd"
+    monkeypatch.setattr(export_service, "HAS_ZSTD", False)
+    assert choose_encoding("gzip, zstd", "csv") == "gzip"
+
+
+def test_etag_uses_content_hash_or_version():
+    assert export_service.etag(Dataset(id=3, filename="a.csv", file_path="a.csv", content_hash="abc")) == '"abc"'
+    assert export_service.etag(Dataset(id=3, filename="a.csv", file_path="a.csv", version=2)) == '"dataset-3-v2"'
+
+
+@pytest.mark.parametrize("if_range, expected", [
+    (None, True),
+    ('"abc"', True),
+    ('"other"', False),
+    ('W/"abc"', False),                        # weak tags never allow a partial response
+    ("Wed, 21 Oct 2015 07:28:00 GMT", False),  # dates are not supported
+])
+def test_if_range_matches(if_range, expected):
+    assert if_range_matches(if_range, '"abc"') is expected
+
+
+def test_compress_gzip_round_trip():
+    chunks = [b"a,b\n", b"1,2\n" * 1000]
+    assert gzip.decompress(b"".join(export_service.compress(chunks, "gzip"))) == b"".join(chunks)
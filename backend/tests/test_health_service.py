@@ -0,0 +1,87 @@
+"""
+Readiness checks and the liveness endpoints.
+"""
+
+import pytest
+
+from app import main
+from app.services import health_service, ingest_service
+from app.services.health_service import WarmUpState
+
+
+@pytest.fixture
+def checks(monkeypatch):
+    registry = {}
+    monkeypatch.setattr(health_service, "CHECKS", registry)
+    return registry
+
+
+def test_ready_when_every_check_passes(checks):
+    checks["database"] = lambda: {"backend": "sqlite"}
+    checks["cache"] = lambda: {"entries": 3}
+
+    report = health_service.readiness()
+
+    assert report["ready"]
+    assert report["checks"]["database"]["ok"] and report["checks"]["database"]["backend"] == "sqlite"
+    assert report["checks"]["cache"]["latency_ms"] >= 0
+
+
+def test_raising_check_reports_its_error(checks):
+    def broken():
+        raise RuntimeError("bucket unreachable")
+
+    checks["database"] = lambda: {}
+    checks["storage"] = broken
+
+    report = health_service.readiness()
+
+    assert not report["ready"]
+    assert report["checks"]["storage"] == {"ok": False, "error": "bucket unreachable",
+                                           "latency_ms": report["checks"]["storage"]["latency_ms"]}
+    assert report["checks"]["database"]["ok"]
+
+
+def test_check_can_fail_without_raising(checks):
+    checks["ingest_pool"] = lambda: {"queued": 50, "ok": False}
+    assert not health_service.readiness()["ready"]
+
+
+def test_ingest_pool_saturation(monkeypatch):
+    monkeypatch.setattr(health_service, "READY_MAX_INGEST_QUEUE", 5)
+    monkeypatch.setattr(ingest_service, "pool_stats", lambda: {"workers": 2, "running": 2, "queued": 6})
+    assert health_service._check_ingest_pool()["ok"] is False
+
+    monkeypatch.setattr(ingest_service, "pool_stats", lambda: {"workers": 2, "running": 2, "queued": 5})
+    assert health_service._check_ingest_pool()["ok"] is True
+
+
+def test_warm_up_must_finish(monkeypatch):
+    state = WarmUpState()
+    monkeypatch.setattr(health_service, "warm_up_state", state)
+    state.start()
+    with pytest.raises(RuntimeError):
+        health_service._check_warm_up()
+
+    state.fail("seed_demo_data")
+    state.finish()
+    assert health_service._check_warm_up()["failed_steps"] == ["seed_demo_data"]
+
+
+def test_database_check_round_trips():
+    assert health_service._check_database() == {"backend": "sqlite"}
+
+
+def test_auth_check_is_skipped_without_auth(monkeypatch):
+    monkeypatch.setattr(health_service, "DISABLE_AUTH", True)
+    assert health_service._check_auth() == {"skipped": "DISABLE_AUTH"}
+
+
+def test_plain_health_touches_no_dependency(monkeypatch):
+    def fail():
+        raise AssertionError("/health must not run readiness checks")
+
+    monkeypatch.setattr(health_service, "readiness", fail)
+
+    assert main.health_check()["status"] == "healthy"
+    assert main.liveness() == {"status": "alive"}
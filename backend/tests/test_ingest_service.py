@@ -0,0 +1,65 @@
+"""
+Upload streaming: a failed ingest must not leave its temporary file behind.
+"""
+
+import asyncio
+
+import pytest
+
+from app.services import ingest_service
+from app.services.storage_service import storage_service
+
+
+class FakeUpload:
+    """Serves `chunks` to `read`; an exception in the list is raised instead."""
+
+    def __init__(self, filename, chunks):
+        self.filename, self.content_type = filename, "text/csv"
+        self._chunks = list(chunks)
+
+    async def read(self, size):
+        chunk = self._chunks.pop(0) if self._chunks else b""
+        if isinstance(chunk, Exception):
+            raise chunk
+        return chunk
+
+
+@pytest.fixture
+def incoming(tmp_path, monkeypatch):
+    def open_writer(name, content_type=None):
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return open(path, "wb"), str(path)
+
+    monkeypatch.setattr(storage_service, "open_writer", open_writer)
+    return tmp_path / "incoming"
+
+
+def test_stream_upload_hashes_and_sniffs(incoming):
+    ingest = asyncio.run(ingest_service.stream_upload(FakeUpload("sales.csv", [b"a,b\n1,", b"2\n3,4\n"]), "sales.csv"))
+
+    assert open(ingest.file_path, "rb").read() == b"a,b\n1,2\n3,4\n"
+    assert ingest.file_size == 12
+    assert ingest.total_rows == 2
+    assert ingest.columns == ["a", "b"]
+
+
+def test_failed_read_removes_partial_file(incoming):
+    upload = FakeUpload("sales.csv", [b"a,b\n1,2\n", ConnectionResetError("client went away")])
+
+    with pytest.raises(ConnectionResetError):
+        asyncio.run(ingest_service.stream_upload(upload, "sales.csv"))
+
+    assert list(incoming.iterdir()) == []
+
+
+def test_failed_store_removes_temporary_file(incoming, monkeypatch):
+    def store_blob(*args):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(ingest_service, "store_blob", store_blob)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(ingest_service.ingest_upload(None, FakeUpload("sales.csv", [b"a,b\n1,2\n"]), "acme"))
+
+    assert list(incoming.iterdir()) == []
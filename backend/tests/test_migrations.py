@@ -0,0 +1,61 @@
+"""
+Migration runner against a database created before migrations were versioned.
+"""
+
+from sqlalchemy import create_engine, inspect, text
+
+from app import migrations
+
+LEGACY_SCHEMA = [
+    "CREATE TABLE dataset (id INTEGER PRIMARY KEY, filename TEXT NOT NULL, file_path TEXT NOT NULL, "
+    "file_size INTEGER, total_rows INTEGER, total_columns INTEGER, uploaded_at TIMESTAMP)",
+    "CREATE TABLE visualization (id INTEGER PRIMARY KEY, title TEXT, chart_type TEXT, config_json TEXT, "
+    "dataset_id INTEGER, created_at TIMESTAMP)",
+    "CREATE TABLE analysislog (id INTEGER PRIMARY KEY, dataset_id INTEGER, created_at TIMESTAMP)",
+    "CREATE TABLE dashboardpreference (id INTEGER PRIMARY KEY, user_id TEXT)",
+    "INSERT INTO dataset (id, filename, file_path) VALUES (1, 'sales.csv', 'uploads/sales.csv')",
+]
+
+
+def legacy_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.execute(text(statement))
+    return engine
+
+
+def columns(engine, table):
+    return {c["name"] for c in inspect(engine).get_columns(table)}
+
+
+def test_upgrade_brings_legacy_database_current(tmp_path):
+    engine = legacy_engine(tmp_path)
+
+    assert migrations.upgrade(engine) == len(migrations.MIGRATIONS)
+
+    assert {"company_id", "version", "status", "content_hash", "row_index_json",
+            "csv_dialect_json", "parent_id", "sheets_json"} <= columns(engine, "dataset")
+    assert {"data_json", "dataset_version", "updated_at", "refresh_error"} <= columns(engine, "visualization")
+    assert "ix_dataset_company_uploaded" in {ix["name"] for ix in inspect(engine).get_indexes("dataset")}
+    with engine.connect() as conn:
+        row = conn.execute(text("SELECT company_id, version, status FROM dataset")).one()
+        assert tuple(row) == ("nexus-demo-001", 1, "ready")
+        assert migrations.current_version(conn) == migrations.MIGRATIONS[-1][0]
+
+
+def test_upgrade_is_a_no_op_once_current(tmp_path):
+    engine = legacy_engine(tmp_path)
+    migrations.upgrade(engine)
+
+    assert migrations.upgrade(engine) == 0
+
+
+def test_missing_tables_are_created_without_a_pending_step(tmp_path):
+    engine = legacy_engine(tmp_path)
+    migrations.upgrade(engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE storedblob"))
+
+    assert migrations.upgrade(engine) == 0
+    assert "storedblob" in inspect(engine).get_table_names()
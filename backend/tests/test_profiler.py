@@ -0,0 +1,47 @@
+"""
+Request profiles: stack sampling always, allocation tracing only on request.
+"""
+
+import tracemalloc
+
+import pytest
+
+from app.services import profiler
+
+
+@pytest.fixture(autouse=True)
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiler, "PROFILE_DIR", str(tmp_path))
+
+
+def test_memory_tracing_is_off_by_default():
+    profile = profiler.begin("plain", "GET", "/datasets/")
+    assert not tracemalloc.is_tracing()
+    profiler.finish(profile, 200)
+
+    summary = profiler.load_summary("plain")
+    assert summary["memory"] is False
+    assert summary["peak_traced_bytes"] is None and summary["allocations"] == []
+
+
+def test_memory_tracing_on_request():
+    profile = profiler.begin("traced", "GET", "/datasets/", memory=True)
+    assert tracemalloc.is_tracing()
+    blocks = [bytearray(64 * 1024) for _ in range(8)]
+    profiler.finish(profile, 200)
+    del blocks
+
+    assert not tracemalloc.is_tracing()
+    summary = profiler.load_summary("traced")
+    assert summary["memory"] is True
+    assert summary["peak_traced_bytes"] >= 8 * 64 * 1024
+    assert summary["allocations"]
+
+
+def test_one_profile_at_a_time():
+    first = profiler.begin("first", "GET", "/a")
+    try:
+        assert profiler.begin("second", "GET", "/b") is None
+    finally:
+        profiler.finish(first, 200)
+    assert [p["request_id"] for p in profiler.list_profiles()] == ["first"]
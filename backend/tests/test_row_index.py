@@ -0,0 +1,90 @@
+"""
+CSV row offsets (quote-parity scan) and seeking pages with them.
+"""
+
+import json
+
+import pandas as pd
+import pytest
+
+from app.models import Dataset
+from app.services import dataset_loader, row_index
+from app.services.row_index import csv_row_offsets
+
+ROWS = [
+    'id,note,amount',
+    '1,plain,10',
+    '2,"two\nlines",20',
+    '3,"quoted ""comma"", here",30',
+    '4,"three\nline\nnote",40',
+    '5,last,50',
+]
+
+
+def write(tmp_path, lines, trailing_newline=True):
+    path = tmp_path / "data.csv"
+    path.write_bytes(("\n".join(lines) + ("\n" if trailing_newline else "")).encode())
+    return str(path)
+
+
+def row_starts(path, offsets):
+    data = open(path, "rb").read()
+    return [data[o:o + 2].decode() for o in offsets]
+
+
+@pytest.mark.parametrize("trailing_newline", [True, False])
+def test_offsets_skip_quoted_newlines(tmp_path, trailing_newline):
+    path = write(tmp_path, ROWS, trailing_newline)
+
+    offsets, rows = csv_row_offsets(path, step=1)
+
+    assert rows == 5
+    assert row_starts(path, offsets) == ["1,", "2,", "3,", "4,", "5,"]
+
+
+def test_offsets_every_step_rows(tmp_path):
+    path = write(tmp_path, ROWS)
+
+    offsets, rows = csv_row_offsets(path, step=2)
+
+    assert rows == 5
+    assert row_starts(path, offsets) == ["1,", "3,", "5,"]
+
+
+def test_quote_parity_carries_across_scan_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(row_index, "SCAN_CHUNK", 5)
+    path = write(tmp_path, ROWS)
+
+    offsets, rows = csv_row_offsets(path, step=1)
+
+    assert rows == 5
+    assert row_starts(path, offsets) == ["1,", "2,", "3,", "4,", "5,"]
+
+
+def test_title_lines_above_header_are_skipped(tmp_path):
+    path = write(tmp_path, ["Sales export", "generated 2024-01-05", *ROWS])
+
+    offsets, rows = csv_row_offsets(path, step=1, header_row=2)
+
+    assert rows == 5
+    assert row_starts(path, offsets)[0] == "1,"
+
+
+def test_pages_read_by_seeking_match_a_full_parse(tmp_path, monkeypatch):
+    lines = ["id,name,amount"] + [f'{i},"row\n{i}",{i * 10}' for i in range(95)]
+    path = write(tmp_path, lines)
+    monkeypatch.setattr(row_index, "ROW_INDEX_STEP", 10)
+    dataset = Dataset(id=1, filename="data.csv", file_path=path)
+    full = pd.read_csv(path)
+    dataset.row_index_json = row_index.build_index(dataset, full)
+
+    assert len(json.loads(dataset.row_index_json)["csv_offsets"]) == 10
+    page = dataset_loader.read_rows(dataset, 37, 15)
+    pd.testing.assert_frame_equal(page.reset_index(drop=True), full.iloc[37:52].reset_index(drop=True))
+
+
+def test_index_is_dropped_when_the_scan_disagrees_with_the_parse(tmp_path):
+    path = write(tmp_path, ROWS)
+    dataset = Dataset(id=1, filename="data.csv", file_path=path)
+
+    assert row_index.build_index(dataset, pd.DataFrame({"id": range(4)})) is None
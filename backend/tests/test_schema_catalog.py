@@ -0,0 +1,51 @@
+"""
+Schema catalog fallback for datasets that have no stored catalog yet.
+"""
+
+import pandas as pd
+import pytest
+from sqlmodel import Session, select
+
+from app.database import create_db_and_tables, engine
+from app.models import Dataset, DatasetColumn
+from app.services import dataset_loader, schema_catalog
+
+FRAME = pd.DataFrame({"region": ["north", "south"], "amount": [10.0, 20.0]})
+
+
+@pytest.fixture
+def session(monkeypatch):
+    create_db_and_tables()
+    monkeypatch.setattr(dataset_loader, "load_dataframe", lambda dataset, columns=None, columnar=True: FRAME)
+    with Session(engine) as session:
+        yield session
+
+
+def add_dataset(session, status):
+    dataset = Dataset(filename="sales.csv", file_path="uploads/sales.csv", file_size=1, status=status)
+    session.add(dataset)
+    session.commit()
+    session.refresh(dataset)
+    return dataset
+
+
+def stored(session, dataset):
+    return session.exec(select(DatasetColumn).where(DatasetColumn.dataset_id == dataset.id)).all()
+
+
+def test_processing_dataset_gets_an_unsaved_catalog(session):
+    dataset = add_dataset(session, "processing")
+
+    entries = schema_catalog.get_catalog(session, dataset)
+
+    assert [e.name for e in entries] == ["region", "amount"]
+    assert stored(session, dataset) == []
+
+
+def test_ready_dataset_without_catalog_is_profiled_once(session):
+    dataset = add_dataset(session, "ready")
+
+    schema_catalog.get_catalog(session, dataset)
+    schema_catalog.get_catalog(session, dataset)
+
+    assert [e.name for e in stored(session, dataset)] == ["region", "amount"]
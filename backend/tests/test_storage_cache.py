@@ -0,0 +1,194 @@
+"""
+Storage read-cache tests against an in-memory stand-in for the GCS client.
+"""
+
+import io
+import os
+
+import pytest
+
+from app.services import storage_service as storage_module
+from app.services.storage_service import StorageService
+
+BUCKET = "k2m-test"
+
+
+class FakeBlob:
+    def __init__(self, bucket, name):
+        self.bucket, self.name = bucket, name
+
+    @property
+    def _stored(self):
+        return self.bucket.objects[self.name]
+
+    @property
+    def generation(self):
+        return self._stored[1]
+
+    @property
+    def size(self):
+        return len(self._stored[0])
+
+    def _read(self, if_generation_match):
+        data, generation = self._stored
+        if if_generation_match is not None and if_generation_match != generation:
+            raise RuntimeError("412 Precondition Failed")
+        return data
+
+    def download_to_filename(self, filename, if_generation_match=None):
+        self.bucket.downloads += 1
+        with open(filename, "wb") as f:
+            f.write(self._read(if_generation_match))
+
+    def open(self, mode, chunk_size=None, if_generation_match=None):
+        assert mode == "rb"
+        self.bucket.ranged_opens += 1
+        return io.BytesIO(self._read(if_generation_match))
+
+
+class FakeBucket:
+    """Holds {name: (bytes, generation)}; every upload bumps the generation like GCS."""
+
+    def __init__(self):
+        self.objects = {}
+        self.downloads = 0
+        self.ranged_opens = 0
+        self.lookups = 0
+        self._next_generation = 1000
+
+    def put(self, name, data: bytes):
+        self._next_generation += 1
+        self.objects[name] = (data, self._next_generation)
+        return f"gs://{BUCKET}/{name}"
+
+    def blob(self, name):
+        return FakeBlob(self, name)
+
+    def get_blob(self, name):
+        self.lookups += 1
+        return FakeBlob(self, name) if name in self.objects else None
+
+
+class FakeClient:
+    def __init__(self):
+        self.fake_bucket = FakeBucket()
+
+    def bucket(self, name):
+        assert name == BUCKET
+        return self.fake_bucket
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    path = tmp_path / "cache"
+    monkeypatch.setattr(storage_module, "CACHE_DIR", str(path))
+    monkeypatch.setattr(storage_module, "CACHE_VALIDATE_SECONDS", 0)
+    return path
+
+
+@pytest.fixture
+def service(cache_dir):
+    svc = StorageService()
+    svc.bucket_name = BUCKET
+    svc._client = FakeClient()
+    svc._bucket = svc._client.bucket(BUCKET)
+    svc._connected = True
+    return svc
+
+
+def cached_files(cache_dir):
+    return sorted(name for name in os.listdir(cache_dir) if not name.endswith(".part"))
+
+
+def test_local_path_downloads_once_and_reuses_cache(service, cache_dir):
+    uri = service.bucket.put("data/sales.csv", b"a,b\n1,2\n")
+
+    first = service.local_path(uri)
+    second = service.local_path(uri)
+
+    assert first == second
+    assert open(first, "rb").read() == b"a,b\n1,2\n"
+    assert service.bucket.downloads == 1
+    assert service.is_cached(uri)
+
+
+def test_new_generation_invalidates_cached_copy(service, cache_dir):
+    uri = service.bucket.put("data/sales.csv", b"old")
+    old = service.local_path(uri)
+
+    service.bucket.put("data/sales.csv", b"new")
+    new = service.local_path(uri)
+
+    assert new != old
+    assert open(new, "rb").read() == b"new"
+    assert not os.path.exists(old)
+    assert service.bucket.downloads == 2
+
+
+def test_generation_check_is_reused_within_validate_window(service, monkeypatch):
+    monkeypatch.setattr(storage_module, "CACHE_VALIDATE_SECONDS", 60)
+    uri = service.bucket.put("data/sales.csv", b"x")
+
+    for _ in range(3):
+        service.local_path(uri)
+
+    assert service.bucket.lookups == 1
+
+
+def test_missing_blob_raises_file_not_found(service):
+    with pytest.raises(FileNotFoundError):
+        service.local_path(f"gs://{BUCKET}/data/missing.csv")
+    assert not service.exists(f"gs://{BUCKET}/data/missing.csv")
+
+
+def test_eviction_drops_least_recently_used(service, cache_dir, monkeypatch):
+    monkeypatch.setattr(storage_module, "CACHE_MAX_BYTES", 25)
+    first = service.bucket.put("a.bin", b"a" * 10)
+    second = service.bucket.put("b.bin", b"b" * 10)
+    third = service.bucket.put("c.bin", b"c" * 10)
+
+    path_a = service.local_path(first)
+    os.utime(path_a, (1, 1))  # long unused
+    path_b = service.local_path(second)
+    path_c = service.local_path(third)
+
+    assert not os.path.exists(path_a)
+    assert os.path.exists(path_b) and os.path.exists(path_c)
+
+
+def test_eviction_ignores_files_removed_by_another_worker(service, cache_dir, monkeypatch):
+    service.local_path(service.bucket.put("a.bin", b"a" * 10))
+    monkeypatch.setattr(storage_module, "CACHE_MAX_BYTES", 0)
+    real_listdir, real_remove = os.listdir, os.remove
+
+    def listdir_with_vanished(path):
+        return real_listdir(path) + ["vanished-1.bin"]
+
+    def remove_raced(path):
+        real_remove(path)  # the other worker got there first
+        real_remove(path)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(storage_module.os, "listdir", listdir_with_vanished)
+        patch.setattr(storage_module.os, "remove", remove_raced)
+        service._evict()
+
+    assert cached_files(cache_dir) == []
+
+
+def read_at(service, uri, start, length):
+    with service.open_input(uri) as f:
+        f.seek(start)
+        return f.read(length)
+
+
+def test_open_input_uses_cache_or_ranged_reads(service):
+    uri = service.bucket.put("columnar/x.parquet", b"0123456789")
+
+    assert read_at(service, uri, 2, 3) == b"234"
+    assert service.bucket.ranged_opens == 1
+    assert service.bucket.downloads == 0
+
+    service.local_path(uri)
+    assert read_at(service, uri, 5, 3) == b"567"
+    assert service.bucket.ranged_opens == 1
@@ -0,0 +1,187 @@
+"""
+Token cache tests: tokens are minted locally with generated RSA key sets, and
+Firebase's user lookup is replaced, so nothing talks to Google.
+"""
+
+import datetime
+import time
+from types import SimpleNamespace
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from firebase_admin import auth
+from google.auth import _helpers, crypt, jwt
+
+from app.services import token_cache
+from app.services.token_cache import ID_TOKEN_ISSUER_PREFIX, CertificateStore, TokenVerifier
+
+PROJECT_ID = "k2m-test"
+
+
+def make_key_set(key_id: str):
+    """(signer, {kid: PEM certificate}) for a fresh self-signed RSA key."""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "k2m-test")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=5)).not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    private_pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    signer = crypt.RSASigner.from_string(private_pem, key_id=key_id)
+    return signer, {key_id: cert.public_bytes(serialization.Encoding.PEM).decode()}
+
+
+def mint_token(signer, uid: str = "user-1", issued: int = None, lifetime: int = 3600, **overrides) -> str:
+    now = int(time.time()) if issued is None else issued
+    payload = {
+        "iss": ID_TOKEN_ISSUER_PREFIX + PROJECT_ID,
+        "aud": PROJECT_ID,
+        "sub": uid,
+        "auth_time": now,
+        "iat": now,
+        "exp": now + lifetime,
+        "email": f"{uid}@example.com",
+        **overrides,
+    }
+    return jwt.encode(signer, payload).decode()
+
+
+@pytest.fixture(scope="module")
+def key_set():
+    return make_key_set("key-1")
+
+
+@pytest.fixture
+def verifier(key_set):
+    store = CertificateStore(fetch=lambda url: (key_set[1], 3600))
+    store.refresh()
+    return TokenVerifier(project_id=PROJECT_ID, store=store, revocation_check_seconds=0)
+
+
+def test_valid_token_is_decoded_once(verifier, key_set, monkeypatch):
+    decoded = []
+    decode = verifier._decode
+    monkeypatch.setattr(verifier, "_decode", lambda token: decoded.append(token) or decode(token))
+    token = mint_token(key_set[0])
+
+    first = verifier.verify(token)
+    second = verifier.verify(token)
+
+    assert first["uid"] == second["uid"] == "user-1"
+    assert first["email"] == "user-1@example.com"
+    assert len(decoded) == 1
+    assert len(verifier) == 1
+
+
+def test_expired_token_is_rejected(verifier, key_set):
+    token = mint_token(key_set[0], issued=int(time.time()) - 7200)
+    with pytest.raises(auth.ExpiredIdTokenError):
+        verifier.verify(token)
+    assert len(verifier) == 0
+
+
+def test_cached_token_is_dropped_at_its_expiry(verifier, key_set, monkeypatch):
+    token = mint_token(key_set[0], lifetime=600)
+    verifier.verify(token)
+
+    later = time.time() + 601
+    monkeypatch.setattr(token_cache.time, "time", lambda: later)
+    monkeypatch.setattr(_helpers, "utcnow", lambda: datetime.datetime.fromtimestamp(later, datetime.timezone.utc).replace(tzinfo=None))
+    with pytest.raises(auth.ExpiredIdTokenError):
+        verifier.verify(token)
+
+
+@pytest.mark.parametrize("claims", [{"aud": "other-project"}, {"iss": ID_TOKEN_ISSUER_PREFIX + "other-project"}, {"sub": ""}])
+def test_wrong_audience_issuer_or_subject_is_rejected(verifier, key_set, claims):
+    with pytest.raises(auth.InvalidIdTokenError):
+        verifier.verify(mint_token(key_set[0], **claims))
+
+
+def test_token_from_unknown_key_is_rejected(verifier):
+    other_signer, _ = make_key_set("key-unknown")
+    with pytest.raises(auth.InvalidIdTokenError):
+        verifier.verify(mint_token(other_signer))
+
+
+def test_key_rotation_is_picked_up_on_refresh(key_set):
+    new_signer, new_certs = make_key_set("key-2")
+    published = [key_set[1]]
+    store = CertificateStore(fetch=lambda url: (published[0], 3600))
+    store.refresh()
+    verifier = TokenVerifier(project_id=PROJECT_ID, store=store, revocation_check_seconds=0)
+    old_token, new_token = mint_token(key_set[0], "old"), mint_token(new_signer, "new")
+
+    assert verifier.verify(old_token)["uid"] == "old"
+    with pytest.raises(auth.InvalidIdTokenError):
+        verifier.verify(new_token)
+
+    # Google publishes the new key alongside the old one; the store refetches once max-age runs out
+    published[0] = {**key_set[1], **new_certs}
+    store.set_certificates(key_set[1], max_age=0)  # the cached key set has reached its max-age
+    assert verifier.verify(new_token)["uid"] == "new"
+    assert verifier.verify(old_token)["uid"] == "old"
+
+
+def test_certificate_fetch_failure_is_reported(key_set):
+    def fail(url):
+        raise OSError("network down")
+
+    verifier = TokenVerifier(project_id=PROJECT_ID, store=CertificateStore(fetch=fail), revocation_check_seconds=0)
+    with pytest.raises(auth.CertificateFetchError):
+        verifier.verify(mint_token(key_set[0]))
+
+
+def _user(disabled=False, valid_after=None):
+    return SimpleNamespace(disabled=disabled, tokens_valid_after_timestamp=valid_after)
+
+
+def test_revocation_is_checked_at_most_once_per_window(verifier, key_set, monkeypatch):
+    lookups = []
+    monkeypatch.setattr(token_cache.auth, "get_user", lambda uid: lookups.append(uid) or _user())
+    verifier.revocation_check_seconds = 300
+    token = mint_token(key_set[0])
+
+    verifier.verify(token)
+    verifier.verify(token)
+    assert lookups == ["user-1"]
+
+    later = time.time() + 301
+    monkeypatch.setattr(token_cache.time, "time", lambda: later)
+    verifier.verify(token)
+    assert lookups == ["user-1", "user-1"]
+
+
+def test_revoked_token_is_rejected_and_forgotten(verifier, key_set, monkeypatch):
+    issued = int(time.time()) - 60
+    token = mint_token(key_set[0], issued=issued)
+    monkeypatch.setattr(token_cache.auth, "get_user", lambda uid: _user(valid_after=(issued + 30) * 1000))
+    verifier.revocation_check_seconds = 300
+
+    with pytest.raises(auth.RevokedIdTokenError):
+        verifier.verify(token)
+    assert len(verifier) == 0
+
+
+def test_disabled_user_is_rejected(verifier, key_set, monkeypatch):
+    monkeypatch.setattr(token_cache.auth, "get_user", lambda uid: _user(disabled=True))
+    verifier.revocation_check_seconds = 300
+    with pytest.raises(auth.UserDisabledError):
+        verifier.verify(mint_token(key_set[0]))
+
+
+def test_cache_is_bounded(key_set):
+    store = CertificateStore(fetch=lambda url: (key_set[1], 3600))
+    verifier = TokenVerifier(project_id=PROJECT_ID, store=store, revocation_check_seconds=0, max_entries=3)
+    for i in range(5):
+        verifier.verify(mint_token(key_set[0], f"user-{i}"))
+    assert len(verifier) == 3
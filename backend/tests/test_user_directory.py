@@ -0,0 +1,127 @@
+"""
+User directory tests against an in-memory stand-in for Firebase's user API.
+"""
+
+from types import SimpleNamespace
+
+import pytest
+from sqlmodel import Session, SQLModel, delete
+
+from app.database import engine
+from app.models import DirectoryUser
+from app.services.user_directory import UserDirectory
+
+
+class FakeFirebase:
+    """Implements `list_users(page_token, max_results)` over a dict of user records."""
+
+    def __init__(self):
+        self.users = {}
+        self.calls = 0
+
+    def add(self, uid, email, company_id=None, role=None, verified=False, disabled=False):
+        claims = {k: v for k, v in {"company_id": company_id, "role": role}.items() if v}
+        self.users[uid] = SimpleNamespace(
+            uid=uid, email=email, custom_claims=claims, email_verified=verified, disabled=disabled
+        )
+        return self.users[uid]
+
+    def list_users(self, page_token=None, max_results=1000):
+        self.calls += 1
+        uids = sorted(self.users)
+        start = int(page_token or 0)
+        end = start + max_results
+        return SimpleNamespace(
+            users=[self.users[uid] for uid in uids[start:end]],
+            next_page_token=str(end) if end < len(uids) else None,
+        )
+
+
+@pytest.fixture(autouse=True)
+def clean_directory():
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.exec(delete(DirectoryUser))
+        session.commit()
+
+
+@pytest.fixture
+def firebase():
+    fake = FakeFirebase()
+    for i in range(25):
+        fake.add(f"uid-{i:02d}", f"user{i:02d}@example.com", company_id=f"company-{i % 3}", role="client")
+    return fake
+
+
+def test_full_sync_adds_every_user(firebase):
+    directory = UserDirectory(api=firebase, page_size=10)
+    stats = directory.sync()
+
+    assert stats == {"pages": 3, "seen": 25, "added": 25, "updated": 0, "removed": 0, "complete": True}
+    with Session(engine) as session:
+        users, total = directory.list_users(session)
+    assert total == 25 and len(users) == 25
+    assert directory.last_complete_sync is not None
+
+
+def test_unchanged_users_are_not_rewritten(firebase):
+    directory = UserDirectory(api=firebase, page_size=10)
+    directory.sync()
+    stats = directory.sync()
+    assert (stats["added"], stats["updated"], stats["removed"]) == (0, 0, 0)
+
+
+def test_changed_and_deleted_users_are_applied(firebase):
+    directory = UserDirectory(api=firebase, page_size=10)
+    directory.sync()
+
+    firebase.add("uid-03", "user03@example.com", company_id="acme", role="admin")
+    del firebase.users["uid-07"]
+    stats = directory.sync()
+
+    assert (stats["updated"], stats["removed"]) == (1, 1)
+    with Session(engine) as session:
+        assert session.get(DirectoryUser, "uid-07") is None
+        row = session.get(DirectoryUser, "uid-03")
+        assert (row.company_id, row.role) == ("acme", "admin")
+
+
+def test_partial_pass_resumes_and_removes_only_when_complete(firebase):
+    directory = UserDirectory(api=firebase, page_size=10)
+    directory.sync()
+    del firebase.users["uid-24"]
+
+    first = directory.sync(max_pages=2)
+    assert (first["pages"], first["complete"], first["removed"]) == (2, False, 0)
+    with Session(engine) as session:
+        assert session.get(DirectoryUser, "uid-24") is not None
+
+    calls = firebase.calls
+    rest = directory.sync(max_pages=2)
+    assert (rest["pages"], rest["complete"], rest["removed"]) == (1, True, 1)
+    assert firebase.calls == calls + 1  # continued from the stored page token
+
+
+def test_record_writes_through(firebase):
+    directory = UserDirectory(api=firebase)
+    user = firebase.add("uid-new", "new@example.com")
+    with Session(engine) as session:
+        directory.record(session, user, claims={"company_id": "acme", "role": "client"}, email_verified=True)
+        row = session.get(DirectoryUser, "uid-new")
+        assert (row.company_id, row.role, row.email_verified) == ("acme", "client", True)
+
+
+def test_listing_filters_pages_and_counts_companies(firebase):
+    directory = UserDirectory(api=firebase, page_size=10)
+    directory.sync()
+    with Session(engine) as session:
+        users, total = directory.list_users(session, company_id="company-1")
+        assert total == 8 and all(u.company_id == "company-1" for u in users)
+
+        page, total = directory.list_users(session, limit=5, offset=20)
+        assert total == 25 and [u.uid for u in page] == [f"uid-{i}" for i in range(20, 25)]
+
+        users, total = directory.list_users(session, email_prefix="user1")
+        assert total == 10
+
+        assert directory.list_companies(session) == [("company-0", 9), ("company-1", 8), ("company-2", 8)]
@@ -0,0 +1,75 @@
+"""
+Background refresh of saved charts after their dataset changes.
+"""
+
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+from sqlmodel import Session
+
+from app.database import create_db_and_tables, engine
+from app.models import Dataset, Visualization
+from app.schemas import ChartSpec
+from app.services import dataset_loader, schema_catalog, visualization_service
+
+FRAME = pd.DataFrame({"region": ["north", "south"], "amount": [10.0, 20.0]})
+
+
+@pytest.fixture
+def dataset(monkeypatch):
+    create_db_and_tables()
+    loads = []
+
+    def load_dataframe(dataset, columns=None, columnar=True):
+        loads.append(columns)
+        return FRAME[columns]
+
+    monkeypatch.setattr(dataset_loader, "load_dataframe", load_dataframe)
+    monkeypatch.setattr(schema_catalog, "get_catalog",
+                        lambda session, dataset: [SimpleNamespace(name=c) for c in FRAME.columns])
+    with Session(engine) as session:
+        row = Dataset(filename="sales.csv", file_path="uploads/sales.csv", file_size=1, version=2)
+        session.add(row)
+        session.commit()
+        session.refresh(row)
+        yield row, loads
+
+
+def save(dataset, spec: ChartSpec) -> int:
+    with Session(engine) as session:
+        viz = Visualization(title=spec.type, chart_type=spec.type, config_json=spec.model_dump_json(),
+                            dataset_id=dataset.id, data_json='{"old": true}', dataset_version=1)
+        session.add(viz)
+        session.commit()
+        return viz.id
+
+
+def test_failed_chart_is_stamped_and_not_retried(dataset):
+    dataset, loads = dataset
+    good = save(dataset, ChartSpec(type="bar", x_axis="region", y_axis="amount"))
+    bad = save(dataset, ChartSpec(type="scatter", x_axis="region", y_axis="amount"))
+
+    assert visualization_service.refresh_dataset_visualizations(dataset.id) == 1
+    assert loads == [["region", "amount"]]  # Columns shared by both charts are loaded once
+
+    with Session(engine) as session:
+        refreshed, failed = session.get(Visualization, good), session.get(Visualization, bad)
+        assert refreshed.refresh_error is None and refreshed.data_json != '{"old": true}'
+        assert failed.data_json == '{"old": true}'
+        assert "numeric" in failed.refresh_error
+        assert failed.dataset_version == dataset.version
+        assert not visualization_service.is_stale(failed, dataset)
+
+    assert visualization_service.refresh_dataset_visualizations(dataset.id) == 0
+    assert len(loads) == 1
+
+
+def test_new_dataset_version_retries_failed_chart(dataset):
+    dataset, _ = dataset
+    viz = Visualization(title="t", chart_type="scatter", config_json="{}", dataset_id=dataset.id,
+                        dataset_version=dataset.version, refresh_error="Scatter chart requires numeric X and Y columns")
+
+    assert not visualization_service.is_stale(viz, dataset)
+    dataset.version += 1
+    assert visualization_service.is_stale(viz, dataset)